@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+对比adbcap两种截图方式的耗时, 需要连接设备
+  file: screencap保存到设备上, 再读取到电脑
+  exec_out: exec-out直接读取screencap输出
+
+python -m benchmark.adbcap_bench -s emulator-5554 -n 20
+"""
+import argparse
+import statistics
+import time
+
+from core.adb import ADB
+
+
+def bench(name, func, number):
+    func()  # 预热
+    costs = []
+    for _ in range(number):
+        stamp = time.perf_counter()
+        func()
+        costs.append((time.perf_counter() - stamp) * 1000)
+    print('{:<10} p50={:>8.2f}ms max={:>8.2f}ms'.format(name, statistics.median(costs), max(costs)))
+    return statistics.median(costs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--serial', required=True)
+    parser.add_argument('-n', '--number', type=int, default=20)
+    args = parser.parse_args()
+
+    adb = ADB(args.serial)
+    file_cost = bench('file', lambda: adb.screenshot(exec_out=False), args.number)
+    exec_out_cost = bench('exec_out', lambda: adb.screenshot(exec_out=True), args.number)
+    print('speedup x{:.1f}'.format(file_cost / exec_out_cost))
+
+
+if __name__ == '__main__':
+    main()
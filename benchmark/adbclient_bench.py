@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+对比adb子进程与AdbClient直连adb server的耗时
+使用tests.fake_adb中的假adb server, 不需要连接设备
+
+python -m benchmark.adbclient_bench --adb ./static/adb/linux/adb -n 100
+"""
+import argparse
+import re
+import subprocess
+import tempfile
+import time
+
+from core.adb import ADB
+from tests.fake_adb import FakeAdbServer, FAKE_SERIAL
+
+
+def adb_server_version(adb_path: str) -> int:
+    """adb客户端会检查server版本,不一致时会重启server"""
+    out = subprocess.check_output([adb_path, 'version']).decode()
+    return int(re.search(r'version \d+\.\d+\.(\d+)', out).group(1))
+
+
+def bench(name, func, number):
+    stamp = time.perf_counter()
+    for _ in range(number):
+        func()
+    cost = (time.perf_counter() - stamp) * 1000 / number
+    print('{:<12} {:>8.2f}ms/call'.format(name, cost))
+    return cost
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--adb', default=None, help='adb路径, 默认使用static中的adb')
+    parser.add_argument('-n', '--number', type=int, default=50)
+    args = parser.parse_args()
+
+    adb_path = args.adb or ADB.builtin_adb_path()
+    with tempfile.TemporaryDirectory() as root:
+        server = FakeAdbServer(root, version=adb_server_version(adb_path)).start()
+        adb = ADB(FAKE_SERIAL, adb_path=adb_path, port=server.port, shell_session=False)
+        session_adb = ADB(FAKE_SERIAL, adb_path=adb_path, port=server.port)
+        cmds = ['getprop', 'ro.build.version.sdk']
+
+        subprocess_cost = bench('subprocess', lambda: adb.cmd(['shell'] + cmds), args.number)
+        client_cost = bench('adbclient', lambda: adb.raw_shell(cmds), args.number)
+        session_cost = bench('session', lambda: session_adb.raw_shell(cmds), args.number)
+        print('speedup adbclient x{:.1f}, session x{:.1f}'.format(subprocess_cost / client_cost,
+                                                                   subprocess_cost / session_cost))
+        server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,10 @@
 # -*- coding:utf-8 -*-
 import os
 import platform
-import random
 import re
 import socket
+import struct
 import subprocess
-import sys
-import time
 import warnings
 from typing import Union, Tuple
 
@@ -16,21 +14,39 @@ from loguru import logger
 
 from core.utils.base import SUBPROCESS_FLAG, pprint
 from core.constant import DEFAULT_ADB_PATH, SHELL_ENCODING, ADB_CAP_NAME_RAW, ADB_CAP_REMOTE_RAW_PATH, \
-    ADB_CAP_LOCAL_PATH, ADB_CAP_REMOTE_PATH
+    ADB_CAP_LOCAL_PATH, ADB_CAP_REMOTE_PATH, SDK_VERISON_ANDROID5
 from core.error import AdbError
+from core.adbclient import AdbClient
+from core.shell_session import ShellSession
+from core.props import PropertyStore
+from core.display import DisplayInfo
+from core.forward import ForwardManager
+from core.installer import Installer
+from core.utils.stream_parser import BufferPool
 from core.utils.snippet import split_cmd, split_process_status, get_std_encoding
 
 
 class _ADB(object):
     """adb object class"""
 
-    def __init__(self, device_id: str = None, adb_path: str = None, host='127.0.0.1', port=5037):
+    def __init__(self, device_id: str = None, adb_path: str = None, host='127.0.0.1', port=5037,
+                 shell_session: bool = True):
         self.device_id = device_id
         self.adb_path = adb_path or self.builtin_adb_path()
         self._set_cmd_options(host, port)
+        # adb server客户端, 命令直接通过socket发送给adb server
+        self._client = AdbClient(self.host, self.port, start_server=self.start_server)
+        # 常驻shell会话, 短命令通过它执行
+        self._shell_session = ShellSession(self._client, device_id) if shell_session and device_id else None
+        # 设备属性缓存
+        self._props = PropertyStore(self)
+        # forward记录表
+        self._forwards = ForwardManager.get(self._client)
+        # minicap/minitouch等文件的安装
+        self.installer = Installer(self)
         self.connect()
         self._event_path = None  # event信息
-        self._display_info = {}
+        self._display_info = DisplayInfo(self)
         self._line_breaker = None
         # 截图文件名字
         self._cap_name = ADB_CAP_NAME_RAW.format(self.get_device_id(decode=True))
@@ -40,6 +56,10 @@ class _ADB(object):
         self._cap_remote_path = ADB_CAP_REMOTE_PATH.format(self.get_device_id(decode=True))
         # raw临时文件存放到工程的路径
         self._cap_raw_remote_path = ADB_CAP_REMOTE_RAW_PATH.format(self._cap_name)
+        # 上一次adb截图的数据大小, 用于预先分配缓冲区
+        self._cap_size = 0
+        # 截图缓冲区, 返回的图片释放后复用
+        self._cap_buffers = BufferPool(max_buffers=2)
         # 已经使用的端口
         self._sdk_version = self.sdk_version()
 
@@ -193,8 +213,7 @@ class _ADB(object):
         """
         patten = re.compile(r'^[\w\d.:-]+\t[\w]+$')
         device_list = []
-        # self.start_server()
-        output = self.cmd("devices", devices=False)
+        output = self._client.devices().decode(SHELL_ENCODING)
         for line in output.splitlines():
             line = line.strip()
             if not line or not patten.match(line):
@@ -213,7 +232,7 @@ class _ADB(object):
              None
         """
         if self.device_id and ':' in self.device_id and (force or self.get_status() != 'devices'):
-            connect_result = self.cmd("connect %s" % self.device_id, devices=False)
+            connect_result = self._client.connect_device(self.device_id).decode(SHELL_ENCODING)
             logger.info(connect_result.rstrip())
 
     def disconnect(self):
@@ -224,7 +243,7 @@ class _ADB(object):
              None
         """
         if ':' in self.device_id:
-            self.cmd("disconnect %s" % self.device_id, devices=False)
+            self._client.disconnect_device(self.device_id)
             logger.info("disconnect to %s" % self.device_id)
 
     def get_status(self):
@@ -232,18 +251,12 @@ class _ADB(object):
         command adb -s <devices_id> get-state
         :return:
         """
-        proc = self.start_cmd('get-state')
-        stdout, stderr = proc.communicate()
-
-        stdout = stdout.decode(get_std_encoding(sys.stdout))
-        stderr = stderr.decode(get_std_encoding(sys.stdout))
-
-        if proc.returncode == 0:
-            return stdout.strip()
-        elif "not found" in stderr:
-            return None
-        else:
-            raise AdbError(stdout, stderr, ['get-state'])
+        try:
+            return self._client.get_state(self.device_id).decode(SHELL_ENCODING).strip()
+        except AdbError as err:
+            if "not found" in err.stderr:
+                return None
+            raise
 
     @property
     def line_breaker(self):
@@ -265,8 +278,11 @@ class _ADB(object):
         return self.start_cmd(cmds)
 
     def raw_shell(self, cmds: Union[list, str], ensure_unicode: bool = True, skip_error: bool = False):
-        cmds = ['shell'] + split_cmd(cmds)
-        stdout = self.cmd(cmds, ensure_unicode=False, skip_error=skip_error)
+        cmds = split_cmd(cmds)
+        logger.debug('adb -s {} shell {}', self.device_id, " ".join(cmds))
+        stdout, stderr, returncode = self._run_shell(cmds)
+        if returncode > 0 and not skip_error:
+            raise AdbError(stdout, stderr, ['shell'] + cmds)
         if not ensure_unicode:
             return stdout
         try:
@@ -275,6 +291,23 @@ class _ADB(object):
             logger.error('shell output decode {} fail. repr={}', SHELL_ENCODING, repr(stdout))
             return str(repr(stdout))
 
+    def _run_shell(self, cmds: list) -> Tuple[bytes, bytes, int]:
+        """短命令优先在常驻shell会话中运行, 其他命令或者设备不支持时每条命令单独连接"""
+        session = self._shell_session
+        if session and session.available and not session.closed and session.accepts(cmds):
+            try:
+                return session.run(cmds)
+            except AdbError:
+                if session.available:
+                    raise
+                logger.info('{} shell session is not supported', self.device_id)
+            except socket.timeout:
+                raise AdbError(b'', b'shell session command timeout', ['shell'] + cmds)
+            except socket.error as err:
+                # 会话已经断开, 下次命令时重新打开
+                logger.warning('{} shell session error: {}, fallback', self.device_id, err)
+        return self._client.shell(self.device_id, cmds)
+
     def shell(self, cmd: Union[list, str]) -> str:
         if self._sdk_version < 25:
             # sdk_version < 25, adb shell 不返回错误
@@ -300,12 +333,26 @@ class _ADB(object):
             else:
                 return out
 
-    def getprop(self, key, strip=True):
+    def getprop(self, key, strip=True, cache=True):
+        """
+        获取设备属性
+
+        Args:
+            key: 属性名
+            strip: 是否去除结尾的换行
+            cache: 为True时从属性缓存中读取, 为False时运行 adb shell getprop key
+        """
+        if cache:
+            return self._props.get(key)
         prop = self.raw_shell(['getprop', key])
         if strip:
             prop = prop.rstrip()
         return prop
 
+    def invalidate_props(self):
+        """清除设备属性缓存"""
+        self._props.invalidate()
+
     def forward(self, local: str, remote: str, no_rebind: bool = True):
         """
         command adb forward
@@ -317,37 +364,20 @@ class _ADB(object):
         :return:
             None
         """
-        is_use, index = self._local_in_forwards(local, remote)
-        if not is_use:
-            cmds = ['forward']
-            if no_rebind:
-                cmds += ['--no-rebind']
-            self.cmd(cmds + [local, remote])
+        using = self._forwards.find(self.device_id, local, remote)
+        if not using:
+            self._forwards.forward(self.device_id, local, remote, no_rebind)
             logger.debug('forward {} {}', local, remote)
         else:
-            forward_local_using = self.get_forwards()
-            logger.info('{} {} has been forward', forward_local_using[index]['local'],
-                        forward_local_using[index]['remote'])
+            logger.info('{} {} has been forward', using['local'], using['remote'])
 
     def get_available_forward_local(self) -> int:
         """
-        获取一个可用端口
+        从FORWARD_PORT_RANGE中获取一个可用端口
         :return:
             port
         """
-        sock = socket.socket()
-        port = random.randint(11111, 20000)
-        result = False
-        try:
-            sock.bind((self.host, port))
-            result = True
-            # logger.debug('port:{} can use'.format(port))
-        except socket.error:
-            logger.debug('port:{} is in use'.format(port))
-        sock.close()
-        if not result:
-            return self.get_available_forward_local()
-        return port
+        return self._forwards.allocate_port(self.host)
 
     def _local_in_forwards(self, local: str = None, remote: str = None) -> Union[Tuple[bool, int], Tuple[bool, None]]:
         """
@@ -356,7 +386,7 @@ class _ADB(object):
         :return:
             bool, if True return index in _forward_local_using
         """
-        l = self.get_forwards()
+        l = self._forwards.list()
         for i, value in enumerate(l):
             if local:
                 if value['local'] == local:
@@ -380,7 +410,7 @@ class _ADB(object):
 
     def check_file(self, path: str, name: str) -> bool:
         """
-        command adb shell find 'name' in the 'path'
+        通过sync STAT检查'path'中是否存在'name'
 
         Args:
             path: 在设备上的路径
@@ -389,7 +419,18 @@ class _ADB(object):
         :return:
             bool
         """
-        return bool(self.raw_shell(['find', path, '-name', name]))
+        with self._client.sync(self.device_id) as sync:
+            return sync.exists('{}/{}'.format(path.rstrip('/'), name))
+
+    def stat(self, remote: str) -> Tuple[int, int, int]:
+        """
+        sync STAT
+
+        Returns:
+            mode, size, mtime; 文件不存在时mode为0
+        """
+        with self._client.sync(self.device_id) as sync:
+            return sync.stat(remote)
 
     def get_process_status(self, pid: int = None, name: str = None) -> list:
         """
@@ -436,7 +477,7 @@ class _ADB(object):
                 pid = out[0]['PID']
             else:
                 return False
-        self.start_shell(['kill', str(pid)])
+        self.raw_shell(['kill', str(pid)], skip_error=True)
         logger.info('{} PID:{} NAME:{} is kill', self.device_id, pid, out[0]['NAME'])
 
     def get_device_id(self, decode: bool = False) -> str:
@@ -445,6 +486,7 @@ class _ADB(object):
     def set_forward(self, remote: str):
         """
         通过get_available_forward_local获取可用端口,并与remote绑定
+        如果remote已经绑定过,则返回已绑定的端口
 
         Args:
             remote: 要与local绑定的设备端口 localabstract:{remote}"
@@ -453,17 +495,20 @@ class _ADB(object):
             localport:要转发的本地端口 tcp:<local>
             remote:要与local绑定的设备端口 localabstract:{remote}"`
         """
-        localport = self.get_available_forward_local()
-        self.forward('tcp:%s' % localport, remote)
+        using = self._forwards.find(self.device_id, remote=remote)
+        if using and using['local'].startswith('tcp:'):
+            return int(using['local'][4:]), remote
+        localport = self._forwards.forward_port(self.device_id, remote, self.host)
+        logger.debug('forward tcp:{} {}', localport, remote)
         return localport, remote
 
     def get_forward_port(self, remote: str):
         """获取开放端口的端口号"""
-        index = self._local_in_forwards(remote='localabstract:%s' % remote)
-        if not index[0]:
+        using = self._forwards.find(self.device_id, remote='localabstract:%s' % remote)
+        if not using:
             logger.error('No port corresponding to remote was found')
             return None
-        return int(re.compile(r'tcp:(\d+)').findall(self.get_forwards()[index[1]]['local'])[0])
+        return int(re.compile(r'tcp:(\d+)').findall(using['local'])[0])
 
     def remove_forward(self, local=None):
         """
@@ -473,31 +518,20 @@ class _ADB(object):
         :return:
             None
         """
-        if local:
-            cmds = ['forward', '--remove', local]
-        else:
-            cmds = ['forward', '--remove-all']
-        self.cmd(cmds)
+        self._forwards.remove(self.device_id, local)
 
-    def get_forwards(self) -> list:
+    def get_forwards(self, sync: bool = False) -> list:
         """
-        command adb forward --list
+        从forward记录表中获取全部forward
 
+        Args:
+            sync: 为True时先通过 adb forward --list 同步记录表
         :return:
-            返回一个包含占用信息的列表,每个包含键值local和remote
+            返回一个包含占用信息的列表,每个包含键值device_id,local和remote
         """
-        l = []
-        out = self.cmd(['forward', '--list'], devices=False, skip_error=True)
-        for line in out.splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            cols = line.split()
-            if len(cols) != 3:
-                continue
-            device_id, local, remote = cols
-            l.append({'local': local, 'remote': remote})
-        return l
+        if sync:
+            self._forwards.sync()
+        return self._forwards.list()
 
     def getMaxXY(self):
         ret = self.shell('getevent -p').split('\n')
@@ -621,38 +655,47 @@ class _ADB(object):
 class _Device(_ADB):
     """这里会写上一些常用的功能接口"""
 
-    def screenshot(self, Rect: Tuple[int, int, int, int] = None):
+    def screenshot(self, Rect: Tuple[int, int, int, int] = None, exec_out: bool = True) -> np.ndarray:
         """
         adb 截图
         :param Rect: 顶点坐标x,y。截取长宽width,height
+        :param exec_out: 为True时通过exec-out直接读取screencap输出,否则先保存到设备上再通过sync读取
+        :return: bgr格式的图片数据, 是原始数据的视图, 释放后缓冲区会被下一次截图复用
+        """
+        if exec_out and self._sdk_version >= SDK_VERISON_ANDROID5:
+            # 缓冲区比上一帧多一个字节, 读取EOF时不需要扩容
+            buf = self._cap_buffers.acquire(self._cap_size + 1)
+            raw_data = self._client.exec_out_into(self.device_id, ['screencap'], buf)
+            self._cap_size = len(raw_data)
+        else:
+            local_path = self._cap_local_path
+            self.raw_shell(['screencap', local_path])
+            raw_data = self.pull_buffer(local_path)
+        return self._parse_screencap(raw_data, Rect)
+
+    @staticmethod
+    def _parse_screencap(raw_data, Rect: Tuple[int, int, int, int] = None) -> np.ndarray:
         """
-        # 截取临时文件raw
-        local_path = self._cap_local_path
-        raw_remote_path = self._cap_raw_remote_path
-
-        self.raw_shell(['screencap', local_path])
-        self.start_shell(['chmod', '755', local_path])
-        self.pull(local_path, raw_remote_path)
-        # readRaw
-        # read size
-        img_data = np.fromfile(raw_remote_path, dtype=np.uint16)
-        width, height = img_data[2], img_data[0]
-        # read raw
-        img_data = np.fromfile(raw_remote_path, dtype=np.uint8)
-        img_data = img_data[slice(12, len(img_data))]
+        解析screencap的raw数据
+        header为 width,height,format (android 9以后多了4字节的colorspace), 之后是rgba数据
+
+        :param raw_data: screencap输出
+        :param Rect: 顶点坐标x,y。截取长宽width,height
+        :return: bgr格式的图片数据
+        """
+        width, height, pixel_format = struct.unpack_from('<3I', raw_data)
+        header_size = len(raw_data) - width * height * 4
+        if header_size not in (12, 16):
+            raise AdbError(b'', 'unsupported screencap data, size={} width={} height={} format={}'.format(
+                len(raw_data), width, height, pixel_format).encode(), ['screencap'])
+        img_data = np.frombuffer(raw_data, dtype=np.uint8, offset=header_size).reshape(height, width, 4)
         if Rect:
-            if Rect[0] > height or Rect[1] > width or Rect[0] + Rect[2] > height or Rect[1] + Rect[3] > width:
+            x, y, w, h = Rect
+            if x < 0 or y < 0 or x + w > width or y + h > height:
                 raise OverflowError('Rect不能超出屏幕 {}'.format(Rect))
-            index = Rect[0] * 4 + Rect[1] * height * 4  # 从图片左上角开始,y计算公式y*height*4,x计算公式x*4, 4表示4通道
-            end = (Rect[0] + Rect[2]) * 4 + (Rect[1] + Rect[3] - 1) * height * 4
-            img_data = img_data[index: end]
-            img_data = img_data.reshape(Rect[3], Rect[2], 4)
-        else:
-            img_data = img_data.reshape(width, height, 4)
-        img_data = img_data[:, :, ::-1][:, :, 1:4]  # imgData中rgbA转为Abgr,并截取bgr
-        # 删除raw临时文件
-        os.remove(raw_remote_path)
-        return img_data
+            img_data = img_data[y:y + h, x:x + w]
+        # rgba -> bgr, 只是视图不会复制数据
+        return img_data[:, :, 2::-1]
 
     def push(self, local, remote):
         """
@@ -666,7 +709,28 @@ class _Device(_ADB):
         """
         if not os.path.isfile(local):
             raise RuntimeError("file: %s does not exists" % (repr(local)))
-        self.cmd(["push", local, remote], ensure_unicode=False)
+        st = os.stat(local)
+        with open(local, 'rb') as f:
+            self.push_buffer(f.read(), remote, mode=st.st_mode & 0o777, mtime=int(st.st_mtime))
+        logger.debug('push {} {}', local, remote)
+
+    def push_buffer(self, data: Union[bytes, bytearray, memoryview], remote: str, mode: int = 0o644,
+                    mtime: int = None):
+        """
+        通过sync SEND将内存中的数据写入设备
+        :param data:
+            需要写入的数据
+        :param remote:
+            设备上的路径
+        :param mode:
+            文件权限
+        :param mtime:
+            文件修改时间
+        :return:
+            None
+        """
+        with self._client.sync(self.device_id) as sync:
+            sync.push(data, remote, mode, mtime)
 
     def pull(self, remote, local):
         """
@@ -678,7 +742,22 @@ class _Device(_ADB):
         :return:
             None
         """
-        self.cmd(["pull", remote, local], ensure_unicode=False)
+        data = self.pull_buffer(remote)
+        with open(local, 'wb') as f:
+            f.write(data)
+
+    def pull_buffer(self, remote: str, buf: bytearray = None) -> memoryview:
+        """
+        通过sync RECV将设备上的文件读取到内存
+        :param remote:
+            设备上的路径
+        :param buf:
+            可以复用的缓冲区, 长度不足时重新分配, 不会改变buf的大小
+        :return:
+            文件内容的memoryview
+        """
+        with self._client.sync(self.device_id) as sync:
+            return sync.pull(remote, buf)
 
     def install_app(self, filepath, replace=False, install_options=None):
         """
@@ -762,17 +841,22 @@ class _Device(_ADB):
         logger.info("'{}' is running in the foreground", package)
         return package
 
-    def get_display_info(self):
-        display_info = self.getPhysicalDisplayInfo()
-        orientation = self.getDisplayOrientation()
-        max_x, max_y = self.getMaxXY()
-        display_info.update({
-            "orientation": orientation,
-            "rotation": orientation * 90,
-            "max_x": max_x,
-            "max_y": max_y,
-        })
-        return display_info
+    def get_display_info(self) -> dict:
+        """
+        获取屏幕信息, 静态信息从缓存中读取
+
+        Returns:
+            包含width,height,density,max_x,max_y,orientation,rotation的dict
+        """
+        return self._display_info.get()
+
+    def update_orientation(self, orientation: int):
+        """更新缓存的屏幕方向"""
+        self._display_info.update_orientation(orientation)
+
+    def invalidate_display_info(self):
+        """清除屏幕信息缓存"""
+        self._display_info.invalidate()
 
 
 class ADB(_Device):
@@ -0,0 +1,384 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+adb host协议客户端,直接与adb server(host:port)通讯,避免每条命令都启动一次adb进程
+协议说明: https://android.googlesource.com/platform/packages/modules/adb/+/refs/heads/master/OVERVIEW.TXT
+"""
+import socket
+import struct
+import threading
+import time
+from typing import Union, Tuple, Callable, Optional
+
+from loguru import logger
+
+from core.error import AdbError
+from core.utils.snippet import split_cmd
+
+# shell v2 协议的packet id
+SHELL_V2_STDIN = 0
+SHELL_V2_STDOUT = 1
+SHELL_V2_STDERR = 2
+SHELL_V2_EXIT = 3
+# sync 协议单个DATA包的最大长度
+SYNC_DATA_MAX = 64 * 1024
+
+
+class AdbConnection(object):
+    """与adb server的一条连接, adb server处理完一次请求后会关闭该连接"""
+
+    def __init__(self, host: str, port: int, timeout: float = None):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def send_request(self, request: str):
+        """发送 4位16进制长度 + 请求内容"""
+        data = request.encode('utf-8')
+        self.sock.sendall(b'%04x' % len(data) + data)
+
+    def recv_exact(self, size: int) -> bytes:
+        buf = bytearray(size)
+        view = memoryview(buf)
+        pos = 0
+        while pos < size:
+            n = self.sock.recv_into(view[pos:], size - pos)
+            if n == 0:
+                raise socket.error("adb connection broken")
+            pos += n
+        return bytes(buf)
+
+    def recv_string(self) -> bytes:
+        """读取 4位16进制长度 + 内容"""
+        size = int(self.recv_exact(4), 16)
+        return self.recv_exact(size)
+
+    def check_status(self, request: str = ''):
+        """读取OKAY/FAIL, FAIL时抛出AdbError"""
+        status = self.recv_exact(4)
+        if status == b'OKAY':
+            return
+        if status == b'FAIL':
+            raise AdbError(b'', self.recv_string(), [request])
+        raise AdbError(b'', b'unexpected status: ' + status, [request])
+
+    def read_all(self) -> bytes:
+        chunks = []
+        while True:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class SyncConnection(object):
+    """
+    adb sync协议 (STAT/RECV/SEND)
+    https://android.googlesource.com/platform/packages/modules/adb/+/refs/heads/master/SYNC.TXT
+    """
+
+    def __init__(self, conn: AdbConnection):
+        self.conn = conn
+
+    def _send_request(self, cmd: bytes, data: bytes):
+        self.conn.sock.sendall(cmd + struct.pack('<I', len(data)) + data)
+
+    def _raise_fail(self, path: str):
+        size = struct.unpack('<I', self.conn.recv_exact(4))[0]
+        raise AdbError(b'', self.conn.recv_exact(size), ['sync', 'SEND', path])
+
+    def stat(self, path: str) -> Tuple[int, int, int]:
+        """
+        Returns:
+            mode, size, mtime; 文件不存在时mode为0
+        """
+        self._send_request(b'STAT', path.encode('utf-8'))
+        resp = self.conn.recv_exact(16)
+        if resp[:4] != b'STAT':
+            raise AdbError(b'', b'unexpected sync response: ' + resp[:4], ['sync', 'STAT', path])
+        return struct.unpack('<III', resp[4:])
+
+    def exists(self, path: str) -> bool:
+        return self.stat(path)[0] != 0
+
+    def pull(self, path: str, buf: bytearray = None) -> memoryview:
+        """
+        读取设备上的文件到内存
+
+        Args:
+            path: 设备上的路径
+            buf: 预先分配的缓冲区, 长度不足时使用新分配的缓冲区, 不会改变buf的大小,
+                因此buf可以有memoryview等导出, 例如BufferPool中的缓冲区
+        Returns:
+            包含文件内容的memoryview, 不一定指向buf
+        """
+        mode, size, _ = self.stat(path)
+        if mode == 0:
+            raise AdbError(b'', ('remote object %r does not exist' % path).encode(), ['sync', 'RECV', path])
+        if buf is None or len(buf) < size:
+            buf = bytearray(size)
+        view = memoryview(buf)
+        self._send_request(b'RECV', path.encode('utf-8'))
+        pos = 0
+        while True:
+            header = self.conn.recv_exact(8)
+            cmd, length = header[:4], struct.unpack('<I', header[4:])[0]
+            if cmd == b'DONE':
+                break
+            if cmd == b'FAIL':
+                raise AdbError(b'', self.conn.recv_exact(length), ['sync', 'RECV', path])
+            if cmd != b'DATA':
+                raise AdbError(b'', b'unexpected sync response: ' + cmd, ['sync', 'RECV', path])
+            if pos + length > len(buf):
+                # 文件在STAT之后变大了, 换成更大的缓冲区, 调用者的buf可能有导出, 不能extend
+                grown = bytearray(max(pos + length, len(buf) * 2))
+                grown[:pos] = view[:pos]
+                view.release()
+                buf = grown
+                view = memoryview(buf)
+            self._recv_into(view[pos:pos + length])
+            pos += length
+        return view[:pos]
+
+    def _recv_into(self, view: memoryview):
+        pos, size = 0, len(view)
+        while pos < size:
+            n = self.conn.sock.recv_into(view[pos:], size - pos)
+            if n == 0:
+                raise socket.error("adb connection broken")
+            pos += n
+
+    def push(self, data: Union[bytes, bytearray, memoryview], path: str, mode: int = 0o644, mtime: int = None):
+        """
+        将内存中的数据写入设备上的文件
+
+        Args:
+            data: 文件内容
+            path: 设备上的路径
+            mode: 文件权限
+            mtime: 修改时间, 默认为当前时间
+        """
+        self._send_request(b'SEND', ('%s,%d' % (path, 0o100000 | mode)).encode('utf-8'))
+        view = memoryview(data)
+        for offset in range(0, len(view), SYNC_DATA_MAX):
+            chunk = view[offset:offset + SYNC_DATA_MAX]
+            self.conn.sock.sendall(b'DATA' + struct.pack('<I', len(chunk)))
+            self.conn.sock.sendall(chunk)
+        self.conn.sock.sendall(b'DONE' + struct.pack('<I', int(mtime if mtime is not None else time.time())))
+        resp = self.conn.recv_exact(4)
+        if resp == b'FAIL':
+            self._raise_fail(path)
+        self.conn.recv_exact(4)
+        if resp != b'OKAY':
+            raise AdbError(b'', b'unexpected sync response: ' + resp, ['sync', 'SEND', path])
+
+    def close(self):
+        try:
+            self.conn.sock.sendall(b'QUIT' + struct.pack('<I', 0))
+        except socket.error:
+            pass
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class AdbClient(object):
+    """
+    adb server客户端
+
+    Args:
+        host: adb server地址
+        port: adb server端口
+        start_server: 连接被拒绝时调用,用于拉起adb server
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 5037, start_server: Callable = None):
+        self.host = host
+        self.port = port
+        self._start_server = start_server
+        self._features = {}
+        self._lock = threading.Lock()
+
+    def connection(self, timeout: float = None) -> AdbConnection:
+        try:
+            return AdbConnection(self.host, self.port, timeout)
+        except ConnectionRefusedError:
+            if not self._start_server:
+                raise
+            logger.info('adb server not running, start it')
+            self._start_server()
+            return AdbConnection(self.host, self.port, timeout)
+
+    def host_query(self, request: str) -> bytes:
+        """
+        请求host服务并读取返回的字符串,例如 host:devices host:version
+
+        Returns:
+            服务返回的内容
+        """
+        with self.connection() as conn:
+            conn.send_request(request)
+            conn.check_status(request)
+            return conn.recv_string()
+
+    def host_command(self, request: str):
+        """
+        请求需要两次status的host服务,例如 forward/killforward
+        第一次OKAY表示连接到transport,第二次表示执行结果
+        """
+        with self.connection() as conn:
+            conn.send_request(request)
+            conn.check_status(request)
+            conn.check_status(request)
+
+    def transport(self, serial: str, timeout: float = None) -> AdbConnection:
+        """切换到设备的transport,返回的连接可以继续请求设备服务"""
+        conn = self.connection(timeout)
+        request = 'host:transport:%s' % serial
+        try:
+            conn.send_request(request)
+            conn.check_status(request)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def open_service(self, serial: str, service: str, timeout: float = None) -> AdbConnection:
+        """打开设备上的服务, 例如 shell:ls exec:screencap"""
+        conn = self.transport(serial, timeout)
+        try:
+            conn.send_request(service)
+            conn.check_status(service)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def version(self) -> int:
+        return int(self.host_query('host:version'), 16)
+
+    def devices(self) -> bytes:
+        return self.host_query('host:devices')
+
+    def get_state(self, serial: str) -> bytes:
+        return self.host_query('host-serial:%s:get-state' % serial)
+
+    def features(self, serial: str) -> set:
+        """设备支持的特性,结果会被缓存"""
+        with self._lock:
+            features = self._features.get(serial)
+        if features is None:
+            features = set(self.host_query('host-serial:%s:features' % serial).decode('utf-8').split(','))
+            with self._lock:
+                self._features[serial] = features
+        return features
+
+    def connect_device(self, address: str) -> bytes:
+        return self.host_query('host:connect:%s' % address)
+
+    def disconnect_device(self, address: str) -> bytes:
+        return self.host_query('host:disconnect:%s' % address)
+
+    def forward(self, serial: str, local: str, remote: str, no_rebind: bool = True):
+        norebind = 'norebind:' if no_rebind else ''
+        self.host_command('host-serial:%s:forward:%s%s;%s' % (serial, norebind, local, remote))
+
+    def remove_forward(self, serial: str, local: str = None):
+        if local:
+            self.host_command('host-serial:%s:killforward:%s' % (serial, local))
+        else:
+            self.host_command('host-serial:%s:killforward-all' % serial)
+
+    def list_forward(self) -> bytes:
+        return self.host_query('host:list-forward')
+
+    def shell(self, serial: str, cmds: Union[list, str], timeout: float = None) -> Tuple[bytes, bytes, int]:
+        """
+        运行shell命令,设备支持shell_v2时可以拿到stderr与返回码
+
+        Args:
+            serial: 设备id
+            cmds: 需要运行的命令
+            timeout: socket超时时间
+        Returns:
+            stdout, stderr, returncode
+        """
+        command = ' '.join(split_cmd(cmds))
+        if 'shell_v2' not in self.features(serial):
+            with self.open_service(serial, 'shell:%s' % command, timeout) as conn:
+                return conn.read_all(), b'', 0
+
+        stdout, stderr, returncode = [], [], 0
+        with self.open_service(serial, 'shell,v2,raw:%s' % command, timeout) as conn:
+            while True:
+                try:
+                    header = conn.recv_exact(5)
+                except socket.error:
+                    break
+                packet_id, size = struct.unpack('<BI', header)
+                data = conn.recv_exact(size)
+                if packet_id == SHELL_V2_STDOUT:
+                    stdout.append(data)
+                elif packet_id == SHELL_V2_STDERR:
+                    stderr.append(data)
+                elif packet_id == SHELL_V2_EXIT:
+                    returncode = data[0]
+                    break
+        return b''.join(stdout), b''.join(stderr), returncode
+
+    def sync(self, serial: str, timeout: Optional[float] = None) -> SyncConnection:
+        """打开sync服务, 用于push/pull/stat"""
+        return SyncConnection(self.open_service(serial, 'sync:', timeout))
+
+    def exec_out(self, serial: str, cmds: Union[list, str], timeout: float = None) -> bytes:
+        """exec:<cmd> 不经过pty,返回原始的二进制stdout"""
+        with self.open_service(serial, 'exec:%s' % ' '.join(split_cmd(cmds)), timeout) as conn:
+            return conn.read_all()
+
+    def exec_out_into(self, serial: str, cmds: Union[list, str], buf: bytearray,
+                      timeout: float = None) -> memoryview:
+        """
+        exec:<cmd> 将stdout直接读取到buf中, 长度不足时扩容
+        buf比输出多至少一个字节时不会扩容, 读取EOF不需要额外的空间
+
+        Args:
+            serial: 设备id
+            cmds: 需要运行的命令
+            buf: 预先分配的缓冲区
+            timeout: socket超时时间
+        Returns:
+            包含stdout的memoryview
+        """
+        with self.open_service(serial, 'exec:%s' % ' '.join(split_cmd(cmds)), timeout) as conn:
+            view = memoryview(buf)
+            pos = 0
+            while True:
+                if pos == len(buf):
+                    # 缓冲区已满, 确认还有数据时才扩容
+                    chunk = conn.sock.recv(SYNC_DATA_MAX)
+                    if not chunk:
+                        break
+                    view.release()
+                    buf.extend(bytearray(max(len(buf), len(chunk))))
+                    view = memoryview(buf)
+                    view[pos:pos + len(chunk)] = chunk
+                    pos += len(chunk)
+                    continue
+                n = conn.sock.recv_into(view[pos:])
+                if n == 0:
+                    break
+                pos += n
+        return view[:pos]
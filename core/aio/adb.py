@@ -0,0 +1,178 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+asyncio版本的adb
+shell/exec/forward等高频调用直接通过asyncio stream与adb server通讯
+获取屏幕信息,安装文件等低频调用交给线程池中的同步ADB
+"""
+import asyncio
+import functools
+import struct
+from typing import Union, Tuple
+
+from loguru import logger
+
+from core.adb import ADB
+from core.adbclient import SHELL_V2_STDOUT, SHELL_V2_STDERR, SHELL_V2_EXIT
+from core.constant import SHELL_ENCODING
+from core.error import AdbError
+from core.utils.snippet import split_cmd, split_process_status
+
+
+class AsyncADB(object):
+    """
+    Args:
+        adb: 同步的ADB对象,用于低频调用
+    """
+
+    def __init__(self, adb: ADB):
+        self.adb = adb
+        self.device_id = adb.device_id
+        self.host = adb.host
+        self.port = adb.port
+        self._shell_v2 = 'shell_v2' in adb._client.features(self.device_id)
+
+    @classmethod
+    async def create(cls, device_id: str = None, adb_path: str = None, host='127.0.0.1', port=5037) -> 'AsyncADB':
+        """在线程池中初始化同步ADB, 不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: cls(ADB(device_id, adb_path, host, port)))
+
+    async def run_sync(self, func, *args, **kwargs):
+        """在线程池中运行同步函数"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    async def _check_status(self, reader: asyncio.StreamReader, request: str):
+        status = await reader.readexactly(4)
+        if status == b'OKAY':
+            return
+        if status == b'FAIL':
+            size = int(await reader.readexactly(4), 16)
+            raise AdbError(b'', await reader.readexactly(size), [request])
+        raise AdbError(b'', b'unexpected status: ' + status, [request])
+
+    async def _request(self, writer: asyncio.StreamWriter, reader: asyncio.StreamReader, request: str):
+        data = request.encode('utf-8')
+        writer.write(b'%04x' % len(data) + data)
+        await writer.drain()
+        await self._check_status(reader, request)
+
+    async def host_command(self, request: str):
+        """需要两次status的host服务, 例如forward"""
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            await self._request(writer, reader, request)
+            await self._check_status(reader, request)
+        finally:
+            writer.close()
+
+    async def open_service(self, service: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """打开设备上的服务, 返回的stream由调用者关闭"""
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            await self._request(writer, reader, 'host:transport:%s' % self.device_id)
+            await self._request(writer, reader, service)
+        except Exception:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def raw_shell(self, cmds: Union[list, str], ensure_unicode: bool = True, skip_error: bool = False):
+        cmds = split_cmd(cmds)
+        command = ' '.join(cmds)
+        logger.debug('adb -s {} shell {}', self.device_id, command)
+        stdout, stderr, returncode = [], [], 0
+        if self._shell_v2:
+            reader, writer = await self.open_service('shell,v2,raw:%s' % command)
+            try:
+                while True:
+                    try:
+                        packet_id, size = struct.unpack('<BI', await reader.readexactly(5))
+                    except asyncio.IncompleteReadError:
+                        break
+                    data = await reader.readexactly(size)
+                    if packet_id == SHELL_V2_STDOUT:
+                        stdout.append(data)
+                    elif packet_id == SHELL_V2_STDERR:
+                        stderr.append(data)
+                    elif packet_id == SHELL_V2_EXIT:
+                        returncode = data[0]
+                        break
+            finally:
+                writer.close()
+        else:
+            reader, writer = await self.open_service('shell:%s' % command)
+            try:
+                stdout.append(await reader.read())
+            finally:
+                writer.close()
+
+        stdout, stderr = b''.join(stdout), b''.join(stderr)
+        if returncode > 0 and not skip_error:
+            raise AdbError(stdout, stderr, ['shell'] + cmds)
+        return stdout.decode(SHELL_ENCODING) if ensure_unicode else stdout
+
+    async def shell(self, cmds: Union[list, str]) -> str:
+        return await self.raw_shell(cmds)
+
+    async def exec_out(self, cmds: Union[list, str]) -> bytes:
+        """exec:<cmd> 返回原始的二进制stdout"""
+        reader, writer = await self.open_service('exec:%s' % ' '.join(split_cmd(cmds)))
+        try:
+            return await reader.read()
+        finally:
+            writer.close()
+
+    async def start_shell(self, cmds: Union[list, str]) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """
+        启动一个常驻的shell命令, 例如minicap服务
+        关闭writer时设备上的进程会收到SIGHUP
+
+        Returns:
+            reader, writer
+        """
+        command = ' '.join(split_cmd(cmds))
+        logger.debug('adb -s {} shell {}', self.device_id, command)
+        return await self.open_service('shell:%s' % command)
+
+    async def kill_process(self, name: str):
+        out = await self.raw_shell("ps | grep -w \"{}\"".format(name), skip_error=True)
+        for process in split_process_status(out) or []:
+            await self.raw_shell(['kill', process['PID']], skip_error=True)
+            logger.info('{} PID:{} NAME:{} is kill', self.device_id, process['PID'], process['NAME'])
+
+    async def set_forward(self, remote: str) -> int:
+        """
+        为remote分配端口并forward, 已经forward的remote直接返回端口
+
+        Returns:
+            本地端口
+        """
+        forwards = self.adb._forwards
+        using = forwards.find(self.device_id, remote=remote)
+        if using and using['local'].startswith('tcp:'):
+            return int(using['local'][4:])
+        port = forwards.allocate_port(self.host)
+        local = 'tcp:%d' % port
+        try:
+            await self.host_command('host-serial:%s:forward:norebind:%s;%s' % (self.device_id, local, remote))
+        except Exception:
+            forwards.release_port(port)
+            raise
+        forwards.record(self.device_id, local, remote)
+        logger.debug('forward {} {}', local, remote)
+        return port
+
+    async def remove_forward(self, local: str = None):
+        if local:
+            await self.host_command('host-serial:%s:killforward:%s' % (self.device_id, local))
+        else:
+            await self.host_command('host-serial:%s:killforward-all' % self.device_id)
+        self.adb._forwards.discard(self.device_id, local)
+
+    async def get_display_info(self) -> dict:
+        return await self.run_sync(self.adb.get_display_info)
+
+    async def getDisplayOrientation(self) -> int:
+        return await self.run_sync(self.adb.getDisplayOrientation)
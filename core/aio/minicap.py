@@ -0,0 +1,96 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import asyncio
+import struct
+import threading
+
+from loguru import logger
+
+from core.aio.adb import AsyncADB
+from core.cap_methods.minicap import _Minicap, CaptureProfile
+from core.constant import MNC_HOME, MNC_LOCAL_NAME
+
+
+class AsyncMinicap(_Minicap):
+    """asyncio版本的minicap, 安装和参数计算复用同步实现并在线程池中运行"""
+
+    def __init__(self, aadb: AsyncADB, profile: CaptureProfile = None):
+        self.aadb = aadb
+        self.adb = aadb.adb
+        self.MNC_LOCAL_NAME = MNC_LOCAL_NAME.format(self.adb.get_device_id())
+        self.MNC_PORT = 0
+        self.quirk_flag = 0
+        self.display_info = None
+        self.profile = profile or CaptureProfile()
+        self.frame_scale = 1.0
+        self._frame_bytes = {}
+        self._server = None
+        self._server_reader = None
+        self._update_rotation_event = threading.Event()
+
+    async def start(self):
+        await self.aadb.run_sync(self.install)
+        await self.start_server()
+
+    async def start_server(self):
+        self.MNC_PORT = await self.aadb.set_forward('localabstract:%s' % self.MNC_LOCAL_NAME)
+        logger.info("minicap start in port:{}", self.MNC_PORT)
+        # 如果之前服务在运行,则销毁
+        await self.aadb.kill_process(MNC_HOME)
+        params, display_info = await self.aadb.run_sync(self._get_params)
+        reader, writer = await self.aadb.start_shell(self._server_cmds(params))
+        while True:
+            try:
+                line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+            except asyncio.TimeoutError:
+                writer.close()
+                raise RuntimeError("minicap server setup timeout")
+            if not line:
+                writer.close()
+                raise RuntimeError('minicap server quit immediately')
+            if b"Server start" in line:
+                break
+        self._server_reader, self._server = reader, writer
+
+    def set_profile(self, profile: CaptureProfile):
+        """切换采集参数, 下一次get_frame时重启服务"""
+        if profile != self.profile:
+            self.profile = profile
+            self._update_rotation_event.set()
+
+    async def get_frame(self) -> bytes:
+        if self._update_rotation_event.is_set():
+            logger.info('minicap update_rotation')
+            await self.teardown()
+            await self.start_server()
+            self._update_rotation_event.clear()
+        return await self._get_frame()
+
+    async def _get_frame(self):
+        reader, writer = await asyncio.open_connection(self.adb.host, self.MNC_PORT)
+        try:
+            ori = self._parse_banner(await reader.readexactly(24))
+            if self.quirk_flag & 2 and ori not in (0, 1, 2):
+                logger.error("quirk_flag found:{}, going to resetup", self.quirk_flag)
+                self._update_rotation_event.set()
+                return None
+            writer.write(b"1")
+            await writer.drain()
+            if self.RECVTIMEOUT is not None:
+                header = await asyncio.wait_for(reader.readexactly(4), self.RECVTIMEOUT)
+            else:
+                header = await reader.readexactly(4)
+            frame_size = struct.unpack("<I", header)[0]
+            self._record_frame(frame_size)
+            return await reader.readexactly(frame_size)
+        finally:
+            writer.close()
+
+    async def teardown(self):
+        """close server"""
+        if self._server:
+            self._server.close()
+            self._server = None
+        await self.aadb.kill_process(MNC_HOME)
+        await self.aadb.remove_forward('tcp:{}'.format(self.MNC_PORT))
+        logger.info('minicap teardown')
@@ -0,0 +1,108 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import asyncio
+import re
+
+from loguru import logger
+
+from core.aio.adb import AsyncADB
+from core.constant import TEMP_HOME, MNT_HOME, MNT_LOCAL_NAME
+from core.touch_methods.minitouch import Minitouch
+from core.utils.snippet import str2byte
+
+
+class AsyncMinitouch(Minitouch):
+    """asyncio版本的minitouch, 坐标转换复用同步实现"""
+
+    def __init__(self, aadb: AsyncADB):
+        self.aadb = aadb
+        self.adb = aadb.adb
+        self.HOME = TEMP_HOME
+        self.MNT_HOME = MNT_HOME
+        self.MNT_PORT = None
+        self.MNT_LOCAL_NAME = MNT_LOCAL_NAME.format(self.adb.get_device_id())
+        self.max_x, self.max_y = None, None
+        self.size_info = None
+        self._server = None
+        self._reader = None
+        self._writer = None
+
+    async def start(self):
+        await self.aadb.run_sync(self._is_mnt_install)
+        self.MNT_PORT = await self.aadb.set_forward('localabstract:%s' % self.MNT_LOCAL_NAME)
+        await self.setup_server()
+        await self.setup_client()
+        self.size_info = await self.aadb.get_display_info()
+        logger.info('minitouch init, port:{} name:{}, max_x={}, max_y={}', self.MNT_PORT, self.MNT_LOCAL_NAME,
+                    self.max_x, self.max_y)
+
+    async def setup_server(self):
+        # 如果之前服务在运行,则销毁
+        await self.aadb.kill_process(MNT_HOME)
+        reader, writer = await self.aadb.start_shell("{path} -n '{name}' 2>&1".format(path=self.MNT_HOME,
+                                                                                      name=self.MNT_LOCAL_NAME))
+        while True:
+            try:
+                line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+            except asyncio.TimeoutError:
+                writer.close()
+                raise RuntimeError("minitouch setup timeout")
+            if not line:
+                raise RuntimeError("minitouch server quit immediately")
+            m = re.search(r"Type \w touch device .+ \((\d+)x(\d+) with \d+ contacts\) detected on .+ \(.+\)",
+                          line.decode('utf-8', 'ignore'))
+            if m:
+                self.max_x, self.max_y = int(m.group(1)), int(m.group(2))
+                break
+            else:
+                self.max_x = 32768
+                self.max_y = 32768
+        self._server = writer
+
+    async def setup_client(self):
+        self._reader, self._writer = await asyncio.open_connection(self.adb.host, self.MNT_PORT)
+        header = b""
+        while header.count(b'\n') < 3:
+            try:
+                chunk = await asyncio.wait_for(self._reader.read(4096), timeout=2)
+            except asyncio.TimeoutError:
+                logger.warning("minitouch header not recved")
+                break
+            if not chunk:
+                break
+            header += chunk
+        logger.debug("minitouch header:{}", repr(header))
+
+    async def update_rotation(self, rotation):
+        logger.info("touch update_rotation: {}", rotation)
+        self.size_info = await self.aadb.get_display_info()
+
+    async def send(self, content: str):
+        self._writer.write(str2byte(content))
+        await self._writer.drain()
+
+    async def sleep(self, duration):
+        await self.send('w {}\n'.format(duration))
+
+    async def down(self, x: int, y: int, index: int = 0, pressure: int = 50):
+        x, y = self.transform(x, y)
+        await self.send('d {} {} {} {}\nc\n'.format(index, x, y, pressure))
+
+    async def up(self, x: int, y: int, index: int = 0):
+        await self.send('u {}\nc\n'.format(index))
+
+    async def reset_events(self):
+        await self.send('r\n')
+
+    async def click(self, x: int, y: int, index: int = 0, duration=0.1):
+        x, y = self.transform(x, y)
+        # down, wait, up 一次发送, minitouch在设备端处理等待
+        await self.send('d {index} {x} {y} 50\nc\nw {ms:.0f}\nu {index}\nc\n'.format(
+            index=index, x=x, y=y, ms=duration * 1000))
+
+    async def teardown(self):
+        if self._writer:
+            self._writer.close()
+        if self._server:
+            self._server.close()
+        await self.aadb.remove_forward('tcp:{}'.format(self.MNT_PORT))
@@ -0,0 +1,138 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+asyncio版本的Android, 单个事件循环可以同时驱动多台设备
+
+async def main():
+    devices = await asyncio.gather(*[AsyncAndroid.create(device_id) for device_id in device_ids])
+    frames = await asyncio.gather(*[device.screenshot() for device in devices])
+"""
+import asyncio
+import time
+
+from loguru import logger
+
+from core.aio.adb import AsyncADB
+from core.aio.minicap import AsyncMinicap
+from core.aio.minitouch import AsyncMinitouch
+from core.cap_methods.adbcap import AdbCap
+from core.constant import TOUCH_METHOD, CAP_METHOD, SDK_VERISON_ANDROID10
+from core.error import CaptureError
+from core.frame import Frame
+from core.touch_methods.event_touch import Touch as EVENTTOUCH
+from core.touch_methods.maxtouch import Maxtouch
+
+
+class AsyncAndroid(object):
+    ROTATION_INTERVAL = 2
+
+    def __init__(self, aadb: AsyncADB, touch_method: str = TOUCH_METHOD.MINITOUCH,
+                 cap_method: str = CAP_METHOD.MINICAP):
+        self.aadb = aadb
+        self.adb = aadb.adb
+        self.cap_method = cap_method
+        self.touch_method = touch_method
+        if self.adb.sdk_version() >= SDK_VERISON_ANDROID10 and self.touch_method == TOUCH_METHOD.MINITOUCH:
+            self.touch_method = TOUCH_METHOD.MAXTOUCH
+        self.cap = None
+        self.touch = None
+        self._rotation_task = None
+        self.current_orientation = None
+        self._frame_seq = 0
+
+    @classmethod
+    async def create(cls, device_id=None, adb_path=None, host='127.0.0.1', port=5037,
+                     touch_method: str = TOUCH_METHOD.MINITOUCH,
+                     cap_method: str = CAP_METHOD.MINICAP) -> 'AsyncAndroid':
+        aadb = await AsyncADB.create(device_id, adb_path, host, port)
+        device = cls(aadb, touch_method, cap_method)
+        await device.start()
+        return device
+
+    async def start(self):
+        await asyncio.gather(self._start_cap(), self._start_touch())
+        self.current_orientation = await self.aadb.getDisplayOrientation()
+        self.adb.update_orientation(self.current_orientation)
+        self._rotation_task = asyncio.ensure_future(self._watch_rotation())
+
+    async def _start_cap(self):
+        if self.cap_method == CAP_METHOD.MINICAP:
+            self.cap = AsyncMinicap(self.aadb)
+            await self.cap.start()
+        elif self.cap_method == CAP_METHOD.ADBCAP:
+            self.cap = AdbCap(self.adb)
+        else:
+            raise ValueError('cap_method {} is not supported by AsyncAndroid'.format(self.cap_method))
+
+    async def _start_touch(self):
+        if self.touch_method == TOUCH_METHOD.MINITOUCH:
+            self.touch = AsyncMinitouch(self.aadb)
+            await self.touch.start()
+        elif self.touch_method == TOUCH_METHOD.MAXTOUCH:
+            self.touch = await self.aadb.run_sync(Maxtouch, self.adb)
+        elif self.touch_method == TOUCH_METHOD.ADBTOUCH:
+            self.touch = await self.aadb.run_sync(EVENTTOUCH, self.adb)
+
+    async def _watch_rotation(self):
+        while True:
+            await asyncio.sleep(self.ROTATION_INTERVAL)
+            try:
+                await self._check_rotation()
+            except Exception as err:
+                # 一次wm/dumpsys失败不应该结束任务, 下次继续检查
+                logger.error('{} watch rotation error: {}', self.adb.device_id, err)
+
+    async def _check_rotation(self):
+        ori = await self.aadb.getDisplayOrientation()
+        if ori is None or ori == self.current_orientation:
+            return
+        logger.info('update orientation {}->{}'.format(self.current_orientation, ori))
+        self.current_orientation = ori
+        self.adb.update_orientation(ori)
+        await self._on_rotation(ori * 90)
+
+    async def _on_rotation(self, rotation: int):
+        if isinstance(self.touch, AsyncMinitouch):
+            await self.touch.update_rotation(rotation)
+        else:
+            await self.aadb.run_sync(self.touch.update_rotation, rotation)
+        if isinstance(self.cap, AsyncMinicap):
+            self.cap.update_rotation(rotation)
+
+    async def screenshot(self) -> Frame:
+        """
+        Raises:
+            CaptureError: 重试一次后仍然没有收到图片
+        """
+        stamp = time.time()
+        self._frame_seq += 1
+        rotation = (self.current_orientation or 0) * 90
+        if isinstance(self.cap, AsyncMinicap):
+            # minicap超时或者quirk需要重启时返回None, 重试一次
+            img_data = await self.cap.get_frame() or await self.cap.get_frame()
+            if img_data is None:
+                raise CaptureError('{} minicap returned no frame'.format(self.adb.device_id))
+            frame = Frame(img_data, seq=self._frame_seq, rotation=rotation)
+            # 解码在线程池中进行, cv2会释放GIL, 避免阻塞事件循环
+            await self.aadb.run_sync(frame.imread)
+        else:
+            frame = Frame(image=await self.aadb.run_sync(self.cap.get_frame), seq=self._frame_seq, rotation=rotation)
+        logger.info("screenshot time={:.2f}ms, {}", (time.time() - stamp) * 1000, frame)
+        return frame
+
+    async def click(self, x: int, y: int, index: int = 0, duration=0.1):
+        logger.info("[{}]index={}, x={}, y={}", self.touch_method, index, x, y)
+        if isinstance(self.touch, AsyncMinitouch):
+            return await self.touch.click(x, y, index=index, duration=duration)
+        return await self.aadb.run_sync(self.touch.click, x, y, index=index, duration=duration)
+
+    async def shell(self, cmd) -> str:
+        return await self.aadb.shell(cmd)
+
+    async def close(self):
+        if self._rotation_task:
+            self._rotation_task.cancel()
+        if isinstance(self.cap, AsyncMinicap):
+            await self.cap.teardown()
+        if isinstance(self.touch, AsyncMinitouch):
+            await self.touch.teardown()
@@ -0,0 +1,172 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+测试设备上各个截图/触控组件能否启动以及延迟, 选择最快的组合
+结果按设备serial和ro.build.fingerprint保存在CALIBRATION_PATH中, 之后不需要再测试
+"""
+import json
+import os
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from loguru import logger
+
+from core.constant import CAP_METHOD, TOUCH_METHOD, CALIBRATION_PATH
+from core.utils.decoder import decode_jpeg
+
+CAP_CANDIDATES = [CAP_METHOD.MINICAP, CAP_METHOD.JAVACAP, CAP_METHOD.ADBCAP]
+TOUCH_CANDIDATES = [TOUCH_METHOD.MAXTOUCH, TOUCH_METHOD.MINITOUCH, TOUCH_METHOD.ADBTOUCH]
+
+
+class Calibration(object):
+    """
+    Args:
+        adb: adb instance of android device
+        create: 创建组件的函数, 参数为组件名, 例如Android._get_component
+        samples: 每个组件测试的次数
+        path: 保存结果的文件
+    """
+    _file_lock = threading.Lock()
+    FRAME_TIMEOUT = 5  # stream模式下等待新帧的时间
+
+    def __init__(self, adb, create: Callable[[str], object], samples: int = 10, path: str = CALIBRATION_PATH):
+        self.adb = adb
+        self.create = create
+        self.samples = samples
+        self.path = path
+        self.results = {}  # {组件名: 测试结果}
+
+    @property
+    def key(self) -> str:
+        return '{}|{}'.format(self.adb.get_device_id(decode=True), self.adb.getprop('ro.build.fingerprint'))
+
+    def load(self) -> Dict:
+        if not os.path.isfile(self.path):
+            return {}
+        with self._file_lock:
+            try:
+                with open(self.path, 'r') as f:
+                    return json.load(f)
+            except ValueError:
+                logger.warning('calibration file {} is broken, ignore it', self.path)
+                return {}
+
+    def save(self, cap_method: str, touch_method: str):
+        with self._file_lock:
+            data = {}
+            if os.path.isfile(self.path):
+                try:
+                    with open(self.path, 'r') as f:
+                        data = json.load(f)
+                except ValueError:
+                    pass
+            data[self.key] = {'cap_method': cap_method, 'touch_method': touch_method, 'results': self.results,
+                              'time': int(time.time())}
+            with open(self.path, 'w') as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+
+    def _probe(self, name: str, call: Callable[[object], object],
+               teardown: Callable[[str, object], None]) -> Tuple[Dict, object]:
+        """创建组件并调用samples次call, 返回测试结果和组件"""
+        stamp = time.time()
+        component = None
+        try:
+            component = self.create(name)
+            startup = (time.time() - stamp) * 1000
+            costs = []
+            for _ in range(self.samples):
+                stamp = time.time()
+                if call(component) is None:
+                    raise RuntimeError('{} returned None'.format(name))
+                costs.append((time.time() - stamp) * 1000)
+        except Exception as err:
+            logger.warning('{} calibration {} failed: {}', self.adb.device_id, name, err)
+            if component is not None:
+                teardown(name, component)
+            result = {'ok': False, 'error': str(err)}
+            if isinstance(err, socket.timeout):
+                # 超时可能只是设备暂时繁忙, 不能作为组件不可用的依据
+                result['timeout'] = True
+            return result, None
+        result = {'ok': True, 'startup': round(startup, 2), 'p50': round(float(np.percentile(costs, 50)), 2),
+                  'p95': round(float(np.percentile(costs, 95)), 2)}
+        logger.info('{} calibration {}: {}', self.adb.device_id, name, result)
+        return result, component
+
+    def _choose(self, candidates: List[str], call: Callable[[object], object],
+                teardown: Callable[[str, object], None]) -> str:
+        probed = {}
+        for name in candidates:
+            self.results[name], component = self._probe(name, call, teardown)
+            if component is not None:
+                probed[name] = component
+        if not probed:
+            raise RuntimeError('no method works on {}: {}'.format(self.adb.device_id, candidates))
+        best = min(probed, key=lambda name: (self.results[name]['p50'], self.results[name]['p95']))
+        for name, component in probed.items():
+            if name != best:
+                teardown(name, component)
+        return best
+
+    def run(self, teardown: Callable[[str, object], None], force: bool = False) -> Tuple[str, str]:
+        """
+        测试全部组件, 已经保存过结果时直接返回
+
+        Args:
+            teardown: 关闭没有被选择的组件, 参数为组件名与组件
+            force: 忽略保存的结果, 重新测试
+        Returns:
+            (cap_method, touch_method)
+        """
+        cached = None if force else self.load().get(self.key)
+        if cached:
+            logger.info('{} calibration cached: cap={}, touch={}', self.adb.device_id, cached['cap_method'],
+                        cached['touch_method'])
+            self.results = cached.get('results', {})
+            return cached['cap_method'], cached['touch_method']
+        cap_method = self._choose(CAP_CANDIDATES, self._fresh_frame, teardown)
+        touch_method = self._choose(TOUCH_CANDIDATES, self._touch_noop, teardown)
+        timeouts = [name for name, result in self.results.items() if result.get('timeout')]
+        if timeouts:
+            logger.warning('{} calibration {} timeout, result is not saved', self.adb.device_id, timeouts)
+        else:
+            self.save(cap_method, touch_method)
+        logger.info('{} calibration done: cap={}, touch={}', self.adb.device_id, cap_method, touch_method)
+        return cap_method, touch_method
+
+    def _fresh_frame(self, cap) -> np.ndarray:
+        """
+        获取一帧调用之后才产生的画面并解码, 测量从请求到拿到可用图像的延迟
+        stream模式下缓冲区中总有现成的帧, 直接get_frame只是读内存, 所以等待序号更大的新帧
+        lazy的服务(javacap)画面不变时不会发送新帧, 缓冲区中最新的帧就是当前画面
+        adbcap返回的已经是解码后的图像, 其余方式返回jpg, 解码后再比较
+
+        Raises:
+            socket.timeout: FRAME_TIMEOUT秒内没有新帧
+        """
+        if getattr(cap, '_stream_thread', None):
+            newer_than = cap.latest_frame.seq
+            if getattr(cap, 'LAZY', False) and newer_than:
+                newer_than -= 1
+            frame = cap.get_stream_frame(newer_than=newer_than, timeout=self.FRAME_TIMEOUT)
+            if frame is None:
+                raise socket.timeout('no new frame in {}s'.format(self.FRAME_TIMEOUT))
+            data = frame.data
+        else:
+            data = cap.get_frame()
+        if data is None or isinstance(data, np.ndarray):
+            return data
+        return decode_jpeg(data)
+
+    def _touch_noop(self, touch) -> bool:
+        """不会产生触摸的命令, 测量发送命令的延迟"""
+        if hasattr(touch, 'send'):
+            # minitouch/maxtouch: 没有任何改动的commit
+            touch.send('c\n')
+        else:
+            # eventtouch每个事件都会启动一个adb shell进程
+            self.adb.start_shell(['true']).wait()
+        return True
@@ -1,33 +1,64 @@
 # -*- coding: utf-8 -*-
 # https://github.com/AirtestProject/Airtest/blob/master/airtest/core/android/javacap.py
 # 使用airtest的yosemite实现
-import struct
+import socket
+import threading
+import time
+from typing import Optional
 from core.constant import JAC_LOCAL_NAME
 from core.yosemite import Yosemite
-from core.utils.safesocket import SafeSocket
 from core.utils.snippet import reg_cleanup
 from core.utils.nbsp import NonBlockingStreamReader
+from core.utils.frame_buffer import LatestFrame, StreamFrame
+from core.utils.stream_parser import FrameStreamParser, BufferPool
+from core.utils.governor import CaptureGovernor, GovernorPolicy
 from core.cap_methods.base_cap import BaseCap
 from loguru import logger
 
 
 class Javacap(Yosemite, BaseCap):
-
+    """
+    javacap模块
+    只启动一个服务, 后台线程保持连接, 同时发出pipeline个帧请求, 只保留最新的一帧
+    服务退出或者连接断开时重新启动/连接, -lazy模式下画面不变时服务不发送帧, 接收超时不会重新连接
+    设置governor_policy后画面不变时由governor降低请求频率, 降速时只保留一个请求
+    """
     APP_PKG = "com.netease.nie.yosemite"
     SCREENCAP_SERVICE = "com.netease.nie.yosemite.Capture"
-    RECVTIMEOUT = None
+    RECVTIMEOUT = 3  # 等待帧时检查服务状态的间隔
+    PIPELINE = 2
+    IDLE_CHECK = 1  # 等待发送请求时检查停止事件的间隔
     METHODS = 'javacap'
+    GOVERNOR_POLICY = None  # 默认始终全速, 通过governor_policy或者set_governor_policy开启降速
+    LAZY = True  # 服务以-lazy启动
 
-    def __init__(self, adb):
+    def __init__(self, adb, recv_timeout: float = None, pipeline: int = None, governor_policy: GovernorPolicy = None):
+        """
+        Args:
+            adb: adb instance of android device
+            recv_timeout: 等待帧时检查服务状态的间隔
+            pipeline: 同时发出的帧请求数
+            governor_policy: 画面不变时降低帧率的策略, 默认为GOVERNOR_POLICY, 即不降速
+        """
         super(Javacap, self).__init__(adb)
         self.JAC_LOCAL_NAME = JAC_LOCAL_NAME.format(self.adb.get_device_id())
-        self.frame_gen = None
+        self.recv_timeout = recv_timeout or self.RECVTIMEOUT
+        self.pipeline = pipeline or self.PIPELINE
         self.proc = None
         self.nbsp = None
+        self.latest_frame = LatestFrame()
+        self.staleness = None  # 上一次get_frame返回的帧距离接收时已经过去的时间(秒)
+        self.reconnects = 0
+        self._server_lock = threading.Lock()
+        self._stream_thread = None
+        self._stream_kill_event = threading.Event()
+        self._buffer_pool = BufferPool()
+        self.governor = CaptureGovernor(governor_policy or self.GOVERNOR_POLICY)
         # start server
-        self._setup_stream_server()
         self.adb.set_forward('localabstract:%s' % self.JAC_LOCAL_NAME)
         self.JAC_PORT = self.adb.get_forward_port(self.JAC_LOCAL_NAME)
+        self._ensure_server()
+        self.start_stream()
         logger.info('javacap init, port:{} name:{}', self.JAC_PORT, self.JAC_LOCAL_NAME)
 
     def _setup_stream_server(self):
@@ -47,47 +78,137 @@ class Javacap(Yosemite, BaseCap):
         reg_cleanup(proc.kill)
         return proc, nbsp
 
-    def get_frames(self):
-        proc, nbsp = self._setup_stream_server()
-        s = SafeSocket()
-        s.connect((self.adb.host, self.JAC_PORT))
-        t = s.recv(24)
-        # javacap header
-        logger.debug(struct.unpack("<2B5I2B", t))
-
-        stopping = False
-        while not stopping:
-            s.send(b"1")
-            # recv frame header, count frame_size
-            if self.RECVTIMEOUT is not None:
-                header = s.recv_with_timeout(4, self.RECVTIMEOUT)
-            else:
-                header = s.recv(4)
-            if header is None:
-                logger.error("javacap header is None")
-                # recv timeout, if not frame updated, maybe screen locked
-                stopping = yield None
-            else:
-                frame_size = struct.unpack("<I", header)[0]
-                frame_data = s.recv(frame_size)
-                stopping = yield frame_data
+    def _ensure_server(self):
+        """服务没有运行或者已经退出时启动服务"""
+        with self._server_lock:
+            if self.proc is not None and self.proc.poll() is None:
+                return
+            if self.proc is not None:
+                logger.warning('javacap server quit, restart')
+                self._stop_server()
+            self.proc, self.nbsp = self._setup_stream_server()
+
+    def _stop_server(self):
+        if self.nbsp:
+            self.nbsp.kill()
+            self.nbsp = None
+        if self.proc:
+            self.proc.kill()
+            self.proc = None
+
+    @property
+    def fps(self) -> float:
+        return self.latest_frame.fps
+
+    @property
+    def effective_fps(self) -> float:
+        """最近的实际帧率, 降速后立即反映"""
+        return self.governor.effective_fps
+
+    def set_governor_policy(self, policy: Optional[GovernorPolicy]):
+        """切换帧率调节策略, None时始终全速"""
+        logger.info('javacap governor policy {}', policy)
+        self.governor.set_policy(policy)
+
+    def start_stream(self):
+        """后台线程保持连接并持续接收帧"""
+        if self._stream_thread:
+            return
+        self._stream_kill_event.clear()
+        self._stream_thread = threading.Thread(target=self._stream_loop, name='javacap_stream', daemon=True)
+        self._stream_thread.start()
 
+    def stop_stream(self):
+        if self._stream_thread:
+            self._stream_kill_event.set()
+            self._stream_thread.join()
+            self._stream_thread = None
+            self.latest_frame.clear()
+
+    def _stream_loop(self):
+        while not self._stream_kill_event.is_set():
+            sock = None
+            try:
+                self._ensure_server()
+                sock = socket.create_connection((self.adb.host, self.JAC_PORT))
+                parser = FrameStreamParser(sock, self._buffer_pool)
+                # javacap header
+                banner = parser.read_banner(self.recv_timeout)
+                if banner is None:
+                    raise socket.timeout('javacap banner recv timeout')
+                logger.debug(FrameStreamParser.parse_banner(banner))
+                self._stream_frames(parser)
+            except (socket.error, RuntimeError) as err:
+                if not self._stream_kill_event.is_set():
+                    logger.error('javacap stream error: {}, reconnect', err)
+                    self.reconnects += 1
+                    self._stream_kill_event.wait(1)
+            finally:
+                if sock:
+                    sock.close()
         logger.debug("javacap stream ends")
-        s.close()
-        nbsp.kill()
-        proc.kill()
-        self.adb.remove_forward("tcp:%s" % self.JAC_PORT)
 
-    def get_frame(self) -> bytes:
-        if self.frame_gen is None:
-            self.frame_gen = self.get_frames()
-        return self.frame_gen.send(None)
+    def _stream_frames(self, parser: FrameStreamParser):
+        """
+        持续接收帧, 全速时保持pipeline个请求未完成, 降速时由governor决定发送请求的时间
+        连接断开或者服务退出时抛出异常, 由_stream_loop重新连接
+        """
+        outstanding = 0
+        while not self._stream_kill_event.is_set():
+            limit = 1 if self.governor.throttled else self.pipeline
+            # 还有未完成的请求时不等待, 先接收帧
+            if outstanding < limit and self.governor.wait(0 if outstanding else self.IDLE_CHECK):
+                parser.sock.sendall(b"1")
+                outstanding += 1
+                continue
+            if not outstanding:
+                continue
+            frame_data = parser.read_frame(self.recv_timeout)
+            if frame_data is None:
+                # 锁屏或者画面没有变化时服务不会发送帧, 服务还在运行时继续等待
+                if self.proc is None or self.proc.poll() is not None:
+                    raise RuntimeError('javacap server quit')
+                continue
+            outstanding -= 1
+            self.governor.observe(frame_data)
+            self.latest_frame.put(frame_data)
+
+    def get_stream_frame(self, newer_than: int = 0, timeout: float = 5) -> StreamFrame:
+        """
+        获取最新的一帧, 已经有帧时立即返回
+
+        Args:
+            newer_than: 只返回序号大于newer_than的帧
+            timeout: 等待帧的超时时间
+        Returns:
+            StreamFrame(seq, timestamp, data), 超时返回None
+            data是缓冲池中的只读memoryview, 引用期间缓冲区不会被复用, 需要长期保存时复制为bytes
+        """
+        with self.governor.demand() as throttled:
+            if throttled:
+                # 降速时最新的帧可能已经过时, 等待恢复全速后的帧
+                newer_than = max(newer_than, self.latest_frame.seq)
+            frame = self.latest_frame.get(newer_than, timeout)
+        if frame is None:
+            logger.error('javacap stream frame timeout')
+            return None
+        self.staleness = time.time() - frame.timestamp
+        return frame
+
+    def get_frame(self) -> Optional[bytes]:
+        """
+        获取最新的一帧jpg数据, 返回复制出来的bytes, 不占用缓冲池
+        需要零复制时使用get_stream_frame
+        """
+        frame = self.get_stream_frame()
+        return bytes(frame.data) if frame else None
 
     def update_rotation(self, rotation):
         """ javacap 不需要转换"""
         pass
 
     def teardown(self):
+        self.stop_stream()
+        self._stop_server()
         self.adb.remove_forward('tcp:{}'.format(self.JAC_PORT))
         logger.info('javacap teardown')
-
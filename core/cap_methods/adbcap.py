@@ -1,10 +1,23 @@
 # -*- coding: utf-8 -*-
+import time
+from loguru import logger
 from core.cap_methods.base_cap import BaseCap
 
 
 class AdbCap(BaseCap):
-    def __init__(self, adb):
+    METHODS = 'adbcap'
+
+    def __init__(self, adb, exec_out: bool = True):
+        """
+        Args:
+            adb: adb instance of android device
+            exec_out: 为True时通过exec-out直接读取screencap输出, 不在设备上生成临时文件
+        """
         super(AdbCap, self).__init__(adb)
+        self.exec_out = exec_out
 
-    def get_frame(self):
-        return self.adb.screenshot()
+    def get_frame(self, Rect=None):
+        stamp = time.time()
+        img_data = self.adb.screenshot(Rect, exec_out=self.exec_out)
+        logger.debug('adbcap exec_out={} time={:.2f}ms', self.exec_out, (time.time() - stamp) * 1000)
+        return img_data
@@ -2,6 +2,8 @@
 
 
 class BaseCap(object):
+    LAZY = False  # stream服务在画面不变时是否停止发送帧
+
     def __init__(self, adb, *args, **kwargs):
         self.adb = adb
 
@@ -1,26 +1,58 @@
 #! usr/bin/python
 # -*- coding:utf-8 -*-
+import collections
 import json
 import re
 import time
-import struct
+import socket
 import threading
+from typing import NamedTuple, Optional
 from loguru import logger
 from core.adb import ADB
-from core.constant import (TEMP_HOME, MNC_HOME, MNC_CMD, MNC_SO_HOME,
-                           MNC_LOCAL_NAME, MNC_INSTALL_PATH, MNC_SO_INSTALL_PATH)
-from core.utils.safesocket import SafeSocket
+from core.constant import MNC_HOME, MNC_CMD, MNC_SO_HOME, MNC_LOCAL_NAME
 from core.utils.nbsp import NonBlockingStreamReader
 from core.utils.snippet import reg_cleanup
+from core.utils.frame_buffer import LatestFrame, StreamFrame
+from core.utils.stream_parser import FrameStreamParser, BufferPool
+from core.utils.governor import CaptureGovernor, GovernorPolicy
 from core.cap_methods.base_cap import BaseCap
 
 
+class CaptureProfile(NamedTuple):
+    """
+    minicap的采集参数
+
+    scale: 虚拟分辨率与实际分辨率的比例, 例如0.5时1080x2340的设备以540x1170采集
+    quality: jpg质量(1-100), None时使用minicap的默认值
+    """
+    scale: float = 1.0
+    quality: Optional[int] = None
+
+
+class _MinicapServer(NamedTuple):
+    name: str  # localabstract socket名字
+    port: int  # forward的本地端口
+    proc: object  # adb shell进程
+    nbsp: NonBlockingStreamReader
+    pid: Optional[int]  # 设备上minicap进程的pid, 未知时为None
+
+
 class _Minicap(BaseCap):
     """minicap模块"""
     RECVTIMEOUT = None
     METHODS = 'minicap'
+    GOVERNOR_POLICY = None  # 默认始终全速, 通过governor_policy或者set_governor_policy开启降速
 
-    def __init__(self, adb: ADB, rotation_watcher=None):
+    def __init__(self, adb: ADB, rotation_watcher=None, stream: bool = False, profile: CaptureProfile = None,
+                 governor_policy: GovernorPolicy = None):
+        """
+        Args:
+            adb: adb instance of android device
+            rotation_watcher: 设备方向变化时重启minicap
+            stream: 为True时保持连接, 由后台线程持续接收最新的帧
+            profile: 采集参数, 默认为原始分辨率
+            governor_policy: stream模式下画面不变时降低帧率的策略, 默认为GOVERNOR_POLICY, 即不降速
+        """
         super(_Minicap, self).__init__(adb)
         self.MNC_LOCAL_NAME = MNC_LOCAL_NAME.format(self.adb.get_device_id())
         self.MNC_PORT = 0
@@ -28,12 +60,33 @@ class _Minicap(BaseCap):
         self.display_info = None
         self.proc = None
         self.nbsp = None
+        self.profile = profile or CaptureProfile()
+        self.frame_scale = 1.0  # 当前服务输出的图片与设备分辨率的比例
+        self.server_pid = None  # 当前minicap进程的pid, 启动时通过pidof得到, 之后从banner中读取
+        self._frame_bytes = {}  # {profile: [帧数, 总字节数]}
         self._update_rotation_event = threading.Event()
+        # stream模式
+        self.latest_frame = LatestFrame()
+        self.staleness = None  # 上一次get_frame返回的帧距离接收时已经过去的时间(秒)
+        self._stream_thread = None
+        self._stream_kill_event = threading.Event()
+        self._buffer_pool = BufferPool()
+        self.governor = CaptureGovernor(governor_policy or self.GOVERNOR_POLICY)
+        # 热切换服务
+        self.capture_gaps = collections.deque(maxlen=20)  # 重启服务前后两帧的间隔(秒)
+        self._server_gen = 0
+        self._pending_server = None  # (新服务, 开始切换的时间), 新服务启动失败时为(None, 时间)
+        self._retiring_server = None  # 等待停止的旧服务
+        self._swap_thread = None
+        self._swap_stamp = None
+        self._last_frame_stamp = None
         if rotation_watcher:
             rotation_watcher.reg_callback(lambda x: self.update_rotation(x * 90))
         # 开启服务
         self.install()
         self.start_server()
+        if stream:
+            self.start_stream()
 
     def install(self):
         """
@@ -42,12 +95,7 @@ class _Minicap(BaseCap):
         :return:
             None
         """
-        if not self.adb.check_file(TEMP_HOME, 'minicap'):
-            logger.error('{} minicap is not install in {}', self.adb.device_id, self.adb.get_device_id())
-            self.push_target_mnc()
-        if not self.adb.check_file(TEMP_HOME, 'minicap.so'):
-            logger.error('{} minicap.so is not install in {}', self.adb.device_id, self.adb.get_device_id())
-            self.push_target_mnc_so()
+        self.adb.installer.install(MNC_HOME, MNC_SO_HOME)
         logger.info('{} minicap and minicap.so is install', self.adb.device_id)
 
     def start_server(self):
@@ -57,39 +105,102 @@ class _Minicap(BaseCap):
         self.set_minicap_port()
         # 如果之前服务在运行,则销毁
         self.adb.kill_process(name=MNC_HOME)
+        proc, nbsp, self.server_pid = self._launch_server(self.MNC_LOCAL_NAME)
+        time.sleep(.5)
+        self.proc = proc
+        self.nbsp = nbsp
+        return proc
+
+    def _launch_server(self, name: str):
+        """
+        以name为socket名字启动minicap, 等待服务就绪
+
+        Returns:
+            adb shell进程, 读取进程输出的NonBlockingStreamReader, minicap进程的pid(无法确定时为None)
+        """
+        before = self._minicap_pids()
         params, display_info = self._get_params()
-        proc = self.adb.start_shell([MNC_CMD, "-n '%s'" % self.MNC_LOCAL_NAME, '-P',
-                                     '%dx%d@%dx%d/%d 2>&1' % params])
+        proc = self.adb.start_shell(self._server_cmds(params, name))
 
         nbsp = NonBlockingStreamReader(proc.stdout, print_output=True, name='minicap_server')
         while True:
             line = nbsp.readline(timeout=5.0)
             if line is None:
+                proc.kill()
+                nbsp.kill()
                 raise RuntimeError("minicap server setup timeout")
             if b"Server start" in line:
                 break
 
         if proc.poll() is not None:
+            nbsp.kill()
             raise RuntimeError('minicap server quit immediately')
         reg_cleanup(proc.kill)
-        time.sleep(.5)
-        self.proc = proc
-        self.nbsp = nbsp
-        return proc
+        started = self._minicap_pids() - before
+        return proc, nbsp, started.pop() if len(started) == 1 else None
+
+    def _minicap_pids(self) -> set:
+        """设备上全部minicap进程的pid"""
+        out = self.adb.raw_shell(['pidof', 'minicap'], skip_error=True)
+        return {int(pid) for pid in out.split() if pid.isdigit()}
 
     def _get_params(self):
         display_info = self.adb.get_display_info()
         real_width = display_info['width']
         real_height = display_info['height']
         real_rotation = display_info['rotation']
+        virtual_width = int(round(real_width * self.profile.scale))
+        virtual_height = int(round(real_height * self.profile.scale))
 
         if self.quirk_flag & 2 and real_rotation in (90, 270):
-            params = real_height, real_width, real_height, real_width, 0
+            params = real_height, real_width, virtual_height, virtual_width, 0
         else:
-            params = real_width, real_height, real_width, real_height, real_rotation
+            params = real_width, real_height, virtual_width, virtual_height, real_rotation
 
         return params, display_info
 
+    def _server_cmds(self, params, name: str = None) -> list:
+        cmds = [MNC_CMD, "-n '%s'" % (name or self.MNC_LOCAL_NAME), '-P', '%dx%d@%dx%d/%d' % params]
+        if self.profile.quality:
+            cmds += ['-Q', str(self.profile.quality)]
+        return cmds + ['2>&1']
+
+    def _parse_banner(self, banner: bytes) -> int:
+        """
+        解析minicap的global header, 记录quirk_flag和输出图片的缩放比例
+        Global header binary format https://github.com/openstf/minicap#global-header-binary-format
+
+        Returns:
+            orientation
+        """
+        version, size, self.server_pid, real_width, real_height, virtual_width, virtual_height, ori, self.quirk_flag = \
+            FrameStreamParser.parse_banner(banner)
+        if real_width:
+            self.frame_scale = virtual_width / real_width
+        return ori
+
+    def _record_frame(self, size: int):
+        """按采集参数统计帧大小"""
+        stats = self._frame_bytes.setdefault(self.profile, [0, 0])
+        stats[0] += 1
+        stats[1] += size
+
+    def frame_size(self, profile: CaptureProfile = None) -> float:
+        """profile下的平均帧大小(字节), 没有统计数据时返回0"""
+        count, total = self._frame_bytes.get(profile or self.profile, (0, 0))
+        return total / count if count else 0.0
+
+    @property
+    def bandwidth_saved(self) -> float:
+        """
+        当前采集参数相比原始分辨率节省的带宽比例
+        两种参数都有统计数据时使用实际的帧大小, 否则按像素数估算
+        """
+        full, current = self.frame_size(CaptureProfile()), self.frame_size()
+        if full and current:
+            return 1 - current / full
+        return 1 - self.profile.scale ** 2
+
     def set_minicap_port(self):
         """
         command forward to minicap
@@ -103,21 +214,11 @@ class _Minicap(BaseCap):
 
     def push_target_mnc(self):
         """ push specific minicap """
-        mnc_path = MNC_INSTALL_PATH.format(self.adb.abi_version())
-        # push and grant
-        self.adb.push(mnc_path, MNC_HOME)
-        time.sleep(1)
-        self.adb.start_shell(['chmod', '755', MNC_HOME])
-        logger.info('minicap installed in {}', MNC_HOME)
+        self.adb.installer.push(MNC_HOME)
 
     def push_target_mnc_so(self):
         """ push specific minicap.so (they should work together) """
-        mnc_so_path = MNC_SO_INSTALL_PATH.format(self.adb.sdk_version(), self.adb.abi_version())
-        # push and grant
-        self.adb.push(mnc_so_path, MNC_SO_HOME)
-        time.sleep(1)
-        self.adb.start_shell(['chmod', '755', MNC_SO_HOME])
-        logger.info('minicap.so installed in {}', MNC_SO_HOME)
+        self.adb.installer.push(MNC_SO_HOME)
 
     def get_display_info(self):
         """
@@ -153,22 +254,238 @@ class _Minicap(BaseCap):
 
 
 class Minicap(_Minicap):
-    def get_frame(self):
+    STREAM_TIMEOUT = 1  # stream模式下检查停止/旋转事件的间隔
+    HOT_SWAP = True  # 重启服务时先以新的socket名字启动minicap, 切换后再停止旧的服务
+
+    def set_profile(self, profile: CaptureProfile):
+        """
+        切换采集参数, 会重启minicap服务
+        触控使用设备的分辨率, 不受影响, 截图坐标通过Frame.to_device转换
+        """
+        if profile == self.profile:
+            return
+        logger.info('minicap profile {} -> {}', self.profile, profile)
+        self.profile = profile
+        if self._stream_thread:
+            # 由stream线程重启服务
+            self._update_rotation_event.set()
+        else:
+            self._swap_server()
+            self._switch_server()
+
+    @property
+    def bandwidth(self) -> float:
+        """stream模式下的采集带宽(字节/秒)"""
+        return self.frame_size() * self.fps
+
+    @property
+    def last_capture_gap(self) -> Optional[float]:
+        """最近一次重启服务时, 旧服务最后一帧与新服务第一帧的间隔(秒)"""
+        return self.capture_gaps[-1] if self.capture_gaps else None
+
+    def get_frame(self) -> Optional[bytes]:
+        """
+        获取一帧jpg数据, 返回复制出来的bytes, 不占用缓冲池
+        需要零复制时使用get_stream_frame
+        """
+        if self._stream_thread:
+            frame = self.get_stream_frame()
+            return bytes(frame.data) if frame else None
         if self._update_rotation_event.is_set():
-            logger.info('minicap update_rotation')
-            self.teardown()
-            self.start_server()
-            self._update_rotation_event.clear()
+            self._swap_server()
+            self._switch_server()
         return self._get_frame()
 
+    def _restart_server(self):
+        logger.info('minicap restart server')
+        self._stop_server()
+        self.start_server()
+        self._update_rotation_event.clear()
+
+    def _swap_server(self):
+        """
+        以新的socket名字启动minicap, 旧服务在此期间继续工作
+        启动完成后放入_pending_server, 由_switch_server切换
+        """
+        self._update_rotation_event.clear()
+        stamp = time.time()
+        server = None
+        if self.HOT_SWAP:
+            self._server_gen += 1
+            name = '{}_{}'.format(MNC_LOCAL_NAME.format(self.adb.get_device_id()), self._server_gen)
+            port, _ = self.adb.set_forward('localabstract:%s' % name)
+            try:
+                proc, nbsp, pid = self._launch_server(name)
+                server = _MinicapServer(name, port, proc, nbsp, pid)
+            except RuntimeError as err:
+                # 部分设备无法同时运行两个minicap, 退回到先停止再启动
+                logger.warning('minicap hot swap failed: {}, restart server', err)
+                self.adb.remove_forward('tcp:{}'.format(port))
+        self._pending_server = (server, stamp)
+
+    def _switch_server(self):
+        """切换到_pending_server, 旧服务在收到新服务的banner后停止"""
+        server, stamp = self._pending_server
+        self._pending_server = None
+        if server is None:
+            self._restart_server()
+        else:
+            logger.info('minicap switch server {} -> {}', self.MNC_LOCAL_NAME, server.name)
+            self._retiring_server = _MinicapServer(self.MNC_LOCAL_NAME, self.MNC_PORT, self.proc, self.nbsp,
+                                                   self.server_pid)
+            self.MNC_LOCAL_NAME, self.MNC_PORT, self.proc, self.nbsp, self.server_pid = server
+        self._swap_stamp = stamp
+
+    def _retire_server(self):
+        """停止切换前的旧服务"""
+        if self._retiring_server is None:
+            return
+        name, port, proc, nbsp, pid = self._retiring_server
+        self._retiring_server = None
+        if not pid:
+            # 除了当前服务以外只剩一个minicap进程时, 它就是旧服务
+            others = self._minicap_pids() - {self.server_pid}
+            pid = others.pop() if len(others) == 1 and self.server_pid else None
+        if pid:
+            self.adb.raw_shell(['kill', str(pid)], skip_error=True)
+        else:
+            logger.warning('minicap server {} pid is unknown, only kill the adb shell', name)
+        if proc:
+            proc.kill()
+        if nbsp:
+            nbsp.kill()
+        self.adb.remove_forward('tcp:{}'.format(port))
+        logger.debug('minicap server {} retired', name)
+
+    def _is_swapping(self) -> bool:
+        return self._swap_thread is not None and self._swap_thread.is_alive()
+
+    def _start_swap(self):
+        """stream模式下在后台线程中启动新服务, stream线程继续接收旧服务的帧"""
+        if self._is_swapping() or self._pending_server is not None:
+            return
+        self._swap_thread = threading.Thread(target=self._swap_server, name='minicap_swap', daemon=True)
+        self._swap_thread.start()
+
+    def _record_frame(self, size: int):
+        super(Minicap, self)._record_frame(size)
+        now = time.time()
+        if self._swap_stamp is not None:
+            gap = now - max(self._swap_stamp, self._last_frame_stamp or 0)
+            self._swap_stamp = None
+            self.capture_gaps.append(gap)
+            logger.info('minicap capture gap={:.2f}ms', gap * 1000)
+        self._last_frame_stamp = now
+
+    @property
+    def fps(self) -> float:
+        """stream模式下的采集帧率"""
+        return self.latest_frame.fps
+
+    @property
+    def effective_fps(self) -> float:
+        """stream模式下最近的实际帧率, 降速后立即反映"""
+        return self.governor.effective_fps
+
+    def set_governor_policy(self, policy: Optional[GovernorPolicy]):
+        """切换帧率调节策略, None时始终全速"""
+        logger.info('minicap governor policy {}', policy)
+        self.governor.set_policy(policy)
+
+    def start_stream(self):
+        """开启stream模式, 后台线程保持连接并持续接收帧"""
+        if self._stream_thread:
+            return
+        self._stream_kill_event.clear()
+        self._stream_thread = threading.Thread(target=self._stream_loop, name='minicap_stream', daemon=True)
+        self._stream_thread.start()
+
+    def stop_stream(self):
+        if self._stream_thread:
+            self._stream_kill_event.set()
+            self._stream_thread.join()
+            self._stream_thread = None
+            self.latest_frame.clear()
+
+    def get_stream_frame(self, newer_than: int = 0, timeout: float = 5) -> StreamFrame:
+        """
+        获取stream模式下最新的一帧, 已经有帧时立即返回
+
+        Args:
+            newer_than: 只返回序号大于newer_than的帧
+            timeout: 等待帧的超时时间
+        Returns:
+            StreamFrame(seq, timestamp, data), 超时返回None
+            data是缓冲池中的只读memoryview, 引用期间缓冲区不会被复用, 需要长期保存时复制为bytes
+        """
+        with self.governor.demand() as throttled:
+            if throttled:
+                # 降速时最新的帧可能已经过时, 等待恢复全速后的帧
+                newer_than = max(newer_than, self.latest_frame.seq)
+            frame = self.latest_frame.get(newer_than, timeout)
+        if frame is None:
+            logger.error('minicap stream frame timeout')
+            return None
+        self.staleness = time.time() - frame.timestamp
+        return frame
+
+    def _stream_loop(self):
+        while not self._stream_kill_event.is_set():
+            if self._update_rotation_event.is_set():
+                self._start_swap()
+            if self._pending_server is not None:
+                self._switch_server()
+            sock = None
+            try:
+                sock = socket.create_connection((self.adb.host, self.MNC_PORT))
+                parser = FrameStreamParser(sock, self._buffer_pool)
+                ori = self._parse_banner(parser.read_banner())
+                # 收到新服务的banner后再停止旧服务
+                self._retire_server()
+                if self.quirk_flag & 2 and ori not in (0, 1, 2):
+                    logger.error("quirk_flag found:{}, going to resetup", self.quirk_flag)
+                    self._update_rotation_event.set()
+                    self._start_swap()
+                    if self._is_swapping():
+                        self._swap_thread.join()
+                    continue
+                self._stream_frames(parser)
+            except socket.error as err:
+                if not self._stream_kill_event.is_set():
+                    logger.error('minicap stream error: {}, reconnect', err)
+                    self._stream_kill_event.wait(self.STREAM_TIMEOUT)
+            finally:
+                if sock:
+                    sock.close()
+        logger.debug('minicap stream ends')
+
+    def _stream_frames(self, parser: FrameStreamParser):
+        """持续接收帧, 直到需要停止或者新服务已经就绪"""
+        requested = False
+        while not self._stream_kill_event.is_set() and self._pending_server is None:
+            if self._update_rotation_event.is_set():
+                self._start_swap()
+            if not requested:
+                # 由governor决定请求下一帧的时间
+                if not self.governor.wait(self.STREAM_TIMEOUT):
+                    continue
+                parser.sock.sendall(b"1")
+                requested = True
+            # 超时后未接收完的数据保留在parser中, 下次继续接收
+            frame_data = parser.read_frame(self.STREAM_TIMEOUT)
+            if frame_data is None:
+                continue
+            self.governor.observe(frame_data)
+            self._record_frame(len(frame_data))
+            self.latest_frame.put(frame_data, self.frame_scale)
+            requested = False
+
     def _get_frame(self):
-        s = SafeSocket()
-        s.connect((self.adb.host, self.MNC_PORT))
-        t = s.recv(24)
+        s = socket.create_connection((self.adb.host, self.MNC_PORT))
+        parser = FrameStreamParser(s, self._buffer_pool)
         # minicap header
-        global_headers = struct.unpack("<2B5I2B", t)
-        # Global header binary format https://github.com/openstf/minicap#global-header-binary-format
-        ori, self.quirk_flag = global_headers[-2:]
+        ori = self._parse_banner(parser.read_banner())
+        self._retire_server()
 
         if self.quirk_flag & 2 and ori not in (0, 1, 2):
             stopping = True
@@ -177,18 +494,14 @@ class Minicap(_Minicap):
             stopping = False
 
         if not stopping:
-            s.send(b"1")
-            if self.RECVTIMEOUT is not None:
-                header = s.recv_with_timeout(4, self.RECVTIMEOUT)
+            s.sendall(b"1")
+            frame_data = parser.read_frame(self.RECVTIMEOUT)
+            if frame_data is None:
+                logger.error("minicap frame recv timeout")
             else:
-                header = s.recv(4)
-            if header is None:
-                logger.error("minicap header is None")
-            else:
-                frame_size = struct.unpack("<I", header)[0]
-                frame_data = s.recv(frame_size)
                 s.close()
-                return frame_data
+                self._record_frame(len(frame_data))
+                return bytes(frame_data)
 
         logger.info('get_frame ends')
         s.close()
@@ -213,6 +526,19 @@ class Minicap(_Minicap):
 
     def teardown(self):
         """close server"""
+        self.stop_stream()
+        self._stop_server()
+
+    def _stop_server(self):
+        if self._is_swapping():
+            self._swap_thread.join()
+        if self._pending_server is not None:
+            server, _ = self._pending_server
+            self._pending_server = None
+            if server:
+                self._retiring_server = server
+                self._retire_server()
+        self._retire_server()
         self.adb.kill_process(name=MNC_HOME)
         if self.proc:
             self.proc.kill()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import mmap
+import time
+
+import numpy as np
+from loguru import logger
+
+from core.cap_methods.base_cap import BaseCap
+from core.utils.recorder import INDEX_DTYPE, index_path
+
+
+class ReplayCap(BaseCap):
+    """
+    回放FrameRecorder录制的文件, 不需要设备
+    数据文件通过mmap读取, get_frame返回memoryview, 不会复制数据
+    """
+    METHODS = 'replaycap'
+
+    def __init__(self, path: str, speed: float = 1.0, loop: bool = False):
+        """
+        Args:
+            path: FrameRecorder的数据文件路径
+            speed: 回放速度, 按录制时的时间间隔除以speed返回帧; 为0时每次调用返回下一帧, 与时间无关
+            loop: 回放结束后是否从头开始
+        """
+        super(ReplayCap, self).__init__(None)
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self.index = np.fromfile(index_path(path), dtype=INDEX_DTYPE)
+        if not len(self.index):
+            raise ValueError('no frame recorded in {}'.format(path))
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self._offsets = self.index['timestamp'] - self.index['timestamp'][0]
+        self.rotation = int(self.index['rotation'][0])
+        self.position = -1  # 上一次返回的帧
+        self._start = None
+        logger.info('replay {} frames from {}, duration={:.2f}s', len(self.index), path, self.duration)
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def duration(self) -> float:
+        return float(self._offsets[-1])
+
+    def read(self, position: int) -> memoryview:
+        """读取第position帧的jpg数据"""
+        record = self.index[position]
+        return self._view[int(record['offset']):int(record['offset']) + int(record['size'])]
+
+    def _next_position(self) -> int:
+        if not self.speed:
+            position = self.position + 1
+        else:
+            if self._start is None:
+                self._start = time.time()
+            elapsed = (time.time() - self._start) * self.speed
+            if self.loop and self.duration:
+                elapsed %= self.duration
+            position = int(np.searchsorted(self._offsets, elapsed, side='right')) - 1
+        if position >= len(self.index):
+            position = position % len(self.index) if self.loop else len(self.index) - 1
+        return position
+
+    def get_frame(self):
+        """
+        Returns:
+            当前时间对应的帧, speed为0时返回下一帧; 没有loop时回放结束后一直返回最后一帧
+        """
+        self.position = self._next_position()
+        self.rotation = int(self.index['rotation'][self.position])
+        return self.read(self.position)
+
+    def rewind(self):
+        self.position = -1
+        self._start = None
+
+    def teardown(self):
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # get_frame返回的memoryview仍在使用, 由gc关闭
+            logger.debug('replay {} mmap still in use', self.path)
+        self._file.close()
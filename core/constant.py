@@ -11,12 +11,15 @@ DEFAULT_ADB_PATH = {  # adb.exe路径
     "Linux-x86_64": os.path.join(STATICPATH, "adb", "linux", "adb"),
     "Linux-armv7l": os.path.join(STATICPATH, "adb", "linux_arm", "adb"),
 }
+SDK_VERISON_ANDROID5 = 21  # 开始支持 adb exec-out
 SDK_VERISON_ANDROID10 = 29
 SHELL_ENCODING = 'utf-8'  # adb shell的编码
 ADB_CAP_NAME_RAW = '{}.raw'  # 使用ADB截图时生成raw的文件名
 ADB_CAP_REMOTE_PATH = './tmp/{}.png'  # 使用ADB截图时png保存到电脑的路径
 ADB_CAP_REMOTE_RAW_PATH = './tmp/{}'  # 使用ADB截图时候raw保存到电脑上的路径
 ADB_CAP_LOCAL_PATH = '/data/local/tmp/{}'  # 使用ADB截图时在手机上的路径
+FORWARD_PORT_RANGE = (11111, 20000)  # adb forward使用的本地端口范围
+CALIBRATION_PATH = os.path.join(STATICPATH, "calibration.json")  # 每台设备选择的截图/触控方式
 
 # minicap
 TEMP_HOME = '/data/local/tmp'  # 临时文件路径
@@ -27,6 +30,7 @@ MNC_CAP_REMOTE_PATH = ADB_CAP_REMOTE_PATH  # minicap截图保存到电脑的路
 MNC_LOCAL_NAME = 'minicap_{}'  # minicap开放的端口名字
 MNC_INSTALL_PATH = "./static/stf_libs/{}/minicap"  # abi_version  minicap安装文件路径
 MNC_SO_INSTALL_PATH = "./static/stf_libs/minicap-shared/aosp/libs/android-{}/{}/minicap.so"  # sdk,abi version
+INSTALL_MANIFEST_PATH = os.path.join(STATICPATH, "checksums.json")  # 本地安装文件的md5清单
 
 
 # minitouch
@@ -59,6 +63,7 @@ class CAP_METHOD(object):
     MINICAP = "minicap"
     JAVACAP = 'javacap'
     ADBCAP = "adbcap"
+    REPLAYCAP = "replaycap"  # 回放FrameRecorder录制的文件
 
 
 # logger filter_level
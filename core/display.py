@@ -0,0 +1,57 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import threading
+
+from loguru import logger
+
+
+class DisplayInfo(object):
+    """
+    设备屏幕信息缓存
+    物理分辨率,density,max_x/max_y在设备连接期间不会变化,只获取一次
+    orientation由rotation watcher更新,没有watcher时每次都重新获取
+    """
+
+    def __init__(self, adb):
+        self.adb = adb
+        self._static = None
+        self._orientation = None
+        self._lock = threading.Lock()
+
+    def _load_static(self) -> dict:
+        display_info = self.adb.getPhysicalDisplayInfo()
+        max_x, max_y = self.adb.getMaxXY()
+        display_info.update({
+            "max_x": max_x,
+            "max_y": max_y,
+        })
+        logger.debug('{} display info: {}', self.adb.device_id, display_info)
+        return display_info
+
+    @property
+    def orientation(self) -> int:
+        if self._orientation is not None:
+            return self._orientation
+        return self.adb.getDisplayOrientation()
+
+    def update_orientation(self, orientation: int):
+        """由rotation watcher调用, 之后orientation直接读取缓存"""
+        self._orientation = orientation
+
+    def get(self) -> dict:
+        with self._lock:
+            if self._static is None:
+                self._static = self._load_static()
+            display_info = dict(self._static)
+        orientation = self.orientation
+        display_info.update({
+            "orientation": orientation,
+            "rotation": orientation * 90,
+        })
+        return display_info
+
+    def invalidate(self):
+        """清除缓存, 例如通过wm size修改了分辨率之后"""
+        with self._lock:
+            self._static = None
+            self._orientation = None
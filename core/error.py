@@ -20,6 +20,12 @@ class AdbError(Exception):
         return "stdout[%s],stderr[%s]\ncmds[%s]" % (self.stdout, self.stderr, ' '.join(self.cmds))
 
 
+class CaptureError(Exception):
+    """
+        截图组件没有返回图片, 例如等待帧超时
+    """
+
+
 class OcrError(Exception):
     """
         when ocr goes wrong
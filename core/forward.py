@@ -0,0 +1,157 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import collections
+import socket
+import threading
+from typing import Optional, List
+
+from loguru import logger
+
+from core.adbclient import AdbClient
+from core.constant import FORWARD_PORT_RANGE, SHELL_ENCODING
+
+
+class ForwardManager(object):
+    """
+    adb forward的本地记录表, 同一个adb server的所有设备共用一个实例
+    由本进程的forward/remove更新, 只在调用sync时重新读取 adb forward --list
+    """
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, client: AdbClient, port_range=FORWARD_PORT_RANGE):
+        self.client = client
+        self._lock = threading.Lock()
+        self._table = {}  # local -> {'device_id', 'local', 'remote'}
+        self._free_ports = collections.deque(range(*port_range))
+        self._free_set = set(self._free_ports)  # 与_free_ports相同, 用于判断端口是否在队列中
+        self._port_range = port_range
+        self.sync()
+
+    @classmethod
+    def get(cls, client: AdbClient) -> 'ForwardManager':
+        """获取adb server(host, port)对应的实例"""
+        key = (client.host, client.port)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(client)
+            return cls._instances[key]
+
+    def sync(self):
+        """通过 adb forward --list 重新同步记录表"""
+        table = {}
+        for line in self.client.list_forward().decode(SHELL_ENCODING).splitlines():
+            cols = line.strip().split()
+            if len(cols) != 3:
+                continue
+            device_id, local, remote = cols
+            table[local] = {'device_id': device_id, 'local': local, 'remote': remote}
+        with self._lock:
+            # 已经被其他进程或者adb server移除的forward, 端口放回队列
+            for local in set(self._table) - set(table):
+                self._release_port(local)
+            self._table = table
+        logger.debug('forward table synced, {} forwards', len(table))
+
+    def list(self, device_id: str = None) -> List[dict]:
+        with self._lock:
+            return [dict(v) for v in self._table.values() if not device_id or v['device_id'] == device_id]
+
+    def find(self, device_id: str, local: str = None, remote: str = None) -> Optional[dict]:
+        with self._lock:
+            if local:
+                value = self._table.get(local)
+                if value:
+                    return dict(value)
+            if remote:
+                for value in self._table.values():
+                    if value['device_id'] == device_id and value['remote'] == remote:
+                        return dict(value)
+        return None
+
+    def forward(self, device_id: str, local: str, remote: str, no_rebind: bool = True):
+        self.client.forward(device_id, local, remote, no_rebind)
+        self.record(device_id, local, remote)
+
+    def remove(self, device_id: str, local: str = None):
+        """移除forward, local为None时移除设备的全部forward"""
+        self.client.remove_forward(device_id, local)
+        self.discard(device_id, local)
+
+    def record(self, device_id: str, local: str, remote: str):
+        """记录一条已经建立的forward"""
+        with self._lock:
+            self._table[local] = {'device_id': device_id, 'local': local, 'remote': remote}
+
+    def discard(self, device_id: str, local: str = None):
+        """从记录表中删除已经移除的forward"""
+        with self._lock:
+            if local:
+                locals_ = [local] if local in self._table else []
+            else:
+                locals_ = [k for k, v in self._table.items() if v['device_id'] == device_id]
+            for key in locals_:
+                self._table.pop(key)
+                self._release_port(key)
+
+    def forward_port(self, device_id: str, remote: str, host: str = '127.0.0.1', no_rebind: bool = True) -> int:
+        """
+        分配一个端口并forward到remote, forward失败时归还端口
+
+        Returns:
+            port
+        """
+        port = self.allocate_port(host)
+        try:
+            self.forward(device_id, 'tcp:%d' % port, remote, no_rebind)
+        except Exception:
+            self.release_port(port)
+            raise
+        return port
+
+    def allocate_port(self, host: str = '127.0.0.1') -> int:
+        """
+        从保留的端口范围中按顺序分配一个未使用的端口
+        端口没有被forward时需要通过release_port归还
+
+        Returns:
+            port
+        """
+        with self._lock:
+            for _ in range(len(self._free_ports)):
+                port = self._free_ports.popleft()
+                self._free_set.discard(port)
+                if 'tcp:%d' % port in self._table:
+                    continue
+                if self._can_bind(host, port):
+                    return port
+                # 被其他程序占用, 放回队尾
+                logger.debug('port:{} is in use', port)
+                self._push_port(port)
+        raise RuntimeError('no available forward port in {}'.format(self._port_range))
+
+    def release_port(self, port: int):
+        """归还allocate_port分配但是没有使用的端口"""
+        with self._lock:
+            self._release_port('tcp:%d' % port)
+
+    def _push_port(self, port: int):
+        self._free_ports.append(port)
+        self._free_set.add(port)
+
+    def _release_port(self, local: str):
+        if local.startswith('tcp:'):
+            port = int(local[4:])
+            if self._port_range[0] <= port < self._port_range[1] and port not in self._free_set:
+                self._push_port(port)
+
+    @staticmethod
+    def _can_bind(host: str, port: int) -> bool:
+        sock = socket.socket()
+        try:
+            sock.bind((host, port))
+            return True
+        except socket.error:
+            return False
+        finally:
+            sock.close()
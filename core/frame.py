@@ -0,0 +1,148 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import time
+from typing import Tuple
+
+import numpy as np
+from baseImage import IMAGE
+
+from core.utils.decoder import decode_jpeg, resize_image, FrameDecoder
+from core.utils.fingerprint import bytes_fingerprint, image_fingerprint
+
+
+class Frame(object):
+    """
+    截图得到的一帧
+    保存原始数据, 第一次读取image时才解码, 需要时再转换为baseImage.IMAGE
+    stream模式下data是帧缓冲池中的只读memoryview, Frame存在期间对应的缓冲区不会被复用,
+    需要长期保存大量帧时调用detach复制为bytes, 避免缓冲池一直分配新的缓冲区
+    发布到FrameBus之后由多个订阅者共享, 不再修改, follow等设置状态的方法只能在发布之前调用
+
+    Args:
+        data: 原始数据, minicap/javacap为jpg
+        image: 已经解码的图片数据, adbcap直接得到bgr数据
+        seq: 帧序号
+        timestamp: 收到帧的时间
+        rotation: 截图时屏幕的旋转角度
+        scale: 图片与设备分辨率的比例, minicap使用缩小的采集参数时小于1
+        decoder: 解码线程池, 为None时在调用线程中解码
+        decode_scale: 解码时的缩放比例, jpg使用IMREAD_REDUCED_COLOR_2/4/8解码
+        roi: 只保留的区域(x, y, w, h), 使用设备坐标
+    """
+    __slots__ = ('data', 'seq', 'timestamp', 'rotation', 'scale', 'decode_scale', 'roi', 'changed', '_source',
+                 '_image', '_decoder', '_fingerprint', '_base')
+
+    def __init__(self, data: bytes = None, image: np.ndarray = None, seq: int = 0, timestamp: float = None,
+                 rotation: int = 0, scale: float = 1.0, decoder: FrameDecoder = None, decode_scale: float = 1.0,
+                 roi: Tuple[int, int, int, int] = None):
+        if data is None and image is None:
+            raise ValueError('frame need data or image')
+        self.data = data
+        self.seq = seq
+        self.timestamp = timestamp or time.time()
+        self.rotation = rotation
+        self.scale = scale
+        self.decode_scale = decode_scale
+        self.roi = roi
+        self.changed = True  # 与上一帧相比画面是否变化
+        self._source = image
+        self._image = image if decode_scale == 1 and roi is None else None
+        self._decoder = decoder
+        self._fingerprint = None
+        self._base = None  # 画面相同的帧, 解码时直接使用它的结果
+
+    @property
+    def image(self) -> np.ndarray:
+        """解码后的bgr图片数据, 只读"""
+        if self._image is None:
+            if self._base is not None:
+                self._image = self._base.image
+            else:
+                self._image = self._crop(self._decode())
+        return self._image
+
+    def _decode(self) -> np.ndarray:
+        if self.data is None:
+            if self.decode_scale == 1:
+                return self._source
+            img = resize_image(self._source, self.decode_scale)
+            img.flags.writeable = False
+            return img
+        if self._decoder:
+            return self._decoder.get(self.seq, self.data, scale=self.decode_scale)
+        return decode_jpeg(self.data, scale=self.decode_scale)
+
+    def _crop(self, img: np.ndarray) -> np.ndarray:
+        """roi为设备坐标, 转换为图片坐标后切片, 不复制数据"""
+        if self.roi is None:
+            return img
+        x, y, w, h = [int(round(v * self.pixel_scale)) for v in self.roi]
+        return img[y:y + h, x:x + w]
+
+    @property
+    def pixel_scale(self) -> float:
+        """解码后的图片与设备分辨率的比例"""
+        return self.scale * self.decode_scale
+
+    @property
+    def fingerprint(self) -> bytes:
+        """画面指纹, jpg数据为字节的hash, bgr数据为缩小后块均值的hash"""
+        if self._fingerprint is None:
+            if self.data is not None:
+                self._fingerprint = bytes_fingerprint(self.data)
+            else:
+                self._fingerprint = image_fingerprint(self._source)
+        return self._fingerprint
+
+    def same_as(self, other: 'Frame') -> bool:
+        """画面是否与other相同"""
+        return other is not None and (other is self or self.fingerprint == other.fingerprint)
+
+    def follow(self, prev: 'Frame') -> bool:
+        """
+        与上一帧比较, 设置changed
+        画面没有变化并且解码参数相同时复用上一帧的解码结果, 需要在发布到FrameBus之前调用
+
+        Returns:
+            changed
+        """
+        self.changed = not self.same_as(prev)
+        if not self.changed and self._image is None and prev is not self and \
+                (self.scale, self.decode_scale, self.roi) == (prev.scale, prev.decode_scale, prev.roi):
+            self._base = prev._base or prev
+        return self.changed
+
+    def detach(self) -> 'Frame':
+        """把data复制为bytes, 释放对帧缓冲池的引用"""
+        if isinstance(self.data, memoryview):
+            self.data = bytes(self.data)
+        return self
+
+    @property
+    def decoded(self) -> bool:
+        return self._image is not None
+
+    def imread(self) -> np.ndarray:
+        return self.image
+
+    @property
+    def shape(self) -> tuple:
+        return self.image.shape
+
+    @property
+    def size(self) -> tuple:
+        """图片的行、宽"""
+        return self.image.shape[:2]
+
+    def to_device(self, x: float, y: float) -> tuple:
+        """图片上的坐标转换为设备上的坐标, 用于click等操作, 包括采集/解码的缩放和roi的偏移"""
+        offset_x, offset_y = self.roi[:2] if self.roi else (0, 0)
+        return int(round(x / self.pixel_scale + offset_x)), int(round(y / self.pixel_scale + offset_y))
+
+    def to_image(self) -> IMAGE:
+        """转换为baseImage.IMAGE, 会复制一份图片数据"""
+        return IMAGE(self.image)
+
+    def __repr__(self):
+        return '<Frame seq={} rotation={} scale={:g} changed={} timestamp={:.3f}>'.format(
+            self.seq, self.rotation, self.pixel_scale, self.changed, self.timestamp)
@@ -0,0 +1,155 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+安装minicap/minitouch/maxtouch等文件到设备
+通过一条md5sum命令校验设备上的全部文件, 只push与本地md5不一致的文件
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List
+
+from loguru import logger
+
+from core.constant import (MNC_HOME, MNC_SO_HOME, MNC_INSTALL_PATH, MNC_SO_INSTALL_PATH, MNT_HOME, MNT_INSTALL_PATH,
+                           MAX_HOME, MAX_INSTALL_PATH, INSTALL_MANIFEST_PATH)
+
+
+class ChecksumManifest(object):
+    """
+    本地文件的md5清单, 保存在INSTALL_MANIFEST_PATH中
+    文件大小或修改时间变化时重新计算
+    """
+
+    def __init__(self, path: str = INSTALL_MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.isfile(path):
+            try:
+                with open(path, 'r') as f:
+                    self._entries = json.load(f)
+            except ValueError:
+                logger.warning('checksum manifest {} is broken, rebuild it', path)
+
+    def md5(self, local: str) -> str:
+        key = os.path.normpath(local)
+        st = os.stat(local)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry['size'] == st.st_size and entry['mtime'] == int(st.st_mtime):
+                return entry['md5']
+            with open(local, 'rb') as f:
+                md5 = hashlib.md5(f.read()).hexdigest()
+            self._entries[key] = {'size': st.st_size, 'mtime': int(st.st_mtime), 'md5': md5}
+            self._save()
+        return md5
+
+    def _save(self):
+        try:
+            with open(self.path, 'w') as f:
+                json.dump(self._entries, f, indent=2, sort_keys=True)
+        except OSError as err:
+            logger.warning('checksum manifest save failed: {}', err)
+
+
+MANIFEST = ChecksumManifest()
+
+
+class Installer(object):
+    """
+    第一次安装时校验全部文件, 结果会被缓存, 之后的组件不需要再和设备通讯
+
+    Args:
+        adb: adb instance of android device
+        mode: push时的文件权限
+    """
+
+    def __init__(self, adb, mode: int = 0o755):
+        self.adb = adb
+        self.mode = mode
+        self._artifacts = None
+        self._has_md5sum = None
+        self._verified = set()
+        self._lock = threading.Lock()
+
+    def artifacts(self) -> Dict[str, str]:
+        """
+        需要安装的文件, 根据设备的abi与sdk选择
+
+        Returns:
+            {设备上的路径: 本地路径}
+        """
+        if self._artifacts is None:
+            abi, sdk = self.adb.abi_version(), self.adb.sdk_version()
+            artifacts = {
+                MNC_HOME: MNC_INSTALL_PATH.format(abi),
+                MNC_SO_HOME: MNC_SO_INSTALL_PATH.format(sdk, abi),
+                MNT_HOME: MNT_INSTALL_PATH.format(abi),
+                MAX_HOME: MAX_INSTALL_PATH,
+            }
+            self._artifacts = {remote: local for remote, local in artifacts.items() if os.path.isfile(local)}
+        return self._artifacts
+
+    def has_md5sum(self) -> bool:
+        """设备上是否有md5sum, 结果会被缓存"""
+        if self._has_md5sum is None:
+            out = self.adb.raw_shell(['command', '-v', 'md5sum'], skip_error=True)
+            self._has_md5sum = bool(out.strip())
+        return self._has_md5sum
+
+    def verify(self) -> List[str]:
+        """
+        通过一条md5sum命令校验全部文件
+
+        Returns:
+            md5不一致或者不存在的文件
+        """
+        artifacts = self.artifacts()
+        remotes = sorted(artifacts)
+        if not remotes:
+            return []
+        if not self.has_md5sum():
+            # 没有md5sum的旧设备, 只比较文件大小
+            return [remote for remote in remotes if self.adb.stat(remote)[1] != os.path.getsize(artifacts[remote])]
+        out = self.adb.raw_shell(['md5sum'] + remotes + ['2>/dev/null'], skip_error=True)
+        remote_md5 = {}
+        for line in out.splitlines():
+            cols = line.split()
+            if len(cols) == 2:
+                remote_md5[cols[1]] = cols[0].lower()
+        # 不存在的文件没有输出
+        return [remote for remote in remotes if remote_md5.get(remote) != MANIFEST.md5(artifacts[remote])]
+
+    def push(self, remote: str):
+        """push文件到设备, sync协议会在传输完成后才返回, 并同时设置权限"""
+        local = self.artifacts()[remote]
+        with open(local, 'rb') as f:
+            self.adb.push_buffer(f.read(), remote, mode=self.mode)
+        logger.info('{} installed in {}', os.path.basename(local), remote)
+
+    def install(self, *remotes: str):
+        """
+        确保remotes已经安装并且与本地文件一致
+
+        Args:
+            remotes: 设备上的路径, 例如MNC_HOME
+        """
+        with self._lock:
+            if not self._verified:
+                differ = set(self.verify())
+                self._verified = set(self.artifacts()) - differ
+                logger.debug('{} artifacts verified, differ: {}', self.adb.device_id, differ)
+            for remote in remotes:
+                if remote in self._verified:
+                    continue
+                if remote not in self.artifacts():
+                    raise RuntimeError('no local file for {}'.format(remote))
+                self.push(remote)
+                self._verified.add(remote)
+
+    def invalidate(self):
+        """清除校验结果, 下次安装时重新校验"""
+        with self._lock:
+            self._verified = set()
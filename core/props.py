@@ -0,0 +1,41 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import re
+import threading
+from typing import Dict
+
+from loguru import logger
+
+
+class PropertyStore(object):
+    """
+    设备属性缓存
+    一次 adb shell getprop 获取全部属性, 之后的查询直接读取缓存, 直到调用invalidate
+    """
+    PROP_PATTERN = re.compile(r'^\[(?P<key>[^\]]+)\]: \[(?P<value>.*?)\]\r?$', re.M | re.S)
+
+    def __init__(self, adb):
+        self.adb = adb
+        self._props = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, output: str) -> Dict[str, str]:
+        """解析getprop的输出, 每行格式为 [key]: [value]"""
+        return {m.group('key'): m.group('value') for m in cls.PROP_PATTERN.finditer(output)}
+
+    def refresh(self) -> Dict[str, str]:
+        props = self.parse(self.adb.raw_shell('getprop'))
+        logger.debug('{} getprop snapshot, {} properties', self.adb.device_id, len(props))
+        self._props = props
+        return props
+
+    def get(self, key: str, default: str = '') -> str:
+        with self._lock:
+            props = self._props if self._props is not None else self.refresh()
+        return props.get(key, default)
+
+    def invalidate(self):
+        """清除缓存, 下次查询时重新获取"""
+        with self._lock:
+            self._props = None
@@ -32,6 +32,7 @@ class Rotation(object):
                     continue
                 logger.info('update orientation {}->{}'.format(self.current_orientation, ori))
                 self.current_orientation = ori
+                self.adb.update_orientation(ori)
                 for callback in self.ow_callback:
                     try:
                         callback(ori)
@@ -40,6 +41,7 @@ class Rotation(object):
                         traceback.print_exc()
 
         self.current_orientation = _refresh_by_adb()
+        self.adb.update_orientation(self.current_orientation)
         self._t = threading.Thread(target=_run, args=(self._kill_event,), name='rotationwatcher')
         self._t.start()
         return self.current_orientation
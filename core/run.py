@@ -1,18 +1,28 @@
 #! usr/bin/python
 # -*- coding:utf-8 -*-
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
 from core.adb import ADB
-from core.cap_methods.minicap import Minicap
+from core.cap_methods.minicap import Minicap, CaptureProfile
 from core.touch_methods.event_touch import Touch as EVENTTOUCH
 from core.touch_methods.minitouch import Minitouch
 from core.touch_methods.maxtouch import Maxtouch
 from core.cap_methods.adbcap import AdbCap
 from core.constant import TOUCH_METHOD, CAP_METHOD, SDK_VERISON_ANDROID10
+from core.error import CaptureError
 from core.cap_methods.Javecap import Javacap
+from core.cap_methods.replaycap import ReplayCap
+from core.calibration import Calibration
 from core.rotation import Rotation
 from core.utils.base import initLogger
-from baseImage import IMAGE as Image
-from core.constant import ADB_CAP_REMOTE_PATH
+from core.utils.decoder import FrameDecoder
+from core.utils.recorder import FrameRecorder
+from core.utils.frame_bus import FrameBus, Subscription
+from core.utils.governor import GovernorPolicy
+from core.utils.latency import ClockSync, LatencyTracker
+from core.frame import Frame
 from loguru import logger
 
 # 初始化loguru
@@ -22,45 +32,388 @@ initLogger()
 class Android(object):
     def __init__(self, device_id=None, adb_path=None, host='127.0.0.1', port=5037,
                  touch_method: str = TOUCH_METHOD.MINITOUCH,
-                 cap_method: str = CAP_METHOD.MINICAP):
+                 cap_method: str = CAP_METHOD.MINICAP, stream: bool = False,
+                 capture_profile: CaptureProfile = None, calibrate: bool = False,
+                 governor_policy: GovernorPolicy = None, replay_path: str = None):
+        """
+        Args:
+            stream: 为True时截图组件保持连接, 后台持续接收最新的帧
+            capture_profile: minicap的采集参数(缩放比例, jpg质量), 默认为原始分辨率
+            governor_policy: stream模式下画面不变时降低帧率的策略, 例如GovernorPolicy(), 默认为None, 始终全速
+            calibrate: 为True时测试全部截图/触控方式, 使用最快的组合并保存, 忽略cap_method和touch_method
+            replay_path: cap_method为CAP_METHOD.REPLAYCAP时回放的录制文件(start_recording的path), 触控仍然发送到设备
+        """
+        if cap_method == CAP_METHOD.REPLAYCAP and not replay_path:
+            raise ValueError('replay_path is required by {}'.format(cap_method))
+        self._init_stamp = time.time()
+        self.time_to_first_screenshot = None
         # init adb
         self.adb = ADB(device_id, adb_path, host, port)
         self._display_info = {}
-        self.tmp_image = Image(path=ADB_CAP_REMOTE_PATH.format(self.adb.get_device_id(decode=True)))
+        self._frame_seq = 0
+        self._last_frame = None  # type: Optional[Frame]
+        self.recorder = None  # type: Optional[FrameRecorder]
+        self.frame_bus = FrameBus()
+        self._bus_attached = False
+        # 截图到点击的延迟统计, 设备时钟偏差在第一次需要时才测量
+        self.latency = LatencyTracker()
+        self.clock = ClockSync(self.adb)
         self.sdk_version = self.adb.sdk_version()
         # init components
         self.cap_method = cap_method
         self.touch_method = touch_method
+        self.stream = stream
+        self.capture_profile = capture_profile
+        self.governor_policy = governor_policy
+        self.replay_path = replay_path
+        # stream模式下, 收到帧时在线程池中提前解码
+        self.decoder = FrameDecoder() if stream else None
         if self.sdk_version >= SDK_VERISON_ANDROID10 and self.touch_method == TOUCH_METHOD.MINITOUCH:
             self.touch_method = TOUCH_METHOD.MAXTOUCH
-        if self.touch_method == TOUCH_METHOD.MINITOUCH:
-            self.minitouch = Minitouch(self.adb)
+        # 组件在第一次使用时才会创建
+        self._components = {}
+        self._component_locks = {}
+        self._lock = threading.Lock()
+        self.calibration = None
+        if calibrate:
+            self.calibrate()
         #  由于在一些设备上minicap无法启动,因此做了一些限制 error: have different types
-        if self.cap_method == CAP_METHOD.MINICAP:
-            self.minicap = Minicap(self.adb)
-        self.javacap = Javacap(self.adb)
-        self.adbcap = AdbCap(self.adb)
-        self.maxtouch = Maxtouch(self.adb)
-        self.EVENTTOUCH = EVENTTOUCH(self.adb)
-        self.rotation_watcher = Rotation(self.adb)
-        self.rotation_watcher.start()
-        self._register_rotation_watcher()
-
-    def screenshot(self):
+        self._start_components([self.cap_method, self.touch_method, 'rotation_watcher'])
+        logger.info('{} android init time={:.2f}ms', self.adb.device_id, (time.time() - self._init_stamp) * 1000)
+
+    def _create_component(self, name: str):
+        if name == CAP_METHOD.MINICAP:
+            minicap = Minicap(self.adb, stream=self.stream, profile=self.capture_profile,
+                              governor_policy=self.governor_policy)
+            if self.decoder:
+                minicap.latest_frame.add_listener(self.decoder.on_frame)
+            return minicap
+        elif name == CAP_METHOD.JAVACAP:
+            javacap = Javacap(self.adb, governor_policy=self.governor_policy)
+            if self.decoder:
+                javacap.latest_frame.add_listener(self.decoder.on_frame)
+            return javacap
+        elif name == CAP_METHOD.ADBCAP:
+            return AdbCap(self.adb)
+        elif name == CAP_METHOD.REPLAYCAP:
+            return ReplayCap(self.replay_path)
+        elif name == TOUCH_METHOD.MINITOUCH:
+            return Minitouch(self.adb)
+        elif name == TOUCH_METHOD.MAXTOUCH:
+            return Maxtouch(self.adb)
+        elif name == TOUCH_METHOD.ADBTOUCH:
+            return EVENTTOUCH(self.adb)
+        elif name == 'rotation_watcher':
+            rotation_watcher = Rotation(self.adb)
+            rotation_watcher.start()
+            self._register_rotation_watcher(rotation_watcher)
+            return rotation_watcher
+        raise ValueError('unknown component {}'.format(name))
+
+    def _get_component(self, name: str):
+        """获取组件, 不存在时创建, 同一个组件只会创建一次"""
+        with self._lock:
+            lock = self._component_locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self._components:
+                stamp = time.time()
+                self._components[name] = self._create_component(name)
+                logger.debug('{} {} init time={:.2f}ms', self.adb.device_id, name, (time.time() - stamp) * 1000)
+        return self._components[name]
+
+    def calibrate(self, force: bool = False):
+        """
+        测试截图/触控方式的启动与延迟, 选择最快的组合
+        结果按设备serial与build fingerprint保存, 之后直接使用保存的结果
+
+        Args:
+            force: 忽略保存的结果, 重新测试
+        """
+        self.calibration = Calibration(self.adb, self._get_component)
+        self.cap_method, self.touch_method = self.calibration.run(self._drop_component, force=force)
+
+    def _drop_component(self, name: str, component):
+        """关闭并移除组件"""
+        self._components.pop(name, None)
+        if hasattr(component, 'teardown'):
+            component.teardown()
+
+    def _start_components(self, names: list):
+        """在线程池中同时创建组件"""
+        with ThreadPoolExecutor(max_workers=len(names), thread_name_prefix='android_init') as executor:
+            futures = [executor.submit(self._get_component, name) for name in names]
+        for future in futures:
+            future.result()
+
+    @property
+    def minicap(self) -> Minicap:
+        return self._get_component(CAP_METHOD.MINICAP)
+
+    @property
+    def javacap(self) -> Javacap:
+        return self._get_component(CAP_METHOD.JAVACAP)
+
+    @property
+    def adbcap(self) -> AdbCap:
+        return self._get_component(CAP_METHOD.ADBCAP)
+
+    @property
+    def replaycap(self) -> ReplayCap:
+        return self._get_component(CAP_METHOD.REPLAYCAP)
+
+    @property
+    def minitouch(self) -> Minitouch:
+        return self._get_component(TOUCH_METHOD.MINITOUCH)
+
+    @property
+    def maxtouch(self) -> Maxtouch:
+        return self._get_component(TOUCH_METHOD.MAXTOUCH)
+
+    @property
+    def EVENTTOUCH(self) -> EVENTTOUCH:
+        return self._get_component(TOUCH_METHOD.ADBTOUCH)
+
+    @property
+    def rotation_watcher(self) -> Rotation:
+        return self._get_component('rotation_watcher')
+
+    def screenshot(self, scale: float = 1.0, roi: Tuple[int, int, int, int] = None) -> Frame:
+        """
+        截图
+
+        Args:
+            scale: 解码时的缩放比例, 0.5/0.25/0.125时jpg直接以IMREAD_REDUCED_COLOR_2/4/8解码
+            roi: 只需要的区域(x, y, w, h), 使用设备坐标
+        Returns:
+            Frame, 图片数据在第一次读取时才会解码, 可以通过Frame.to_image()转换为IMAGE
+            画面与上一次截图相同时frame.changed为False, 并且不会重复解码
+            图片上的坐标通过frame.to_device转换为click使用的设备坐标
+        Raises:
+            CaptureError: 重试一次后仍然没有得到帧
+        """
         stamp = time.time()
-        img_data = None
-        if self.cap_method == CAP_METHOD.MINICAP:
+        if self.decoder:
+            # 之后收到的帧按同样的比例提前解码
+            self.decoder.scale = scale
+        frame = self._capture(decode_scale=scale, roi=roi)
+        if frame is None:
+            # stream模式等待超时, 或者minicap需要重启时没有帧, 重试一次
+            logger.warning('{} {} returned no frame, retry', self.adb.device_id, self.cap_method)
+            frame = self._capture(decode_scale=scale, roi=roi)
+        if frame is None:
+            raise CaptureError('{} {} returned no frame'.format(self.adb.device_id, self.cap_method))
+        self._accept(frame, stamp)
+        logger.info("screenshot time={:.2f}ms, {}", (time.time() - stamp) * 1000, frame)
+        if self.time_to_first_screenshot is None:
+            self.time_to_first_screenshot = (time.time() - self._init_stamp) * 1000
+            logger.info('{} time to first screenshot={:.2f}ms', self.adb.device_id, self.time_to_first_screenshot)
+        return frame
+
+    def _accept(self, frame: Frame, requested: float):
+        """
+        作为最新的截图结果, 非stream模式下录制并发布到frame_bus
+        发布之后订阅者可能在其他线程中读取, Frame不再修改, 所以follow必须在发布之前调用
+
+        Args:
+            frame: 截图得到的帧
+            requested: 开始请求的时间, 用于统计延迟
+        """
+        frame.follow(self._last_frame)
+        if not self._is_streaming():
+            if self.recorder:
+                self.recorder.write(frame.data, frame.timestamp, frame.rotation)
+            self.frame_bus.publish(frame)
+        self._last_frame = frame
+        self.latency.capture(frame, requested)
+
+    def _capture(self, newer_than: int = 0, timeout: float = 5, decode_scale: float = 1.0,
+                 roi: Tuple[int, int, int, int] = None) -> Optional[Frame]:
+        """
+        Args:
+            newer_than: stream模式下只返回序号大于newer_than的帧
+            timeout: stream模式下等待帧的超时时间, 超时返回None
+            decode_scale: 解码时的缩放比例
+            roi: 只保留的区域(x, y, w, h), 使用设备坐标
+        Returns:
+            Frame, 截图组件没有返回数据时为None
+        """
+        if self._is_streaming():
+            stream_frame = self._stream_cap().get_stream_frame(newer_than, timeout)
+            return self._from_stream(stream_frame, decode_scale, roi) if stream_frame else None
+        rotation = (self.rotation_watcher.current_orientation or 0) * 90
+        if self.cap_method == CAP_METHOD.ADBCAP:
+            image = self.adbcap.get_frame()
+            if image is None:
+                return None
+            frame = Frame(image=image, seq=self._next_seq(), rotation=rotation, decode_scale=decode_scale, roi=roi)
+        elif self.cap_method == CAP_METHOD.REPLAYCAP:
+            # 使用录制时的旋转角度
+            img_data = self.replaycap.get_frame()
+            if img_data is None:
+                return None
+            frame = Frame(img_data, seq=self._next_seq(), rotation=self.replaycap.rotation, decode_scale=decode_scale,
+                          roi=roi)
+        else:
+            # minicap接收超时或者quirk需要重启时返回None
             img_data = self.minicap.get_frame()
-        elif self.cap_method == CAP_METHOD.JAVACAP:
-            img_data = self.javacap.get_frame()
-        elif self.cap_method == CAP_METHOD.ADBCAP:
-            img_data = self.adbcap.get_frame()
-        # 图片写入到缓存中
-        self.tmp_image.imwrite(img_data)
-        logger.info("screenshot time={:.2f}ms,size=({},{})", (time.time() - stamp) * 1000, *self.tmp_image.size)
-        return self.tmp_image
+            if img_data is None:
+                return None
+            frame = Frame(img_data, seq=self._next_seq(), rotation=rotation, scale=self.minicap.frame_scale,
+                          decode_scale=decode_scale, roi=roi)
+        return frame
+
+    def start_recording(self, path: str) -> FrameRecorder:
+        """
+        录制截图的jpg数据, 可以通过ReplayCap回放
+        stream模式下录制收到的每一帧, 否则录制每次screenshot的结果
+
+        Args:
+            path: 数据文件路径, 索引保存在path.idx
+        """
+        if self.cap_method == CAP_METHOD.ADBCAP:
+            raise ValueError('adbcap frames are not jpg, recording is not supported')
+        self.stop_recording()
+        self.recorder = FrameRecorder(path, rotation=(self.rotation_watcher.current_orientation or 0) * 90)
+        if self._is_streaming():
+            self._stream_cap().latest_frame.add_listener(self.recorder.on_frame)
+        logger.info('{} start recording to {}', self.adb.device_id, path)
+        return self.recorder
+
+    def stop_recording(self):
+        if not self.recorder:
+            return
+        if self._is_streaming():
+            self._stream_cap().latest_frame.remove_listener(self.recorder.on_frame)
+        self.recorder.close()
+        self.recorder = None
+
+    def _from_stream(self, stream_frame, decode_scale: float = 1.0, roi: Tuple[int, int, int, int] = None) -> Frame:
+        return Frame(stream_frame.data, seq=stream_frame.seq, timestamp=stream_frame.timestamp,
+                     rotation=(self.rotation_watcher.current_orientation or 0) * 90, scale=stream_frame.scale,
+                     decoder=self.decoder, decode_scale=decode_scale, roi=roi)
+
+    def _stream_cap(self):
+        return self.javacap if self.cap_method == CAP_METHOD.JAVACAP else self.minicap
+
+    def subscribe(self, callback: Callable = None, rate: float = None, name: str = None) -> Subscription:
+        """
+        订阅截图, 多个订阅者共享同一个Frame, 处理不过来的帧会被丢弃, 不会阻塞截图
+        stream模式下发布收到的每一帧, 否则发布每次screenshot的结果
+
+        Args:
+            callback: 不为None时在单独的线程中调用callback(frame), 否则通过Subscription.get取帧
+            rate: 期望的帧率, None时接收全部帧
+            name: 订阅者名字, 用于统计
+        Returns:
+            Subscription, 可以通过stats获取dropped/lag等统计
+        """
+        if self._is_streaming() and not self._bus_attached:
+            self._stream_cap().latest_frame.add_listener(self._publish_stream_frame)
+            self._bus_attached = True
+        return self.frame_bus.subscribe(callback, rate, name)
+
+    def _publish_stream_frame(self, stream_frame):
+        if self.frame_bus.subscriptions:
+            self.frame_bus.publish(self._from_stream(stream_frame))
+
+    def _is_streaming(self) -> bool:
+        """截图组件是否由后台线程持续接收帧, javacap始终是stream模式"""
+        return self.cap_method == CAP_METHOD.JAVACAP or (self.cap_method == CAP_METHOD.MINICAP and self.stream)
+
+    def wait_for_change(self, timeout: float = 10, frame: Frame = None, interval: float = 0.05) -> Optional[Frame]:
+        """
+        等待画面变化, 非stream模式下变化后的帧与screenshot的结果一样发布到frame_bus
+
+        Args:
+            timeout: 超时时间
+            frame: 作为比较基准的帧, 默认为上一次截图
+            interval: 非stream模式下截图的间隔
+        Returns:
+            画面变化后的帧, 超时返回None
+        """
+        base = frame or self._last_frame or self.screenshot()
+        seq = base.seq
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                logger.debug('{} screen not changed in {}s', self.adb.device_id, timeout)
+                return None
+            if self._is_streaming():
+                # stream模式下等待新的帧到达, 不需要轮询
+                current = self._capture(newer_than=seq, timeout=remaining)
+                if current is None:
+                    continue
+                seq = current.seq
+                # 变化的帧是服务主动推送的, 从收到帧开始计算
+                requested = current.timestamp
+            else:
+                requested = time.time()
+                current = self._capture()
+            if current is not None and not current.same_as(base):
+                self._accept(current, requested)
+                return current
+            if not self._is_streaming():
+                time.sleep(min(interval, max(deadline - time.time(), 0)))
+
+    def set_capture_profile(self, profile: CaptureProfile):
+        """
+        切换minicap的采集参数, 例如CaptureProfile(scale=0.5, quality=80)
+        click等操作使用设备坐标, 截图上的坐标需要通过Frame.to_device转换
+        """
+        if self.cap_method != CAP_METHOD.MINICAP:
+            raise ValueError('capture profile is not supported by {}'.format(self.cap_method))
+        self.capture_profile = profile
+        self.minicap.set_profile(profile)
+        logger.info('{} capture profile {}, bandwidth saved {:.0%}', self.adb.device_id, profile,
+                    self.minicap.bandwidth_saved)
+
+    def set_governor_policy(self, policy: Optional[GovernorPolicy]):
+        """
+        切换stream模式的帧率调节策略, 例如GovernorPolicy(min_fps=1, on_demand=True), None时始终全速
+        """
+        if not self._is_streaming():
+            raise ValueError('capture governor is only used in stream mode')
+        self.governor_policy = policy
+        self._stream_cap().set_governor_policy(policy)
+
+    @property
+    def effective_fps(self) -> float:
+        """stream模式下最近的实际帧率"""
+        return self._stream_cap().effective_fps if self._is_streaming() else 0.0
+
+    def latency_report(self, sync_clock: bool = False) -> dict:
+        """
+        最近的截图/判断/截图到点击的延迟, 单位ms
+
+        Args:
+            sync_clock: 为True时重新测量设备时钟偏差
+        Returns:
+            {'capture': {'count', 'p50', 'p95', 'p99'}, 'decision': ..., 'capture_to_touch': ...,
+             'clock_offset': 设备时间 - 电脑时间, 'clock_rtt': 测量时的往返时间, 无法同步时为None}
+        """
+        if sync_clock or self.clock.offset is None:
+            self.clock.sync()
+        report = self.latency.report()
+        report['clock_offset'] = round(self.clock.offset * 1000, 2)
+        report['clock_rtt'] = round(self.clock.rtt * 1000, 2) if self.clock.rtt is not None else None
+        logger.info('{} latency {}', self.adb.device_id, report)
+        return report
+
+    def frame_device_time(self, frame: Frame) -> float:
+        """
+        收到帧时对应的设备时间, 可以与设备日志, getevent等对照
+        minicap/javacap的帧不带设备时间, 通过时钟偏差换算
+        """
+        return self.clock.to_device(frame.timestamp)
+
+    def _next_seq(self) -> int:
+        with self._lock:
+            self._frame_seq += 1
+            return self._frame_seq
 
     def down(self, x: int, y: int, index: int = 0, pressure: int = 50):
+        self.latency.touch()
         if self.touch_method == TOUCH_METHOD.MINITOUCH:
             return self.minitouch.down(x, y, index, pressure)
         elif self.touch_method == TOUCH_METHOD.ADBTOUCH:
@@ -80,6 +433,7 @@ class Android(object):
 
     def click(self, x: int, y: int, index: int = 0, duration=0.1):
         logger.info("[{}]index={}, x={}, y={}", self.touch_method, index, x, y)
+        self.latency.touch()
         if self.touch_method == TOUCH_METHOD.MINITOUCH:
             return self.minitouch.click(x, y, index=index, duration=duration)
         elif self.touch_method == TOUCH_METHOD.MAXTOUCH:
@@ -115,8 +469,11 @@ class Android(object):
             return self.javacap
         elif self.cap_method == CAP_METHOD.ADBCAP:
             return self.adb.screenshot
+        elif self.cap_method == CAP_METHOD.REPLAYCAP:
+            return self.replaycap
 
-    def _register_rotation_watcher(self):
-        self.rotation_watcher.reg_callback(lambda x: self._get_touch_method().update_rotation(x * 90))
+    def _register_rotation_watcher(self, rotation_watcher: Rotation):
+        rotation_watcher.reg_callback(lambda x: self._get_touch_method().update_rotation(x * 90))
+        rotation_watcher.reg_callback(lambda x: self.recorder and self.recorder.update_rotation(x * 90))
         if self.cap_method == CAP_METHOD.MINICAP:
-            self.rotation_watcher.reg_callback(lambda x: self.minicap.update_rotation(x * 90))
+            rotation_watcher.reg_callback(lambda x: self.minicap.update_rotation(x * 90))
@@ -0,0 +1,172 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+常驻的adb shell会话
+每条命令后输出带有返回码的标记行,通过标记拆分出每条命令的结果,短命令只需要一次往返
+命令在子shell中运行并且stdin为/dev/null, cd/export等不会影响之后的命令, 读取stdin的命令也不会吞掉标记
+只有SESSION_COMMANDS中的短命令会通过会话执行, 避免长时间运行的命令阻塞其他线程
+"""
+import queue
+import socket
+import struct
+import threading
+import uuid
+from concurrent.futures import Future
+from typing import Union, Tuple
+
+from loguru import logger
+
+from core.adbclient import AdbClient, AdbConnection, SHELL_V2_STDIN, SHELL_V2_STDOUT, SHELL_V2_STDERR, \
+    SHELL_V2_EXIT
+from core.error import AdbError
+from core.utils.snippet import split_cmd, reg_cleanup
+
+# 可以通过会话执行的命令, 都是很快返回并且不依赖shell状态的命令
+# dumpsys的耗时没有上限, 不放在会话中, 避免阻塞旋转/分辨率等其他短命令
+SESSION_COMMANDS = frozenset({
+    'getprop', 'wm', 'md5sum', 'ps', 'pidof', 'kill', 'date', 'echo', 'ls', 'stat', 'true', 'id', 'uname',
+})
+
+
+class ShellSession(object):
+    """
+    每个设备一个常驻的sh进程, 所有线程的命令通过队列交给工作线程依次执行
+
+    Args:
+        client: adb server客户端
+        serial: 设备id
+        timeout: 单条命令默认的超时时间, None为不限制
+    """
+
+    def __init__(self, client: AdbClient, serial: str, timeout: float = None):
+        self.client = client
+        self.serial = serial
+        self.timeout = timeout
+        self.available = True
+        self.closed = False
+        self._conn = None
+        self._shell_v2 = False
+        self._buf = {SHELL_V2_STDOUT: b'', SHELL_V2_STDERR: b''}
+        self._marker = ('__AUTOPY_%s__' % uuid.uuid4().hex[:8]).encode()
+        self._queue = queue.Queue()
+        self._t = None
+        self._lock = threading.Lock()
+        reg_cleanup(self.close)
+
+    @staticmethod
+    def accepts(cmds: Union[list, str]) -> bool:
+        """命令是否适合在会话中执行"""
+        words = ' '.join(split_cmd(cmds)).split()
+        return bool(words) and words[0] in SESSION_COMMANDS
+
+    def run(self, cmds: Union[list, str], timeout: float = None) -> Tuple[bytes, bytes, int]:
+        """
+        在会话中运行命令, 线程安全
+
+        Args:
+            cmds: 需要运行的命令
+            timeout: 超时时间, 默认为self.timeout, 超时后抛出socket.timeout并且关闭会话
+        Returns:
+            stdout, stderr, returncode
+        Raises:
+            socket.error: 会话已经close
+        """
+        with self._lock:
+            if self.closed:
+                raise socket.error('shell session closed')
+            if self._t is None:
+                self._t = threading.Thread(target=self._run, name='shell_session_%s' % self.serial, daemon=True)
+                self._t.start()
+            # 在锁中放入队列, 保证任务在close的结束标记之前
+            future = Future()
+            self._queue.put((' '.join(split_cmd(cmds)), timeout or self.timeout, future))
+        return future.result()
+
+    def close(self):
+        """停止工作线程, 之后的run会抛出socket.error"""
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._t = None
+            self._queue.put(None)
+        self._close_conn()
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                break
+            command, timeout, future = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self._execute(command, timeout))
+            except BaseException as err:
+                # 会话状态未知, 下次命令时重新打开
+                self._close_conn()
+                future.set_exception(err)
+
+    def _open(self):
+        self._shell_v2 = 'shell_v2' in self.client.features(self.serial)
+        service = 'shell,v2,raw:sh' if self._shell_v2 else 'exec:sh'
+        try:
+            self._conn = self.client.open_service(self.serial, service)
+        except AdbError:
+            # 旧设备不支持exec, 退回到每条命令一次连接
+            self.available = False
+            raise
+        self._buf = {SHELL_V2_STDOUT: b'', SHELL_V2_STDERR: b''}
+        logger.debug('{} shell session open, service={}', self.serial, service)
+
+    def _close_conn(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    def _execute(self, command: str, timeout: float) -> Tuple[bytes, bytes, int]:
+        if self._conn is None:
+            self._open()
+        conn = self._conn
+        conn.sock.settimeout(timeout)
+        marker = self._marker.decode()
+        script = "( {cmd}\n) </dev/null\nprintf '\\n{m} %d\\n' $?\n".format(cmd=command, m=marker)
+        if self._shell_v2:
+            script += "printf '\\n{m}\\n' >&2\n".format(m=marker)
+            data = script.encode('utf-8')
+            conn.sock.sendall(struct.pack('<BI', SHELL_V2_STDIN, len(data)) + data)
+        else:
+            conn.sock.sendall(script.encode('utf-8'))
+
+        stdout, returncode = self._read_until(conn, SHELL_V2_STDOUT, b'\n' + self._marker + b' ')
+        stderr = b''
+        if self._shell_v2:
+            stderr, _ = self._read_until(conn, SHELL_V2_STDERR, b'\n' + self._marker)
+        return stdout, stderr, returncode
+
+    def _read_until(self, conn: AdbConnection, stream: int, sentinel: bytes) -> Tuple[bytes, int]:
+        """读取stream直到出现sentinel所在的行, 返回标记之前的内容与标记行中的返回码"""
+        while True:
+            buf = self._buf[stream]
+            index = buf.find(sentinel)
+            if index >= 0:
+                end = buf.find(b'\n', index + len(sentinel))
+                if end >= 0:
+                    self._buf[stream] = buf[end + 1:]
+                    tail = buf[index + len(sentinel):end].strip()
+                    return buf[:index], int(tail) if tail else 0
+            self._feed(conn)
+
+    def _feed(self, conn: AdbConnection):
+        if not self._shell_v2:
+            chunk = conn.sock.recv(65536)
+            if not chunk:
+                raise socket.error('shell session closed')
+            self._buf[SHELL_V2_STDOUT] += chunk
+            return
+        packet_id, size = struct.unpack('<BI', conn.recv_exact(5))
+        data = conn.recv_exact(size)
+        if packet_id == SHELL_V2_EXIT:
+            raise socket.error('shell session exit with code %d' % data[0])
+        if packet_id in self._buf:
+            self._buf[packet_id] += data
@@ -8,7 +8,7 @@ from core.adb import ADB
 from core.utils.nbsp import NonBlockingStreamReader
 from core.utils.safesocket import SafeSocket
 from core.utils.snippet import str2byte, get_std_encoding
-from core.constant import TEMP_HOME, MAX_HOME, MAX_INSTALL_PATH, MAX_LOCAL_NAME
+from core.constant import TEMP_HOME, MAX_HOME, MAX_LOCAL_NAME
 from .transform import transform
 
 
@@ -37,16 +37,11 @@ class _Maxtouch(transform):
         return display_info
 
     def install(self):
-        if not self.adb.check_file(self.HOME, 'maxpresent.jar'):
-            logger.error('maxtouch is not install')
-            self.push_target_maxtouch()
+        self.adb.installer.install(MAX_HOME)
 
     def push_target_maxtouch(self):
         """push maxpresent.jar to device"""
-        self.adb.push(MAX_INSTALL_PATH, MAX_HOME)
-        time.sleep(1)
-        self.adb.start_shell(['chmod', '755', MAX_HOME])
-        logger.info('maxtouh installed in {}', MAX_HOME)
+        self.adb.installer.push(MAX_HOME)
 
     def set_maxtouch_port(self):
         self.adb.set_forward('localabstract:%s' % self.MAX_LOCAL_NAME)
@@ -2,12 +2,11 @@
 # -*- coding:utf-8 -*-
 import re
 import sys
-import time
 import socket
 from typing import Tuple
 from loguru import logger
 from core.adb import ADB
-from core.constant import (TEMP_HOME, MNT_HOME, MNT_LOCAL_NAME, MNT_INSTALL_PATH)
+from core.constant import (TEMP_HOME, MNT_HOME, MNT_LOCAL_NAME)
 from core.utils.nbsp import NonBlockingStreamReader
 from core.utils.safesocket import SafeSocket
 from core.utils.snippet import str2byte, get_std_encoding
@@ -45,12 +44,7 @@ class _Minitouch(transform):
 
     def _push_target_mnt(self):
         """ push specific minitouch """
-        mnt_path = MNT_INSTALL_PATH.format(self.adb.abi_version())
-        # push and grant
-        self.adb.push(mnt_path, self.MNT_HOME)
-        time.sleep(1)
-        self.adb.start_shell(['chmod', '755', self.MNT_HOME])
-        logger.info('minicap installed in {}', self.MNT_HOME)
+        self.adb.installer.push(self.MNT_HOME)
 
     def start_server(self):
         self.set_minitouch_port()
@@ -125,9 +119,7 @@ class _Minitouch(transform):
         self.client = s
 
     def _is_mnt_install(self):
-        if not self.adb.check_file(self.HOME, 'minitouch'):
-            logger.error('{} minitouch is not install in {}', self.adb.device_id, self.adb.get_device_id())
-            self._push_target_mnt()
+        self.adb.installer.install(self.MNT_HOME)
         logger.info('{} minitouch is install', self.adb.device_id,)
 
     def send(self, content: str):
@@ -0,0 +1,129 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+
+import cv2
+import numpy as np
+from loguru import logger
+
+from core.utils.fingerprint import bytes_fingerprint
+
+
+# (缩小倍数, flags), 从大到小
+REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def reduced_flags(scale: float):
+    """
+    选择不小于scale的最小的IMREAD_REDUCED_COLOR, jpg在解码时直接缩小, 比解码后再缩放快得多
+
+    Returns:
+        (flags, 解码后的比例)
+    """
+    for factor, flags in REDUCED_FLAGS:
+        if 1 / factor >= scale - 1e-6:
+            return flags, 1 / factor
+    return cv2.IMREAD_COLOR, 1.0
+
+
+def resize_image(img: np.ndarray, scale: float) -> np.ndarray:
+    height, width = img.shape[:2]
+    size = (max(int(round(width * scale)), 1), max(int(round(height * scale)), 1))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+
+def decode_jpeg(data, flags: int = cv2.IMREAD_COLOR, scale: float = 1.0) -> np.ndarray:
+    """
+    解码图片数据, 返回只读的ndarray
+
+    Args:
+        data: 图片数据
+        flags: cv2.imdecode的flags
+        scale: 缩放比例, 小于1时使用IMREAD_REDUCED_COLOR_2/4/8解码, 不是1/2、1/4、1/8时再缩放到scale
+    """
+    decoded_scale = 1.0
+    if scale < 1 and flags == cv2.IMREAD_COLOR:
+        flags, decoded_scale = reduced_flags(scale)
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+    if img is None:
+        raise ValueError('decode image fail, size={}'.format(len(data)))
+    if scale < decoded_scale - 1e-6:
+        img = resize_image(img, scale / decoded_scale)
+    img.flags.writeable = False
+    return img
+
+
+class FrameDecoder(object):
+    """
+    在线程池中解码帧, cv2解码时会释放GIL
+    解码结果按帧序号与缩放比例缓存, 同一帧只解码一次
+
+    Args:
+        workers: 解码线程数
+        cache_size: 缓存的帧数
+        scale: 收到帧时提前解码使用的缩放比例
+    """
+
+    def __init__(self, workers: int = 2, cache_size: int = 4, scale: float = 1.0):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='frame_decoder')
+        self._cache = collections.OrderedDict()  # (seq, scale) -> Future
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self._last = None  # (fingerprint, scale, Future) 上一次提交的帧
+        self.scale = scale
+
+    def submit(self, seq: int, data: bytes, scale: float = None) -> Future:
+        """
+        提交解码任务, 已经提交过的帧直接返回之前的Future
+        与上一次提交的帧数据相同时不再解码, 共用上一帧的结果
+        """
+        scale = scale or self.scale
+        key = (seq, scale)
+        with self._lock:
+            future = self._cache.get(key)
+            if future is None:
+                fingerprint = bytes_fingerprint(data)
+                if self._last and self._last[:2] == (fingerprint, scale) and not self._last[2].cancelled():
+                    future = self._last[2]
+                else:
+                    future = self._executor.submit(decode_jpeg, data, scale=scale)
+                self._last = (fingerprint, scale, future)
+                self._cache[key] = future
+                while len(self._cache) > self._cache_size:
+                    _, old = self._cache.popitem(last=False)
+                    if old not in self._cache.values():
+                        old.cancel()
+            else:
+                self._cache.move_to_end(key)
+            return future
+
+    def get(self, seq: int, data: bytes = None, timeout: float = None, scale: float = None) -> np.ndarray:
+        """
+        获取解码后的帧
+
+        Args:
+            seq: 帧序号
+            data: 帧数据, 没有提交过时用于解码
+            timeout: 等待解码的超时时间
+            scale: 缩放比例, 默认为self.scale
+        Returns:
+            只读的ndarray
+        """
+        scale = scale or self.scale
+        with self._lock:
+            future = self._cache.get((seq, scale))
+        if future is None or future.cancelled():
+            if data is None:
+                raise KeyError('frame {} is not decoded'.format(seq))
+            future = self.submit(seq, data, scale)
+        return future.result(timeout)
+
+    def on_frame(self, frame):
+        """作为LatestFrame的监听函数, 收到帧时按self.scale提前解码"""
+        self.submit(frame.seq, frame.data)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        logger.debug('frame decoder closed')
@@ -0,0 +1,23 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+帧指纹, 用于判断画面是否变化
+jpg数据直接对字节做hash, 同一画面minicap/javacap编码出的数据相同
+bgr数据先缩小为块均值再hash, 避免对整张图做hash
+"""
+import hashlib
+
+import cv2
+import numpy as np
+
+BLOCK_SIZE = 32  # 缩小后的边长
+BLOCK_QUANT = 2  # 块均值舍弃的低位, 忽略细微的亮度抖动
+
+
+def bytes_fingerprint(data) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def image_fingerprint(img: np.ndarray, size: int = BLOCK_SIZE) -> bytes:
+    small = cv2.resize(img, (size, size), interpolation=cv2.INTER_AREA)
+    return hashlib.blake2b(np.ascontiguousarray(small >> BLOCK_QUANT).tobytes(), digest_size=16).digest()
@@ -0,0 +1,85 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import collections
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from loguru import logger
+
+
+class StreamFrame(NamedTuple):
+    seq: int  # 帧序号, 从1开始递增
+    timestamp: float  # 收到帧的时间
+    data: bytes  # stream模式下为缓冲池中的只读memoryview
+    scale: float = 1.0  # 图片与设备分辨率的比例
+
+
+class LatestFrame(object):
+    """
+    单帧缓冲区, 读取线程不断写入, 只保留最新的一帧
+    同时统计最近window帧的帧率
+    """
+
+    def __init__(self, window: int = 30):
+        self._cond = threading.Condition()
+        self._frame = None  # type: Optional[StreamFrame]
+        self._seq = 0
+        self._stamps = collections.deque(maxlen=window)
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """收到新帧时在读取线程中调用callback(frame), callback不应该阻塞"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        self._listeners.remove(callback)
+
+    def put(self, data: bytes, scale: float = 1.0) -> StreamFrame:
+        with self._cond:
+            self._seq += 1
+            frame = self._frame = StreamFrame(self._seq, time.time(), data, scale)
+            self._stamps.append(frame.timestamp)
+            self._cond.notify_all()
+        for callback in list(self._listeners):
+            try:
+                callback(frame)
+            except Exception as err:
+                logger.error('frame listener {} error: {}', callback, err)
+        return frame
+
+    def get(self, newer_than: int = 0, timeout: float = None) -> Optional[StreamFrame]:
+        """
+        获取最新的一帧
+
+        Args:
+            newer_than: 只返回序号大于newer_than的帧, 没有时等待
+            timeout: 等待的超时时间
+        Returns:
+            StreamFrame, 超时返回None
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frame is not None and self._frame.seq > newer_than, timeout):
+                return None
+            return self._frame
+
+    @property
+    def latest(self) -> Optional[StreamFrame]:
+        return self._frame
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    @property
+    def fps(self) -> float:
+        """最近window帧的平均帧率"""
+        stamps = list(self._stamps)
+        if len(stamps) < 2 or stamps[-1] == stamps[0]:
+            return 0.0
+        return (len(stamps) - 1) / (stamps[-1] - stamps[0])
+
+    def clear(self):
+        with self._cond:
+            self._frame = None
+            self._stamps.clear()
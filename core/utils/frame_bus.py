@@ -0,0 +1,142 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+多个消费者共享同一份截图
+发布者不会被阻塞, 每个订阅者只保留最新的一帧, 来不及处理的帧被丢弃
+所有订阅者拿到的是同一个Frame对象, 不会复制数据
+"""
+import threading
+import time
+from typing import Callable
+
+from loguru import logger
+
+
+class Subscription(object):
+    """
+    Args:
+        bus: 所属的FrameBus
+        name: 订阅者名字
+        rate: 期望的帧率, None时接收全部帧
+        callback: 不为None时在单独的线程中对每一帧调用callback(frame)
+    """
+
+    def __init__(self, bus: 'FrameBus', name: str, rate: float = None, callback: Callable = None):
+        self.bus = bus
+        self.name = name
+        self.interval = 1.0 / rate if rate else 0
+        self.callback = callback
+        self.delivered = 0  # 被取走的帧数
+        self.dropped = 0  # 没有被取走就被新帧覆盖的帧数
+        self.skipped = 0  # 因为rate限制没有发送的帧数
+        self.lag = 0.0  # 最近一次取走的帧从收到到被取走的时间(秒)
+        self.behind = 0  # 最近一次取走的帧落后于最新一帧的帧数
+        self.closed = False
+        self._cond = threading.Condition()
+        self._pending = None
+        self._last_offer = 0.0
+        self._thread = None
+        if callback:
+            self._thread = threading.Thread(target=self._run, name='frame_bus_{}'.format(name), daemon=True)
+            self._thread.start()
+
+    def offer(self, frame):
+        """由FrameBus调用, 不会阻塞"""
+        with self._cond:
+            if self.interval and frame.timestamp - self._last_offer < self.interval:
+                self.skipped += 1
+                return
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = frame
+            self._last_offer = frame.timestamp
+            self._cond.notify_all()
+
+    def get(self, timeout: float = None):
+        """
+        取走最新的一帧, 没有时等待
+
+        Returns:
+            Frame, 超时或者已经关闭时返回None
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._pending is not None or self.closed, timeout):
+                return None
+            frame, self._pending = self._pending, None
+        if frame is not None:
+            self.delivered += 1
+            self.lag = time.time() - frame.timestamp
+            self.behind = self.bus.seq - frame.seq
+        return frame
+
+    def _run(self):
+        while not self.closed:
+            frame = self.get()
+            if frame is None:
+                continue
+            try:
+                self.callback(frame)
+            except Exception as err:
+                logger.error('frame bus subscriber {} error: {}', self.name, err)
+
+    @property
+    def stats(self) -> dict:
+        return {'name': self.name, 'delivered': self.delivered, 'dropped': self.dropped, 'skipped': self.skipped,
+                'lag': self.lag, 'behind': self.behind}
+
+    def close(self):
+        self.bus.unsubscribe(self)
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class FrameBus(object):
+    def __init__(self):
+        self._subscriptions = []
+        self._lock = threading.Lock()
+        self.seq = 0  # 最近发布的帧序号
+
+    def subscribe(self, callback: Callable = None, rate: float = None, name: str = None) -> Subscription:
+        """
+        订阅帧
+
+        Args:
+            callback: 不为None时在单独的线程中调用callback(frame), 否则通过Subscription.get取帧
+            rate: 期望的帧率, None时接收全部帧
+            name: 订阅者名字, 用于日志与统计
+        """
+        with self._lock:
+            subscription = Subscription(self, name or 'subscriber_{}'.format(len(self._subscriptions)), rate, callback)
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    @property
+    def subscriptions(self) -> list:
+        return list(self._subscriptions)
+
+    def publish(self, frame):
+        """发布一帧, 所有订阅者共享同一个对象"""
+        self.seq = frame.seq
+        for subscription in self.subscriptions:
+            subscription.offer(frame)
+
+    def stats(self) -> list:
+        return [subscription.stats for subscription in self.subscriptions]
+
+    def close(self):
+        for subscription in self.subscriptions:
+            subscription.close()
@@ -0,0 +1,173 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+stream模式的采集帧率调节
+minicap/javacap每收到一个帧请求才编码一帧, 画面连续不变时降低发送请求的频率, 或者只在需要时请求
+画面变化或者截图时恢复全速
+默认不启用, 需要在minicap/javacap或者Android中指定GovernorPolicy
+"""
+import collections
+import contextlib
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from core.utils.fingerprint import bytes_fingerprint
+
+
+class GovernorPolicy(NamedTuple):
+    """
+    max_fps: 全速时的帧率上限, 0为不限制
+    min_fps: 空闲时最低的帧率
+    idle_frames: 连续多少帧不变后开始降低帧率, 0为不降低
+    decay: 之后每一帧不变时帧率乘以decay
+    on_demand: 为True时降到min_fps后不再请求, 直到画面被截图/订阅需要
+    hold: 截图后保持全速的时间(秒)
+    """
+    max_fps: float = 0
+    min_fps: float = 2.0
+    idle_frames: int = 5
+    decay: float = 0.5
+    on_demand: bool = False
+    hold: float = 1.0
+
+
+class CaptureGovernor(object):
+    """
+    决定stream线程什么时候发送下一个帧请求
+
+    stream线程: wait()返回True时发送请求, 收到帧后调用observe(data)
+    截图: 在demand()中等待帧, 期间保持全速, 返回值为True时说明之前在降速, 最新的帧可能已经过时
+
+    Args:
+        policy: 调节策略, None时始终全速
+    """
+
+    def __init__(self, policy: GovernorPolicy = None):
+        self.policy = policy
+        self._cond = threading.Condition()
+        self._fps = self._full_fps()
+        self._idle = False  # on_demand模式下已经停止请求
+        self._unchanged = 0
+        self._fingerprint = None
+        self._last_request = 0.0
+        self._demands = 0
+        self._demand_stamp = 0.0
+        self._stamps = collections.deque(maxlen=10)
+
+    def _full_fps(self) -> float:
+        if self.policy is None or not self.policy.max_fps:
+            return float('inf')
+        return float(self.policy.max_fps)
+
+    def _next_request(self) -> Optional[float]:
+        """允许发送下一个请求的时间, None为等待demand"""
+        if self._idle:
+            return None
+        return self._last_request + 1 / self._fps
+
+    @property
+    def throttled(self) -> bool:
+        return self._idle or self._fps < self._full_fps()
+
+    @property
+    def target_fps(self) -> float:
+        """当前请求的帧率, 不限制时为inf, on_demand模式下停止请求时为0"""
+        return 0.0 if self._idle else self._fps
+
+    @property
+    def effective_fps(self) -> float:
+        """最近收到帧的实际帧率"""
+        stamps = list(self._stamps)
+        if len(stamps) < 2:
+            return 0.0
+        span = stamps[-1] - stamps[0]
+        if span <= 0:
+            return 0.0
+        measured = (len(stamps) - 1) / span
+        # 距离上一帧的时间超过平均间隔时以它作为当前间隔, 停止请求后帧率随时间下降
+        waiting = time.time() - stamps[-1]
+        return min(measured, 1 / waiting) if waiting > 0 else measured
+
+    def set_policy(self, policy: Optional[GovernorPolicy]):
+        with self._cond:
+            self.policy = policy
+            self._ramp_up()
+
+    def _ramp_up(self):
+        self._fps = self._full_fps()
+        self._idle = False
+        self._unchanged = 0
+        self._cond.notify_all()
+
+    def wait(self, timeout: float) -> bool:
+        """
+        等待到可以发送下一个请求
+
+        Returns:
+            True时调用者发送一个请求, 超时返回False
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                now = time.time()
+                next_request = self._next_request()
+                if next_request is not None and now >= next_request:
+                    self._last_request = now
+                    return True
+                if now >= deadline:
+                    return False
+                self._cond.wait((deadline if next_request is None else min(deadline, next_request)) - now)
+
+    def observe(self, data) -> bool:
+        """
+        收到一帧, 根据画面是否变化调整帧率
+
+        Returns:
+            画面是否变化
+        """
+        fingerprint = bytes_fingerprint(data)
+        now = time.time()
+        with self._cond:
+            self._stamps.append(now)
+            changed = fingerprint != self._fingerprint
+            self._fingerprint = fingerprint
+            if self.policy is None or not self.policy.idle_frames:
+                return changed
+            if changed:
+                if self.throttled:
+                    self._ramp_up()
+                self._unchanged = 0
+                return changed
+            self._unchanged += 1
+            if self._unchanged < self.policy.idle_frames or self._demands or \
+                    now - self._demand_stamp < self.policy.hold:
+                return changed
+            if self._fps == float('inf'):
+                # 不限制帧率时从实际帧率开始降低
+                self._fps = max(self.effective_fps, self.policy.min_fps)
+            if self._fps > self.policy.min_fps:
+                self._fps = max(self._fps * self.policy.decay, self.policy.min_fps)
+            elif self.policy.on_demand:
+                self._idle = True
+            return changed
+
+    @contextlib.contextmanager
+    def demand(self):
+        """
+        需要最新的画面, 在with中恢复全速, 退出后保持hold秒
+
+        Yields:
+            之前是否在降速
+        """
+        with self._cond:
+            throttled = self.throttled
+            self._demands += 1
+            if throttled:
+                self._ramp_up()
+        try:
+            yield throttled
+        finally:
+            with self._cond:
+                self._demands -= 1
+                self._demand_stamp = time.time()
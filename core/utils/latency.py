@@ -0,0 +1,147 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+截图到点击的延迟统计, 以及电脑与设备的时钟偏差估计
+
+capture: 截图返回时, 画面内容最早可能的时间(帧到达时间与请求时间的较小值)已经过去了多久
+decision: 截图返回到发送触控命令的时间, 即脚本判断所用的时间
+capture_to_touch: 画面内容到发送触控命令的时间, capture + decision
+"""
+import collections
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+from loguru import logger
+
+LATENCY_NAMES = ('capture', 'decision', 'capture_to_touch')
+
+
+class ClockSync(object):
+    """
+    通过adb shell date +%s%N估计设备时钟与电脑时钟的偏差
+    取往返时间最短的一次, 假设设备在往返的中点读取时间
+
+    Args:
+        adb: adb instance of android device
+        samples: 测量次数
+    """
+
+    def __init__(self, adb, samples: int = 5):
+        self.adb = adb
+        self.samples = samples
+        self.offset = None  # 设备时间 - 电脑时间(秒)
+        self.rtt = None  # 最短的往返时间(秒), offset的误差不超过rtt/2
+        self.precision = None  # 设备时间的精度(秒), 不支持%N的设备只有秒级精度, 无法同步时为None
+
+    def _device_time(self) -> float:
+        """
+        Raises:
+            ValueError: date的输出不是时间戳
+        """
+        out = self.adb.raw_shell(['date', '+%s%N']).strip()
+        if out.isdigit() and len(out) >= 19:
+            self.precision = 1e-9
+            return int(out) / 1e9
+        # 不支持%N时输出为 1600000000N 或 1600000000%N, 其他格式时只取秒
+        seconds = out.rstrip('N%')
+        if not seconds.isdigit() or len(seconds) > 10:
+            seconds = self.adb.raw_shell(['date', '+%s']).strip()
+        if not seconds.isdigit():
+            raise ValueError('unexpected date output: {!r}'.format(out))
+        self.precision = 1.0
+        return float(seconds)
+
+    def sync(self) -> float:
+        """
+        测量时钟偏差, 设备的date无法解析时不再同步, offset为0, rtt与precision为None
+        """
+        best = None
+        for _ in range(self.samples):
+            start = time.time()
+            try:
+                device_time = self._device_time()
+            except ValueError as err:
+                logger.warning('{} clock sync disabled: {}', self.adb.device_id, err)
+                self.offset, self.rtt, self.precision = 0.0, None, None
+                return self.offset
+            end = time.time()
+            if best is None or end - start < best[0]:
+                best = (end - start, device_time - (start + end) / 2)
+        self.rtt, self.offset = best
+        logger.info('{} clock offset={:.2f}ms, rtt={:.2f}ms, precision={}s', self.adb.device_id, self.offset * 1000,
+                    self.rtt * 1000, self.precision)
+        return self.offset
+
+    def to_device(self, host_time: float) -> float:
+        if self.offset is None:
+            self.sync()
+        return host_time + self.offset
+
+    def to_host(self, device_time: float) -> float:
+        if self.offset is None:
+            self.sync()
+        return device_time - self.offset
+
+
+class LatencyTracker(object):
+    """
+    记录最近window次的延迟
+
+    Args:
+        window: 每一项保留的记录数
+    """
+
+    def __init__(self, window: int = 500):
+        self._samples = {name: collections.deque(maxlen=window) for name in LATENCY_NAMES}
+        self._lock = threading.Lock()
+        self._capture = None  # (画面最早可能的时间, 截图返回的时间)
+
+    def capture(self, frame, requested: float, returned: float = None):
+        """
+        记录一次截图
+
+        Args:
+            frame: 截图得到的Frame, frame.timestamp为收到帧的时间
+            requested: 调用截图的时间
+            returned: 截图返回的时间
+        """
+        returned = returned or time.time()
+        origin = min(requested, frame.timestamp)
+        with self._lock:
+            self._capture = (origin, returned)
+            self._samples['capture'].append(returned - origin)
+
+    def touch(self, sent: float = None):
+        """记录一次触控命令的发送, 与最近一次截图比较"""
+        sent = sent or time.time()
+        with self._lock:
+            if self._capture is None:
+                return
+            origin, returned = self._capture
+            self._samples['decision'].append(sent - returned)
+            self._samples['capture_to_touch'].append(sent - origin)
+
+    def report(self) -> Dict[str, Optional[dict]]:
+        """
+        Returns:
+            {name: {'count', 'p50', 'p95', 'p99'}}, 单位为ms, 没有记录时为None
+        """
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items()}
+        report = {}
+        for name, values in samples.items():
+            if not values:
+                report[name] = None
+                continue
+            p50, p95, p99 = np.percentile(np.array(values) * 1000, [50, 95, 99])
+            report[name] = {'count': len(values), 'p50': round(float(p50), 2), 'p95': round(float(p95), 2),
+                            'p99': round(float(p99), 2)}
+        return report
+
+    def clear(self):
+        with self._lock:
+            for values in self._samples.values():
+                values.clear()
+            self._capture = None
@@ -0,0 +1,74 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+录制minicap/javacap的jpg数据, 不解码
+数据文件只追加写入, 索引文件每一帧一条记录: offset, size, timestamp, rotation
+"""
+import struct
+import threading
+import time
+
+import numpy as np
+from loguru import logger
+
+INDEX_SUFFIX = '.idx'
+INDEX_STRUCT = struct.Struct('<QIdH')
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('size', '<u4'), ('timestamp', '<f8'), ('rotation', '<u2')])
+
+
+def index_path(path: str) -> str:
+    return path + INDEX_SUFFIX
+
+
+class FrameRecorder(object):
+    """
+    Args:
+        path: 数据文件路径, 索引保存在path.idx, 文件已存在时继续追加
+        rotation: 初始的屏幕旋转角度
+    """
+
+    def __init__(self, path: str, rotation: int = 0):
+        self.path = path
+        self.rotation = rotation
+        self.count = 0
+        self._lock = threading.Lock()
+        self._data = open(path, 'ab')
+        self._index = open(index_path(path), 'ab')
+        self._offset = self._data.tell()
+
+    def update_rotation(self, rotation: int):
+        self.rotation = rotation
+
+    def write(self, data, timestamp: float = None, rotation: int = None):
+        """写入一帧jpg数据"""
+        with self._lock:
+            if self._data.closed:
+                return
+            self._data.write(data)
+            self._index.write(INDEX_STRUCT.pack(self._offset, len(data), timestamp or time.time(),
+                                                self.rotation if rotation is None else rotation))
+            self._offset += len(data)
+            self.count += 1
+
+    def on_frame(self, frame):
+        """作为LatestFrame的监听函数, 收到帧时写入"""
+        self.write(frame.data, frame.timestamp)
+
+    def flush(self):
+        with self._lock:
+            self._data.flush()
+            self._index.flush()
+
+    def close(self):
+        with self._lock:
+            if self._data.closed:
+                return
+            self._data.close()
+            self._index.close()
+        logger.info('recorder {} closed, {} frames', self.path, self.count)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,101 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+共享内存中的解码帧环形缓冲区, 截图端写入, 其他进程直接读取, 不需要pickle图片数据
+每个slot的头部记录帧序号, 写入时先将序号置为-1, 写完数据后再写入序号
+读取方处理完后通过valid确认slot没有被覆盖
+"""
+from multiprocessing import shared_memory
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+HEADER_DTYPE = np.dtype([('seq', '<i8'), ('height', '<u4'), ('width', '<u4'), ('channels', '<u4'),
+                         ('timestamp', '<f8'), ('rotation', '<u2')])
+DATA_ALIGN = 64
+
+
+class RingSpec(NamedTuple):
+    """其他进程连接到环形缓冲区需要的参数, 可以pickle"""
+    name: str
+    slots: int
+    slot_size: int
+
+
+class SharedFrameRing(object):
+    """
+    Args:
+        slots: slot数量, 写入第seq帧时使用第seq % slots个slot
+        slot_size: 每个slot能保存的最大字节数, 例如1080*2340*3
+        name: 共享内存的名字, create为False时必须指定
+        create: 为True时创建共享内存, 否则连接到已有的共享内存
+    """
+
+    def __init__(self, slots: int, slot_size: int, name: str = None, create: bool = True):
+        self.slots = slots
+        self.slot_size = slot_size
+        header_size = -(-HEADER_DTYPE.itemsize * slots // DATA_ALIGN) * DATA_ALIGN
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=header_size + slot_size * slots)
+        self.headers = np.ndarray((slots,), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+        self._data = np.ndarray((slot_size * slots,), dtype=np.uint8, buffer=self.shm.buf, offset=header_size)
+        if create:
+            self.headers['seq'] = -1
+
+    @classmethod
+    def attach(cls, spec: RingSpec) -> 'SharedFrameRing':
+        return cls(spec.slots, spec.slot_size, name=spec.name, create=False)
+
+    @property
+    def spec(self) -> RingSpec:
+        return RingSpec(self.shm.name, self.slots, self.slot_size)
+
+    def _slot_view(self, slot: int, shape: Tuple[int, ...]) -> np.ndarray:
+        start = slot * self.slot_size
+        return self._data[start:start + int(np.prod(shape))].reshape(shape)
+
+    def write(self, image: np.ndarray, seq: int, timestamp: float = 0, rotation: int = 0) -> int:
+        """
+        写入一帧
+
+        Returns:
+            写入的slot
+        """
+        if image.nbytes > self.slot_size:
+            raise ValueError('frame size {} is larger than slot size {}'.format(image.nbytes, self.slot_size))
+        shape = image.shape if image.ndim == 3 else image.shape + (1,)
+        slot = seq % self.slots
+        header = self.headers[slot:slot + 1]
+        header['seq'] = -1
+        np.copyto(self._slot_view(slot, shape), image.reshape(shape))
+        header['height'], header['width'], header['channels'] = shape
+        header['timestamp'], header['rotation'] = timestamp, rotation
+        header['seq'] = seq
+        return slot
+
+    def read(self, seq: int) -> Optional[np.ndarray]:
+        """
+        读取第seq帧, 不复制数据
+
+        Returns:
+            只读的ndarray, 已经被覆盖或者还没有写入时返回None
+        """
+        slot = seq % self.slots
+        header = self.headers[slot]
+        if header['seq'] != seq:
+            return None
+        view = self._slot_view(slot, (int(header['height']), int(header['width']), int(header['channels'])))
+        view.flags.writeable = False
+        return view
+
+    def valid(self, seq: int) -> bool:
+        """第seq帧是否还在缓冲区中, 读取完成后调用以确认数据没有被覆盖"""
+        return int(self.headers['seq'][seq % self.slots]) == seq
+
+    def close(self):
+        # 释放numpy对共享内存的引用, 否则无法close
+        self.headers = None
+        self._data = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
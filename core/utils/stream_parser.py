@@ -0,0 +1,179 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+minicap/javacap的帧协议解析, https://github.com/openstf/minicap#usage
+banner(24字节) -> 帧大小(4字节) -> 帧数据 -> 帧大小 -> ...
+
+帧数据通过recv_into直接写入缓冲池中的bytearray, 返回只读的memoryview, 不会产生中间复制
+缓冲区在返回的memoryview(以及由它创建的ndarray等)全部释放后才会被复用
+"""
+import socket
+import struct
+import threading
+from typing import Optional
+
+BANNER_SIZE = 24
+BANNER_STRUCT = struct.Struct("<2B5I2B")
+FRAME_HEADER = struct.Struct("<I")
+
+
+def _in_use(buf: bytearray) -> bool:
+    """bytearray存在memoryview等导出时不能改变大小, 以此判断缓冲区是否还在被使用"""
+    try:
+        buf.append(0)
+    except BufferError:
+        return True
+    buf.pop()
+    return False
+
+
+class BufferPool(object):
+    """
+    帧缓冲池
+
+    Args:
+        max_buffers: 最多保留的缓冲区数量, 全部在使用时分配不进入缓冲池的临时缓冲区
+    """
+
+    def __init__(self, max_buffers: int = 8):
+        self.max_buffers = max_buffers
+        self._buffers = []
+        self._lock = threading.Lock()
+
+    def acquire(self, size: int) -> bytearray:
+        """获取一个至少size字节并且没有在使用的缓冲区"""
+        with self._lock:
+            for i, buf in enumerate(self._buffers):
+                if not _in_use(buf):
+                    if len(buf) < size:
+                        buf = self._buffers[i] = bytearray(size)
+                    return buf
+            buf = bytearray(size)
+            if len(self._buffers) < self.max_buffers:
+                self._buffers.append(buf)
+            return buf
+
+    def __len__(self):
+        return len(self._buffers)
+
+
+class FrameStreamParser(object):
+    """
+    增量解析帧数据, 超时后保留已经接收的数据, 下次调用时继续
+
+    Args:
+        sock: 已经连接的socket
+        pool: 帧缓冲池, 多个连接可以共用
+        read_size: 读取banner和帧大小时每次读取的字节数
+    """
+    STATE_BANNER, STATE_HEADER, STATE_BODY = range(3)
+
+    def __init__(self, sock: socket.socket, pool: BufferPool = None, read_size: int = 64 * 1024):
+        self.sock = sock
+        self.pool = pool if pool is not None else BufferPool()
+        self.state = self.STATE_BANNER
+        self.banner = None  # banner的原始数据
+        self._buf = bytearray(read_size)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+        self._body = None  # type: Optional[memoryview]
+        self._body_size = 0
+        self._received = 0
+
+    def _available(self) -> int:
+        return self._end - self._start
+
+    def _fill(self):
+        """从socket读取数据到读取缓冲区"""
+        if self._start:
+            # 把未解析的数据移动到开头
+            remaining = self._available()
+            self._buf[:remaining] = self._buf[self._start:self._end]
+            self._start, self._end = 0, remaining
+        n = self.sock.recv_into(self._view[self._end:])
+        if n == 0:
+            raise socket.error("socket connection broken")
+        self._end += n
+
+    def _take(self, size: int) -> Optional[memoryview]:
+        if self._available() < size:
+            return None
+        data = self._view[self._start:self._start + size]
+        self._start += size
+        return data
+
+    def _step(self) -> Optional[memoryview]:
+        """推进一次状态机, 收到完整的帧时返回帧数据"""
+        if self.state == self.STATE_BANNER:
+            data = self._take(BANNER_SIZE)
+            if data is None:
+                self._fill()
+                return None
+            self.banner = bytes(data)
+            self.state = self.STATE_HEADER
+        elif self.state == self.STATE_HEADER:
+            data = self._take(FRAME_HEADER.size)
+            if data is None:
+                self._fill()
+                return None
+            self._body_size = FRAME_HEADER.unpack(data)[0]
+            self._body = memoryview(self.pool.acquire(self._body_size))
+            # 读取缓冲区中已有的帧数据只复制一次
+            received = min(self._available(), self._body_size)
+            self._body[:received] = self._view[self._start:self._start + received]
+            self._start += received
+            self._received = received
+            self.state = self.STATE_BODY
+        if self.state == self.STATE_BODY:
+            if self._received < self._body_size:
+                # 剩余的帧数据直接写入帧缓冲区
+                n = self.sock.recv_into(self._body[self._received:self._body_size])
+                if n == 0:
+                    raise socket.error("socket connection broken")
+                self._received += n
+            if self._received == self._body_size:
+                frame = self._body[:self._body_size].toreadonly()
+                self._body.release()
+                self._body = None
+                self.state = self.STATE_HEADER
+                return frame
+        return None
+
+    def _run(self, done, timeout: float = None):
+        self.sock.settimeout(timeout)
+        try:
+            while True:
+                frame = self._step()
+                if done(frame):
+                    return frame
+        except socket.timeout:
+            return None
+        finally:
+            self.sock.settimeout(None)
+
+    def read_banner(self, timeout: float = None) -> Optional[bytes]:
+        """
+        Returns:
+            banner的原始数据, 超时返回None
+        """
+        if self.banner is None:
+            self._run(lambda frame: self.state != self.STATE_BANNER, timeout)
+        return self.banner
+
+    def read_frame(self, timeout: float = None) -> Optional[memoryview]:
+        """
+        读取下一帧, 超时返回None, 已经接收的数据会保留到下次调用
+
+        Returns:
+            只读的memoryview
+        """
+        return self._run(lambda frame: frame is not None, timeout)
+
+    @staticmethod
+    def parse_banner(banner) -> tuple:
+        """
+        Returns:
+            (version, size, pid, real_width, real_height, virtual_width, virtual_height, orientation, quirk_flag)
+        """
+        return BANNER_STRUCT.unpack(banner)
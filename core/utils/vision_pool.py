@@ -0,0 +1,126 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+在进程池中处理截图, 避免模板匹配/特征点计算受GIL限制
+图片通过SharedFrameRing传递, 任务队列中只有帧序号
+
+def match(image, seq):
+    return ...
+
+pool = VisionPool(match, workers=4)
+android.subscribe(pool.submit, rate=10)
+result = pool.get()
+"""
+import multiprocessing
+import queue
+import time
+from typing import Callable, NamedTuple, Optional
+
+import numpy as np
+from loguru import logger
+
+from core.utils.shm_ring import SharedFrameRing, RingSpec
+
+
+class VisionResult(NamedTuple):
+    seq: int  # 处理的帧序号
+    result: object  # func的返回值, 帧已经被覆盖时为None
+    valid: bool  # 为False时帧在处理前或处理中被覆盖, result不可信
+    cost: float  # 处理时间(ms)
+
+
+def _worker(spec: RingSpec, func: Callable, tasks, results):
+    ring = SharedFrameRing.attach(spec)
+    try:
+        while True:
+            seq = tasks.get()
+            if seq is None:
+                break
+            stamp = time.time()
+            image = ring.read(seq)
+            result = None
+            if image is not None:
+                try:
+                    result = func(image, seq)
+                except Exception as err:
+                    result = err
+            del image
+            results.put(VisionResult(seq, result, ring.valid(seq), (time.time() - stamp) * 1000))
+    finally:
+        ring.close()
+
+
+class VisionPool(object):
+    """
+    Args:
+        func: 处理函数func(image, seq), 需要可以pickle, 即模块级别的函数
+        workers: 进程数
+        slots: 环形缓冲区的slot数, 默认为workers * 2
+        slot_size: 每个slot的字节数, 默认为第一帧的大小
+    """
+
+    def __init__(self, func: Callable, workers: int = 2, slots: int = None, slot_size: int = None):
+        self.func = func
+        self.workers = workers
+        self.slots = slots or workers * 2
+        self.slot_size = slot_size
+        self.ring = None  # type: Optional[SharedFrameRing]
+        self.submitted = 0
+        self._ctx = multiprocessing.get_context()
+        self._tasks = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._procs = []
+
+    def _start(self, image: np.ndarray):
+        # 旋转后宽高互换, 大小不变
+        self.ring = SharedFrameRing(self.slots, self.slot_size or image.nbytes)
+        for i in range(self.workers):
+            proc = self._ctx.Process(target=_worker, name='vision_worker_{}'.format(i), daemon=True,
+                                     args=(self.ring.spec, self.func, self._tasks, self._results))
+            proc.start()
+            self._procs.append(proc)
+        logger.info('vision pool started, workers={}, slots={}, slot_size={}', self.workers, self.slots,
+                    self.ring.slot_size)
+
+    def submit(self, frame) -> int:
+        """
+        写入帧并提交任务, 可以直接作为FrameBus的订阅函数
+
+        Args:
+            frame: core.frame.Frame
+        Returns:
+            帧序号
+        """
+        image = frame.image
+        if self.ring is None:
+            self._start(image)
+        self.ring.write(image, frame.seq, frame.timestamp, frame.rotation)
+        self._tasks.put(frame.seq)
+        self.submitted += 1
+        return frame.seq
+
+    def get(self, timeout: float = None) -> Optional[VisionResult]:
+        """获取一个处理结果, 超时返回None"""
+        try:
+            return self._results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        for _ in self._procs:
+            self._tasks.put(None)
+        for proc in self._procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        self._procs = []
+        if self.ring:
+            self.ring.close()
+            self.ring.unlink()
+            self.ring = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
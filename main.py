@@ -5,4 +5,4 @@ from core.run import Android
 
 device = Android(device_id='emulator-5554', cap_method='minicap')
 device.screenshot()
-device.javacap.teardown()
+device.minicap.teardown()
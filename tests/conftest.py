@@ -0,0 +1,56 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import pytest
+
+from core.adb import ADB
+from core.adbclient import AdbClient
+from core.cap_methods.minicap import Minicap
+from tests.fake_adb import FakeAdbServer, FAKE_SERIAL
+from tests.fake_minicap import FakeMinicapServer
+
+
+@pytest.fixture
+def adb_server(tmp_path):
+    server = FakeAdbServer(str(tmp_path)).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(adb_server):
+    return AdbClient(port=adb_server.port)
+
+
+@pytest.fixture
+def serial():
+    return FAKE_SERIAL
+
+
+@pytest.fixture
+def adb(adb_server):
+    return ADB(FAKE_SERIAL, port=adb_server.port)
+
+
+@pytest.fixture
+def minicap_server():
+    server = FakeMinicapServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def make_minicap(adb, monkeypatch):
+    """不安装/启动设备上的minicap, 连接到FakeMinicapServer的Minicap"""
+    monkeypatch.setattr(Minicap, 'install', lambda self: None)
+    monkeypatch.setattr(Minicap, 'start_server', lambda self: None)
+    created = []
+
+    def make(server: FakeMinicapServer, **kwargs) -> Minicap:
+        minicap = Minicap(adb, **kwargs)
+        minicap.MNC_PORT = server.port
+        created.append(minicap)
+        return minicap
+
+    yield make
+    for minicap in created:
+        minicap.stop_stream()
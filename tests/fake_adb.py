@@ -0,0 +1,314 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+测试用的adb server
+host服务由内存中的表实现, shell/exec在本机的sh中运行, sync读写root目录下的文件
+"""
+import os
+import socket
+import socketserver
+import stat
+import struct
+import subprocess
+import threading
+
+FAKE_SERIAL = 'emulator-5554'
+FAKE_VERSION = 41
+FAKE_PROPS = {
+    'ro.build.version.sdk': '30',
+    'ro.product.cpu.abi': 'arm64-v8a',
+}
+GETPROP_SCRIPT = """#!/bin/sh
+if [ -n "$1" ]; then
+  case "$1" in
+{cases}
+  esac
+  echo
+else
+  cat <<'EOF'
+{lines}
+EOF
+fi
+"""
+
+
+class FakeAdbHandler(socketserver.BaseRequestHandler):
+    server: 'FakeAdbServer'
+
+    def setup(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def recv_exact(self, size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+
+    def recv_request(self) -> str:
+        return self.recv_exact(int(self.recv_exact(4), 16)).decode()
+
+    def okay(self):
+        self.request.sendall(b'OKAY')
+
+    def fail(self, message: str):
+        self.request.sendall(b'FAIL' + b'%04x' % len(message) + message.encode())
+
+    def reply(self, data: bytes):
+        self.request.sendall(b'OKAY' + b'%04x' % len(data) + data)
+
+    def handle(self):
+        try:
+            request = self.recv_request()
+            self.server.requests.append(request)
+            if not request.startswith('host:transport:'):
+                return self.host_service(request)
+            if request.split(':', 2)[2] != self.server.serial:
+                return self.fail("device '%s' not found" % request.split(':', 2)[2])
+            self.okay()
+            service = self.recv_request()
+            self.server.requests.append(service)
+            self.device_service(service)
+        except (EOFError, ConnectionError):
+            pass
+
+    def host_service(self, request: str):
+        server = self.server
+        prefix = 'host-serial:%s:' % server.serial
+        if request == 'host:version':
+            return self.reply(b'%04x' % server.version)
+        elif request == 'host:list-forward':
+            with server.lock:
+                lines = ''.join('%s %s %s\n' % (server.serial, local, remote)
+                                for local, remote in server.forwards.items())
+            return self.reply(lines.encode())
+        elif request.startswith('host-serial:') and not request.startswith(prefix):
+            return self.fail("device '%s' not found" % request.split(':')[1])
+        elif not request.startswith(prefix):
+            return self.fail('unknown host service: %s' % request)
+        command = request[len(prefix):]
+        if command == 'features':
+            return self.reply(server.features.encode())
+        elif command == 'get-state':
+            return self.reply(b'device')
+        elif command.startswith('forward:'):
+            spec = command[len('forward:'):]
+            no_rebind = spec.startswith('norebind:')
+            local, remote = spec[len('norebind:'):].split(';') if no_rebind else spec.split(';')
+            self.okay()
+            with server.lock:
+                if server.forward_error:
+                    return self.fail(server.forward_error)
+                if no_rebind and local in server.forwards:
+                    return self.fail('cannot rebind existing socket')
+                server.forwards[local] = remote
+            return self.okay()
+        elif command.startswith('killforward:'):
+            local = command[len('killforward:'):]
+            self.okay()
+            with server.lock:
+                if server.forwards.pop(local, None) is None:
+                    return self.fail("listener '%s' not found" % local)
+            return self.okay()
+        elif command == 'killforward-all':
+            self.okay()
+            with server.lock:
+                server.forwards.clear()
+            return self.okay()
+        return self.fail('unknown host service: %s' % request)
+
+    def device_service(self, service: str):
+        # adb客户端使用shell,v2,raw:, 没有指定-T时为shell,v2:
+        if service.startswith('shell,v2'):
+            self.okay()
+            return self.shell_v2(service.split(':', 1)[1])
+        elif service.startswith('shell:') or service.startswith('exec:'):
+            self.okay()
+            return self.shell_raw(service.split(':', 1)[1])
+        elif service == 'sync:':
+            self.okay()
+            return self.sync()
+        return self.fail('unknown service: %s' % service)
+
+    def spawn(self, command: str, stderr) -> subprocess.Popen:
+        env = dict(os.environ, PATH=self.server.bin + os.pathsep + os.environ.get('PATH', ''))
+        return subprocess.Popen(['sh', '-c', command], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr,
+                                cwd=self.server.root, env=env)
+
+    def shell_v2(self, command: str):
+        proc = self.spawn(command, subprocess.PIPE)
+        lock = threading.Lock()
+
+        def send(packet_id: int, data: bytes):
+            with lock:
+                self.request.sendall(struct.pack('<BI', packet_id, len(data)) + data)
+
+        def pump(stream, packet_id: int):
+            try:
+                while True:
+                    chunk = os.read(stream.fileno(), 65536)
+                    if not chunk:
+                        break
+                    send(packet_id, chunk)
+            except OSError:
+                # 客户端已经关闭连接
+                pass
+
+        def stdin():
+            try:
+                while True:
+                    packet_id, size = struct.unpack('<BI', self.recv_exact(5))
+                    data = self.recv_exact(size)
+                    if packet_id == 0:
+                        proc.stdin.write(data)
+                        proc.stdin.flush()
+                    elif packet_id == 3:
+                        proc.stdin.close()
+            except (EOFError, OSError, ValueError):
+                # 客户端关闭连接时与adbd一样结束shell
+                if proc.poll() is None:
+                    proc.kill()
+
+        pumps = [threading.Thread(target=pump, args=(proc.stdout, 1), daemon=True),
+                 threading.Thread(target=pump, args=(proc.stderr, 2), daemon=True)]
+        for t in pumps:
+            t.start()
+        threading.Thread(target=stdin, daemon=True).start()
+        returncode = proc.wait()
+        for t in pumps:
+            t.join()
+        try:
+            send(3, bytes([returncode & 0xff]))
+        except OSError:
+            pass
+
+    def shell_raw(self, command: str):
+        proc = self.spawn(command, subprocess.STDOUT)
+
+        def stdin():
+            try:
+                while True:
+                    data = self.request.recv(65536)
+                    if not data:
+                        break
+                    proc.stdin.write(data)
+                    proc.stdin.flush()
+            except (OSError, ValueError):
+                pass
+            if proc.poll() is None:
+                proc.kill()
+
+        threading.Thread(target=stdin, daemon=True).start()
+        try:
+            while True:
+                chunk = os.read(proc.stdout.fileno(), 65536)
+                if not chunk:
+                    break
+                self.request.sendall(chunk)
+        except OSError:
+            pass
+        proc.wait()
+        self.request.shutdown(socket.SHUT_WR)
+
+    def local_path(self, path: str) -> str:
+        return os.path.join(self.server.root, path.lstrip('/'))
+
+    def sync(self):
+        while True:
+            cmd, size = self.recv_exact(4), struct.unpack('<I', self.recv_exact(4))[0]
+            if cmd == b'QUIT':
+                return
+            path = self.recv_exact(size).decode()
+            if cmd == b'STAT':
+                try:
+                    st = os.stat(self.local_path(path))
+                    resp = struct.pack('<III', st.st_mode, st.st_size, int(st.st_mtime))
+                except OSError:
+                    resp = struct.pack('<III', 0, 0, 0)
+                self.request.sendall(b'STAT' + resp)
+            elif cmd == b'RECV':
+                self.sync_recv(path)
+            elif cmd == b'SEND':
+                self.sync_send(path)
+            else:
+                return
+
+    def sync_recv(self, path: str):
+        try:
+            with open(self.local_path(path), 'rb') as f:
+                data = f.read()
+        except OSError:
+            message = b'No such file or directory'
+            return self.request.sendall(b'FAIL' + struct.pack('<I', len(message)) + message)
+        for offset in range(0, len(data), self.server.sync_chunk):
+            chunk = data[offset:offset + self.server.sync_chunk]
+            self.request.sendall(b'DATA' + struct.pack('<I', len(chunk)) + chunk)
+        self.request.sendall(b'DONE' + struct.pack('<I', 0))
+
+    def sync_send(self, spec: str):
+        path, mode = spec.rsplit(',', 1)
+        chunks = []
+        while True:
+            cmd, size = self.recv_exact(4), struct.unpack('<I', self.recv_exact(4))[0]
+            if cmd == b'DONE':
+                mtime = size
+                break
+            chunks.append(self.recv_exact(size))
+        local = self.local_path(path)
+        os.makedirs(os.path.dirname(local), exist_ok=True)
+        with open(local, 'wb') as f:
+            f.write(b''.join(chunks))
+        os.chmod(local, stat.S_IMODE(int(mode)))
+        os.utime(local, (mtime, mtime))
+        self.request.sendall(b'OKAY' + struct.pack('<I', 0))
+
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    """
+    Args:
+        root: 设备的根目录, shell命令在这里运行
+        features: host-serial:<serial>:features 返回的特性
+        props: getprop返回的属性
+        version: host:version返回的版本, adb客户端版本不一致时会重启server
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, root: str, features: str = 'shell_v2,cmd', serial: str = FAKE_SERIAL,
+                 props: dict = None, version: int = FAKE_VERSION):
+        super(FakeAdbServer, self).__init__(('127.0.0.1', 0), FakeAdbHandler)
+        self.root = root
+        self.features = features
+        self.serial = serial
+        self.version = version
+        self.lock = threading.Lock()
+        self.forwards = {}  # local -> remote
+        self.forward_error = None  # 不为None时forward返回FAIL
+        self.requests = []
+        self.sync_chunk = 64 * 1024
+        self.bin = os.path.join(root, 'bin')
+        self._write_getprop(props or FAKE_PROPS)
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def _write_getprop(self, props: dict):
+        os.makedirs(self.bin, exist_ok=True)
+        path = os.path.join(self.bin, 'getprop')
+        cases = '\n'.join('    %s) printf %%s %r ;;' % (key, value) for key, value in props.items())
+        lines = '\n'.join('[%s]: [%s]' % (key, value) for key, value in props.items())
+        with open(path, 'w') as f:
+            f.write(GETPROP_SCRIPT.format(cases=cases, lines=lines))
+        os.chmod(path, 0o755)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> 'FakeAdbServer':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
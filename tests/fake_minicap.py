@@ -0,0 +1,78 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+"""
+测试用的minicap服务, 代替adb forward之后的minicap socket
+连接后发送banner, 之后每收到一个帧请求b'1'发送一帧
+"""
+import socket
+import struct
+import threading
+
+from core.utils.stream_parser import BANNER_SIZE, BANNER_STRUCT
+
+
+def make_banner(pid: int = 1234, real_size=(1080, 2340), virtual_size=None, orientation: int = 0,
+                quirk_flag: int = 0) -> bytes:
+    virtual_size = virtual_size or real_size
+    return BANNER_STRUCT.pack(1, BANNER_SIZE, pid, real_size[0], real_size[1], virtual_size[0], virtual_size[1],
+                              orientation, quirk_flag)
+
+
+class FakeMinicapServer(object):
+    """
+    Args:
+        frames: 第n次请求返回frames(n), n从1开始, 返回None时断开连接
+        banner: 连接后发送的banner
+    """
+
+    def __init__(self, frames=None, banner: bytes = None):
+        self.frames = frames or (lambda n: b'frame%d' % n)
+        self.banner = banner or make_banner()
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._sock = socket.socket()
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.listen(8)
+        self._clients = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    @property
+    def port(self) -> int:
+        return self._sock.getsockname()[1]
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                return
+            with self._lock:
+                self.connections += 1
+                self._clients.append(client)
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client: socket.socket):
+        try:
+            client.sendall(self.banner)
+            while True:
+                requests = client.recv(64)
+                if not requests:
+                    return
+                for _ in requests:
+                    with self._lock:
+                        self.requests += 1
+                        n = self.requests
+                    body = self.frames(n)
+                    if body is None:
+                        client.close()
+                        return
+                    client.sendall(struct.pack('<I', len(body)) + body)
+        except OSError:
+            pass
+
+    def close(self):
+        self._sock.close()
+        with self._lock:
+            for client in self._clients:
+                client.close()
@@ -0,0 +1,63 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import pytest
+
+from core.adbclient import AdbClient
+from core.error import AdbError
+from tests.fake_adb import FakeAdbServer, FAKE_VERSION
+
+
+def test_version(client):
+    assert client.version() == FAKE_VERSION
+
+
+def test_features_are_cached(client, adb_server, serial):
+    assert client.features(serial) == {'shell_v2', 'cmd'}
+    client.features(serial)
+    assert adb_server.requests.count('host-serial:%s:features' % serial) == 1
+
+
+def test_shell_v2_splits_stdout_stderr_and_returncode(client, serial):
+    stdout, stderr, returncode = client.shell(serial, 'echo out; echo err >&2; exit 3')
+    assert (stdout, stderr, returncode) == (b'out\n', b'err\n', 3)
+
+
+def test_shell_v2_reassembles_large_output(client, serial):
+    stdout, _, returncode = client.shell(serial, ['head', '-c', '300000', '/dev/zero'])
+    assert len(stdout) == 300000 and returncode == 0
+
+
+def test_shell_without_shell_v2_merges_output(tmp_path, serial):
+    server = FakeAdbServer(str(tmp_path), features='cmd').start()
+    try:
+        stdout, stderr, returncode = AdbClient(port=server.port).shell(serial, 'echo out; echo err >&2; exit 3')
+    finally:
+        server.stop()
+    assert sorted(stdout.splitlines()) == [b'err', b'out']
+    assert (stderr, returncode) == (b'', 0)
+
+
+def test_exec_out_returns_raw_bytes(client, serial):
+    assert client.exec_out(serial, ['printf', "'a\\r\\nb'"]) == b'a\r\nb'
+
+
+def test_forward_list_and_remove(client, serial):
+    client.forward(serial, 'tcp:20000', 'localabstract:minicap')
+    assert client.list_forward() == ('%s tcp:20000 localabstract:minicap\n' % serial).encode()
+    with pytest.raises(AdbError):
+        client.forward(serial, 'tcp:20000', 'localabstract:other')
+    client.remove_forward(serial, 'tcp:20000')
+    assert client.list_forward() == b''
+    with pytest.raises(AdbError):
+        client.remove_forward(serial, 'tcp:20000')
+
+
+def test_unknown_device_fails(client):
+    with pytest.raises(AdbError) as err:
+        client.shell('unknown', 'true')
+    assert 'not found' in err.value.stderr
+
+
+def test_unknown_service_fails(client, serial):
+    with pytest.raises(AdbError):
+        client.open_service(serial, 'unknown:')
@@ -0,0 +1,50 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import asyncio
+
+import pytest
+
+from core.aio.adb import AsyncADB
+from core.error import AdbError
+from tests.fake_adb import FAKE_SERIAL
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def aadb(adb_server):
+    return run(AsyncADB.create(FAKE_SERIAL, port=adb_server.port))
+
+
+def test_raw_shell(aadb):
+    assert run(aadb.raw_shell('echo out; echo err >&2')) == 'out\n'
+    with pytest.raises(AdbError):
+        run(aadb.raw_shell('exit 2'))
+    assert run(aadb.raw_shell('exit 2', skip_error=True)) == ''
+
+
+def test_exec_out(aadb):
+    assert run(aadb.exec_out(['printf', "'a\\r\\nb'"])) == b'a\r\nb'
+
+
+def test_run_sync(aadb):
+    assert run(aadb.run_sync(lambda x: x + 1, 1)) == 2
+
+
+def test_set_forward_and_remove(aadb, adb_server):
+    port = run(aadb.set_forward('localabstract:minicap'))
+    assert run(aadb.set_forward('localabstract:minicap')) == port
+    assert adb_server.forwards == {'tcp:%d' % port: 'localabstract:minicap'}
+    run(aadb.remove_forward('tcp:%d' % port))
+    assert adb_server.forwards == {}
+
+
+def test_failed_forward_returns_port(aadb, adb_server):
+    forwards = aadb.adb._forwards
+    free = len(forwards._free_set)
+    adb_server.forward_error = 'device offline'
+    with pytest.raises(AdbError):
+        run(aadb.set_forward('localabstract:minicap'))
+    assert len(forwards._free_set) == free
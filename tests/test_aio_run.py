@@ -0,0 +1,80 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import asyncio
+
+import cv2
+import numpy as np
+import pytest
+
+from core.aio.adb import AsyncADB
+from core.aio.minicap import AsyncMinicap
+from core.aio.run import AsyncAndroid
+from core.constant import TOUCH_METHOD
+from core.error import CaptureError
+from tests.fake_adb import FAKE_SERIAL
+
+JPEG = cv2.imencode('.jpg', np.zeros((8, 8, 3), dtype=np.uint8))[1].tobytes()
+
+
+class FakeAsyncMinicap(AsyncMinicap):
+    """按顺序返回frames中的数据"""
+
+    def __init__(self, frames: list):
+        self.frames = list(frames)
+        self.calls = 0
+
+    async def get_frame(self):
+        self.calls += 1
+        return self.frames.pop(0) if self.frames else None
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def device(adb_server):
+    aadb = run(AsyncADB.create(FAKE_SERIAL, port=adb_server.port))
+    return AsyncAndroid(aadb, touch_method=TOUCH_METHOD.ADBTOUCH)
+
+
+def test_screenshot_retries_once(device):
+    device.cap = FakeAsyncMinicap([None, JPEG])
+    frame = run(device.screenshot())
+    assert frame.shape == (8, 8, 3)
+    assert device.cap.calls == 2
+
+
+def test_screenshot_raises_capture_error(device):
+    device.cap = FakeAsyncMinicap([])
+    with pytest.raises(CaptureError):
+        run(device.screenshot())
+    assert device.cap.calls == 2
+
+
+def test_watch_rotation_survives_errors(device):
+    results = [RuntimeError('dumpsys failed'), 1]
+    rotations = []
+
+    async def orientation():
+        result = results.pop(0) if results else 1
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def on_rotation(rotation):
+        rotations.append(rotation)
+
+    async def watch():
+        device.ROTATION_INTERVAL = 0.01
+        device.aadb.getDisplayOrientation = orientation
+        device._on_rotation = on_rotation
+        device.adb.update_orientation = lambda ori: None
+        task = asyncio.ensure_future(device._watch_rotation())
+        await asyncio.sleep(0.2)
+        assert not task.done()
+        task.cancel()
+
+    run(watch())
+    assert device.current_orientation == 1
+    assert rotations == [90]
@@ -0,0 +1,127 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from core.constant import CAP_METHOD
+from core.error import CaptureError
+from core.run import Android
+from core.utils.frame_buffer import LatestFrame
+from core.utils.frame_bus import FrameBus
+from core.utils.latency import ClockSync, LatencyTracker
+
+JPEG = cv2.imencode('.jpg', np.zeros((8, 8, 3), dtype=np.uint8))[1].tobytes()
+OTHER_JPEG = cv2.imencode('.jpg', np.full((8, 8, 3), 255, dtype=np.uint8))[1].tobytes()
+
+
+class FakeRotationWatcher(object):
+    current_orientation = 0
+
+
+class FakeMinicap(object):
+    """非stream模式的minicap, 按顺序返回frames, 用完后返回None"""
+
+    def __init__(self, frames: list):
+        self.frames = list(frames)
+        self.frame_scale = 1.0
+        self.calls = 0
+
+    def get_frame(self):
+        self.calls += 1
+        return self.frames.pop(0) if self.frames else None
+
+
+class FakeStreamCap(object):
+    """stream模式的截图组件, 只有put进去的帧"""
+
+    def __init__(self):
+        self.latest_frame = LatestFrame()
+        self.calls = 0
+
+    def get_stream_frame(self, newer_than: int = 0, timeout: float = 5):
+        self.calls += 1
+        return self.latest_frame.get(newer_than, min(timeout, 0.05))
+
+
+def make_android(adb, cap_method: str, cap) -> Android:
+    """不启动任何设备组件的Android, 截图组件为cap"""
+    android = Android.__new__(Android)
+    android.adb = adb
+    android._init_stamp = time.time()
+    android.time_to_first_screenshot = None
+    android._frame_seq = 0
+    android._last_frame = None
+    android.recorder = None
+    android.frame_bus = FrameBus()
+    android._bus_attached = False
+    android.latency = LatencyTracker()
+    android.clock = ClockSync(adb)
+    android.cap_method = cap_method
+    android.stream = cap_method == CAP_METHOD.JAVACAP
+    android.decoder = None
+    android._lock = threading.Lock()
+    android._component_locks = {}
+    android._components = {cap_method: cap, 'rotation_watcher': FakeRotationWatcher()}
+    return android
+
+
+def test_screenshot_retries_missing_frame(adb):
+    cap = FakeMinicap([None, JPEG])
+    android = make_android(adb, CAP_METHOD.MINICAP, cap)
+    frame = android.screenshot()
+    assert frame.shape == (8, 8, 3)
+    assert cap.calls == 2
+    assert android.latency.report()['capture']['count'] == 1
+
+
+def test_screenshot_raises_capture_error(adb):
+    android = make_android(adb, CAP_METHOD.MINICAP, FakeMinicap([]))
+    received = []
+    android.frame_bus.subscribe(callback=received.append)
+    with pytest.raises(CaptureError):
+        android.screenshot()
+    assert android._last_frame is None
+    assert android.latency.report()['capture'] is None
+    assert received == []
+
+
+def test_stream_screenshot_timeout_raises_capture_error(adb):
+    cap = FakeStreamCap()
+    android = make_android(adb, CAP_METHOD.JAVACAP, cap)
+    with pytest.raises(CaptureError):
+        android.screenshot()
+    assert cap.calls == 2
+
+
+def test_wait_for_change_skips_missing_frames(adb):
+    android = make_android(adb, CAP_METHOD.MINICAP, FakeMinicap([JPEG, None, JPEG, None, OTHER_JPEG]))
+    base = android.screenshot()
+    changed = android.wait_for_change(timeout=2, interval=0.01)
+    assert changed is not None and changed.changed
+    assert not changed.same_as(base)
+    assert android._last_frame is changed
+
+
+def test_wait_for_change_stream_timeout(adb):
+    cap = FakeStreamCap()
+    cap.latest_frame.put(JPEG)
+    android = make_android(adb, CAP_METHOD.JAVACAP, cap)
+    android.screenshot()
+    assert android.wait_for_change(timeout=0.2) is None
+
+
+def test_frame_follows_before_publish(adb):
+    android = make_android(adb, CAP_METHOD.MINICAP, FakeMinicap([JPEG, JPEG, OTHER_JPEG]))
+    published = []
+    android.frame_bus.publish = lambda frame: published.append((frame, frame.changed, frame._base))
+    first = android.screenshot()
+    second = android.screenshot()
+    changed = android.wait_for_change(timeout=2, interval=0.01)
+    assert [item[0] for item in published] == [first, second, changed]
+    # 订阅者收到帧时follow已经完成
+    assert published[1][1:] == (False, first)
+    assert published[2][1:] == (True, None)
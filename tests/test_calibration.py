@@ -0,0 +1,132 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from core.calibration import Calibration, CAP_CANDIDATES
+from core.constant import CAP_METHOD
+from core.utils.frame_buffer import LatestFrame
+
+JPEG = cv2.imencode('.jpg', np.zeros((8, 8, 3), dtype=np.uint8))[1].tobytes()
+
+
+class StreamCap(object):
+    """缓冲区中总有一帧, 新帧每interval秒才产生一次"""
+
+    def __init__(self, interval: float):
+        self.latest_frame = LatestFrame()
+        self.latest_frame.put(JPEG)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._stream_thread = threading.Thread(target=self._produce, daemon=True)
+        self._stream_thread.start()
+
+    def _produce(self):
+        while not self._stop.wait(self.interval):
+            self.latest_frame.put(JPEG)
+
+    def get_stream_frame(self, newer_than: int = 0, timeout: float = 5):
+        return self.latest_frame.get(newer_than, timeout)
+
+    def get_frame(self):
+        return self.latest_frame.get().data
+
+    def teardown(self):
+        self._stop.set()
+
+
+class RequestCap(object):
+    """每次请求都截一张新图"""
+
+    def __init__(self, delay: float, data=JPEG):
+        self.delay = delay
+        self.data = data
+
+    def get_frame(self):
+        time.sleep(self.delay)
+        return self.data
+
+
+@pytest.fixture
+def calibrate(adb, tmp_path):
+    def run(components: dict):
+        dropped = []
+        calibration = Calibration(adb, components.__getitem__, samples=3, path=str(tmp_path / 'calibration.json'))
+        best = calibration._choose(CAP_CANDIDATES, calibration._fresh_frame,
+                                   lambda name, component: dropped.append(name))
+        return best, calibration.results, dropped
+    return run
+
+
+def test_buffered_stream_frame_does_not_win(calibrate):
+    stream = StreamCap(interval=0.2)
+    try:
+        best, results, dropped = calibrate({
+            CAP_METHOD.MINICAP: RequestCap(0.05),
+            CAP_METHOD.JAVACAP: stream,
+            CAP_METHOD.ADBCAP: RequestCap(0.1, data=np.zeros((8, 8, 3), dtype=np.uint8)),
+        })
+    finally:
+        stream.teardown()
+    assert best == CAP_METHOD.MINICAP
+    # 等待新帧, 而不是直接读取缓冲区中的旧帧
+    assert results[CAP_METHOD.JAVACAP]['p50'] >= 100
+    assert sorted(dropped) == [CAP_METHOD.ADBCAP, CAP_METHOD.JAVACAP]
+
+
+def test_undecodable_frame_fails(calibrate):
+    best, results, _ = calibrate({
+        CAP_METHOD.MINICAP: RequestCap(0, data=b'not a jpeg'),
+        CAP_METHOD.JAVACAP: RequestCap(0.01),
+        CAP_METHOD.ADBCAP: RequestCap(0.02, data=np.zeros((8, 8, 3), dtype=np.uint8)),
+    })
+    assert not results[CAP_METHOD.MINICAP]['ok']
+    assert best == CAP_METHOD.JAVACAP
+
+
+class LazyStreamCap(StreamCap):
+    """画面不变时不产生新帧"""
+    LAZY = True
+
+    def __init__(self):
+        super(LazyStreamCap, self).__init__(interval=60)
+
+
+def test_lazy_stream_uses_buffered_frame(calibrate):
+    stream = LazyStreamCap()
+    try:
+        best, results, _ = calibrate({
+            CAP_METHOD.MINICAP: RequestCap(0.05),
+            CAP_METHOD.JAVACAP: stream,
+            CAP_METHOD.ADBCAP: RequestCap(0.1, data=np.zeros((8, 8, 3), dtype=np.uint8)),
+        })
+    finally:
+        stream.teardown()
+    assert results[CAP_METHOD.JAVACAP]['ok']
+    assert best == CAP_METHOD.JAVACAP
+
+
+def test_timeout_is_not_saved(adb, tmp_path):
+    stream = StreamCap(interval=60)
+    path = tmp_path / 'calibration.json'
+    components = {
+        CAP_METHOD.MINICAP: RequestCap(0.01),
+        CAP_METHOD.JAVACAP: stream,
+        CAP_METHOD.ADBCAP: RequestCap(0.05, data=np.zeros((8, 8, 3), dtype=np.uint8)),
+    }
+    calibration = Calibration(adb, components.__getitem__, samples=2, path=str(path))
+    calibration.FRAME_TIMEOUT = 0.1
+    try:
+        best = calibration._choose(CAP_CANDIDATES, calibration._fresh_frame, lambda name, component: None)
+    finally:
+        stream.teardown()
+    assert best == CAP_METHOD.MINICAP
+    assert calibration.results[CAP_METHOD.JAVACAP] == {'ok': False, 'timeout': True,
+                                                       'error': 'no new frame in 0.1s'}
+    calibration._choose = lambda candidates, call, teardown: candidates[0]
+    assert calibration.run(lambda name, component: None, force=True) == (CAP_METHOD.MINICAP, 'maxtouch')
+    assert not path.exists()
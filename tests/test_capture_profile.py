@@ -0,0 +1,72 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import pytest
+
+from core.cap_methods.minicap import CaptureProfile
+from core.frame import Frame
+from tests.fake_minicap import FakeMinicapServer, make_banner
+
+DISPLAY_INFO = {'width': 1080, 'height': 2340, 'rotation': 0}
+
+
+@pytest.fixture
+def minicap(make_minicap, minicap_server, monkeypatch):
+    minicap = make_minicap(minicap_server)
+    monkeypatch.setattr(minicap.adb, 'get_display_info', lambda: dict(DISPLAY_INFO))
+    return minicap
+
+
+def test_server_params_follow_profile(minicap):
+    minicap.profile = CaptureProfile(scale=0.5, quality=70)
+    params, _ = minicap._get_params()
+    assert params == (1080, 2340, 540, 1170, 0)
+    cmds = minicap._server_cmds(params, 'minicap_test')
+    assert cmds[3] == '1080x2340@540x1170/0'
+    assert cmds[-3:] == ['-Q', '70', '2>&1']
+    minicap.profile = CaptureProfile(scale=0.5)
+    assert '-Q' not in minicap._server_cmds(params)
+
+
+def test_frame_scale_from_banner(make_minicap):
+    server = FakeMinicapServer(banner=make_banner(virtual_size=(270, 585)))
+    try:
+        minicap = make_minicap(server)
+        assert minicap.get_frame() == b'frame1'
+        assert minicap.frame_scale == 0.25
+    finally:
+        server.close()
+
+
+def test_bandwidth_saved(minicap):
+    minicap.profile = CaptureProfile(scale=0.5)
+    # 没有统计数据时按像素数估算
+    assert minicap.bandwidth_saved == pytest.approx(0.75)
+    for _ in range(3):
+        minicap._record_frame(100)
+    minicap.profile = CaptureProfile()
+    minicap._record_frame(400)
+    assert minicap.frame_size() == 400
+    assert minicap.frame_size(CaptureProfile(scale=0.5)) == 100
+    minicap.profile = CaptureProfile(scale=0.5)
+    assert minicap.bandwidth_saved == pytest.approx(0.75)
+
+
+def test_set_profile_in_stream_restarts_from_stream_thread(minicap):
+    minicap.start_stream()
+    assert minicap.get_stream_frame(timeout=2) is not None
+    minicap.set_profile(CaptureProfile())
+    assert not minicap._update_rotation_event.is_set()
+    swaps = []
+    # 由stream线程在后台启动新服务
+    minicap._start_swap = lambda: swaps.append(minicap.profile)
+    minicap.set_profile(CaptureProfile(scale=0.5))
+    assert minicap.profile == CaptureProfile(scale=0.5)
+    assert minicap._update_rotation_event.is_set()
+    minicap.get_stream_frame(newer_than=minicap.latest_frame.seq + 1, timeout=2)
+    assert swaps and swaps[0] == CaptureProfile(scale=0.5)
+
+
+def test_frame_scale_converts_to_device():
+    frame = Frame(b'jpg', scale=0.5)
+    assert frame.pixel_scale == 0.5
+    assert frame.to_device(270, 585) == (540, 1170)
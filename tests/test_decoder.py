@@ -0,0 +1,87 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import cv2
+import numpy as np
+import pytest
+
+from core.utils.decoder import FrameDecoder, decode_jpeg, reduced_flags
+from core.utils.frame_buffer import LatestFrame
+
+
+def jpeg(value: int, size=(32, 16)) -> bytes:
+    return cv2.imencode('.jpg', np.full((size[1], size[0], 3), value, dtype=np.uint8))[1].tobytes()
+
+
+@pytest.mark.parametrize('scale, expected', [
+    (1.0, (cv2.IMREAD_COLOR, 1.0)),
+    (0.5, (cv2.IMREAD_REDUCED_COLOR_2, 0.5)),
+    (0.3, (cv2.IMREAD_REDUCED_COLOR_2, 0.5)),
+    (0.25, (cv2.IMREAD_REDUCED_COLOR_4, 0.25)),
+    (0.1, (cv2.IMREAD_REDUCED_COLOR_8, 0.125)),
+])
+def test_reduced_flags(scale, expected):
+    assert reduced_flags(scale) == expected
+
+
+def test_decode_jpeg_with_scale():
+    data = jpeg(100, size=(64, 32))
+    assert decode_jpeg(data).shape == (32, 64, 3)
+    assert decode_jpeg(data, scale=0.5).shape == (16, 32, 3)
+    # 0.3不是1/2^n, 先以IMREAD_REDUCED_COLOR_2解码再缩小
+    img = decode_jpeg(data, scale=0.3)
+    assert img.shape == (10, 19, 3)
+    assert not img.flags.writeable
+    with pytest.raises(ValueError):
+        decode_jpeg(b'not a jpeg', scale=0.5)
+
+
+@pytest.fixture
+def decoder():
+    decoder = FrameDecoder(workers=2, cache_size=3)
+    yield decoder
+    decoder.close()
+
+
+def test_submit_caches_by_seq_and_scale(decoder):
+    data = jpeg(10)
+    future = decoder.submit(1, data)
+    assert decoder.submit(1, data) is future
+    half = decoder.submit(1, data, scale=0.5)
+    assert half is not future
+    assert future.result().shape == (16, 32, 3)
+    assert half.result().shape == (8, 16, 3)
+
+
+def test_get_without_data_needs_decoded_frame(decoder):
+    with pytest.raises(KeyError):
+        decoder.get(7)
+    img = decoder.get(7, jpeg(20))
+    assert not img.flags.writeable
+    assert decoder.get(7) is img
+
+
+def test_same_data_shares_decode(decoder):
+    data = jpeg(30)
+    first = decoder.submit(1, data)
+    # 画面没有变化, 下一帧直接使用上一帧的结果
+    assert decoder.submit(2, bytes(data)) is first
+    assert decoder.submit(3, jpeg(200)) is not first
+
+
+def test_cache_evicts_old_frames(decoder):
+    for seq in range(1, 5):
+        decoder.submit(seq, jpeg(seq * 40)).result()
+    with pytest.raises(KeyError):
+        decoder.get(1)
+    assert decoder.get(4).shape == (16, 32, 3)
+
+
+def test_decode_ahead_from_latest_frame(decoder):
+    latest = LatestFrame()
+    latest.add_listener(decoder.on_frame)
+    decoder.scale = 0.5
+    frame = latest.put(jpeg(50))
+    # 监听函数已经提交了解码, 不需要再传入数据
+    assert decoder.get(frame.seq, timeout=2).shape == (8, 16, 3)
+    with pytest.raises(KeyError):
+        decoder.get(frame.seq, scale=0.25)
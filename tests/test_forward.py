@@ -0,0 +1,72 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import pytest
+
+from core.error import AdbError
+from core.forward import ForwardManager
+
+PORT_RANGE = (27183, 27193)
+
+
+@pytest.fixture
+def forwards(client):
+    return ForwardManager(client, port_range=PORT_RANGE)
+
+
+def test_sync_reads_forward_list(client, adb_server, serial):
+    adb_server.forwards['tcp:30000'] = 'localabstract:minicap'
+    forwards = ForwardManager(client, port_range=PORT_RANGE)
+    assert forwards.find(serial, remote='localabstract:minicap')['local'] == 'tcp:30000'
+
+
+def test_sync_releases_vanished_ports(forwards, adb_server, serial):
+    port = forwards.forward_port(serial, 'localabstract:a')
+    assert port not in forwards._free_set
+    # forward在本进程之外被移除
+    adb_server.forwards.clear()
+    forwards.sync()
+    assert forwards.find(serial, local='tcp:%d' % port) is None
+    assert list(forwards._free_ports).count(port) == 1
+    forwards.sync()
+    assert list(forwards._free_ports).count(port) == 1
+
+
+def test_forward_port_allocates_in_order(forwards, adb_server, serial):
+    assert forwards.forward_port(serial, 'localabstract:a') == PORT_RANGE[0]
+    assert forwards.forward_port(serial, 'localabstract:b') == PORT_RANGE[0] + 1
+    assert adb_server.forwards == {'tcp:%d' % PORT_RANGE[0]: 'localabstract:a',
+                                   'tcp:%d' % (PORT_RANGE[0] + 1): 'localabstract:b'}
+
+
+def test_failed_forward_returns_port(forwards, adb_server, serial):
+    adb_server.forward_error = 'device offline'
+    for _ in range(PORT_RANGE[1] - PORT_RANGE[0] + 1):
+        with pytest.raises(AdbError):
+            forwards.forward_port(serial, 'localabstract:a')
+    assert sorted(forwards._free_ports) == list(range(*PORT_RANGE))
+    assert forwards._free_set == set(range(*PORT_RANGE))
+    adb_server.forward_error = None
+    assert forwards.forward_port(serial, 'localabstract:a') in range(*PORT_RANGE)
+
+
+def test_remove_releases_port_once(forwards, serial):
+    port = forwards.forward_port(serial, 'localabstract:a')
+    forwards.remove(serial, 'tcp:%d' % port)
+    forwards.discard(serial, 'tcp:%d' % port)
+    assert list(forwards._free_ports).count(port) == 1
+    assert forwards.find(serial, local='tcp:%d' % port) is None
+
+
+def test_remove_all_for_device(forwards, adb_server, serial):
+    forwards.forward_port(serial, 'localabstract:a')
+    forwards.forward_port(serial, 'localabstract:b')
+    forwards.remove(serial)
+    assert forwards.list(serial) == [] and adb_server.forwards == {}
+    assert len(forwards._free_set) == PORT_RANGE[1] - PORT_RANGE[0]
+
+
+def test_adb_set_forward_reuses_existing(adb, adb_server):
+    port, remote = adb.set_forward('localabstract:minitouch')
+    assert adb.set_forward('localabstract:minitouch') == (port, remote)
+    assert adb.get_forward_port('minitouch') == port
+    assert list(adb_server.forwards.values()) == ['localabstract:minitouch']
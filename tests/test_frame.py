@@ -0,0 +1,131 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import cv2
+import numpy as np
+import pytest
+from baseImage import IMAGE
+
+from core.frame import Frame
+from core.utils.decoder import FrameDecoder
+
+
+def image(value: int = 0, size=(40, 20)) -> np.ndarray:
+    return np.full((size[1], size[0], 3), value, dtype=np.uint8)
+
+
+def jpeg(value: int = 0, size=(40, 20)) -> bytes:
+    return cv2.imencode('.jpg', image(value, size))[1].tobytes()
+
+
+def test_frame_needs_data():
+    with pytest.raises(ValueError):
+        Frame()
+
+
+def test_jpeg_decoded_on_first_access():
+    frame = Frame(jpeg(), seq=3, rotation=90)
+    assert not frame.decoded
+    assert frame.shape == (20, 40, 3)
+    assert frame.decoded
+    assert frame.size == (20, 40)
+    assert frame.image is frame.imread()
+    assert not frame.image.flags.writeable
+
+
+def test_image_frame_is_not_copied():
+    img = image(5)
+    frame = Frame(image=img)
+    assert frame.decoded and frame.image is img
+
+
+def test_decoder_is_used():
+    decoder = FrameDecoder()
+    try:
+        data = jpeg(9)
+        img = decoder.get(4, data)
+        assert Frame(data, seq=4, decoder=decoder).image is img
+    finally:
+        decoder.close()
+
+
+def test_to_image():
+    frame = Frame(jpeg(), seq=1)
+    converted = frame.to_image()
+    assert isinstance(converted, IMAGE)
+    assert converted.shape[:2] == frame.size
+
+
+def test_follow_reuses_decode_of_same_frame():
+    prev = Frame(jpeg(10), seq=1)
+    img = prev.image
+    frame = Frame(jpeg(10), seq=2)
+    assert not frame.follow(prev)
+    assert not frame.changed
+    assert frame.image is img
+    # 第三帧仍然指向最早解码的帧
+    third = Frame(jpeg(10), seq=3)
+    third.follow(frame)
+    assert third._base is prev
+
+
+def test_follow_changed_frame():
+    prev = Frame(jpeg(10), seq=1)
+    frame = Frame(jpeg(200), seq=2)
+    assert frame.follow(prev) and frame.changed
+    assert frame.follow(None)
+
+
+def test_follow_needs_same_decode_params():
+    prev = Frame(jpeg(10), seq=1)
+    frame = Frame(jpeg(10), seq=2, decode_scale=0.5)
+    assert not frame.follow(prev)
+    assert frame._base is None
+    assert frame.shape == (10, 20, 3)
+
+
+def test_image_fingerprint_ignores_noise():
+    base = image(100)
+    noisy = base.copy()
+    noisy[0, 0] += 1
+    assert Frame(image=base).same_as(Frame(image=noisy))
+    assert not Frame(image=base).same_as(Frame(image=image(180)))
+
+
+def test_decode_scale_and_roi():
+    img = image(0, size=(80, 40))
+    img[10:20, 20:40] = 255
+    data = cv2.imencode('.png', img)[1].tobytes()
+    frame = Frame(data, decode_scale=0.5, roi=(20, 10, 20, 10))
+    assert frame.pixel_scale == 0.5
+    assert frame.shape == (5, 10, 3)
+    assert frame.image.min() == 255
+    # roi裁剪不复制数据
+    assert frame.image.base is not None
+
+
+def test_image_source_scale_and_roi():
+    img = image(0, size=(80, 40))
+    img[10:20, 20:40] = 255
+    frame = Frame(image=img, decode_scale=0.5, roi=(20, 10, 20, 10))
+    assert not frame.decoded
+    assert frame.shape == (5, 10, 3)
+    assert frame.image.min() == 255
+
+
+def test_to_device_with_scale_and_roi():
+    frame = Frame(b'jpg', scale=0.5, decode_scale=0.5, roi=(100, 200, 400, 400))
+    assert frame.pixel_scale == 0.25
+    assert frame.to_device(0, 0) == (100, 200)
+    assert frame.to_device(10, 20) == (140, 280)
+    assert Frame(b'jpg').to_device(10.4, 20.6) == (10, 21)
+
+
+def test_follow_needs_same_roi():
+    prev = Frame(jpeg(10), seq=1, roi=(0, 0, 10, 10))
+    prev.image
+    frame = Frame(jpeg(10), seq=2, roi=(10, 0, 10, 10))
+    assert not frame.follow(prev)
+    assert frame._base is None
+    same = Frame(jpeg(10), seq=3, roi=(0, 0, 10, 10))
+    same.follow(prev)
+    assert same._base is prev
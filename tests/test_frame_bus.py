@@ -0,0 +1,60 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import threading
+
+from core.frame import Frame
+from core.utils.frame_bus import FrameBus
+
+
+def make_frame(seq: int, timestamp: float = None) -> Frame:
+    return Frame(b'jpg', seq=seq, timestamp=100.0 + seq * 0.1 if timestamp is None else timestamp)
+
+
+def test_subscribers_share_frame():
+    bus = FrameBus()
+    first, second = bus.subscribe(name='a'), bus.subscribe(name='b')
+    frame = make_frame(1)
+    bus.publish(frame)
+    assert first.get(timeout=1) is frame
+    assert second.get(timeout=1) is frame
+    assert first.get(timeout=0.01) is None
+
+
+def test_slow_subscriber_drops_old_frames():
+    bus = FrameBus()
+    subscription = bus.subscribe()
+    for seq in range(1, 4):
+        bus.publish(make_frame(seq))
+    assert subscription.get(timeout=1).seq == 3
+    assert subscription.dropped == 2
+    assert subscription.delivered == 1
+    assert subscription.behind == 0
+
+
+def test_rate_limit_skips_frames():
+    bus = FrameBus()
+    subscription = bus.subscribe(rate=5)
+    for seq in range(1, 5):
+        # 间隔0.1秒, rate=5时每0.2秒发送一帧
+        bus.publish(make_frame(seq))
+    assert subscription.skipped == 2
+    assert subscription.get(timeout=1).seq == 3
+
+
+def test_callback_and_close():
+    bus = FrameBus()
+    received = []
+    done = threading.Event()
+
+    def callback(frame):
+        received.append(frame.seq)
+        done.set()
+
+    subscription = bus.subscribe(callback=callback, name='cb')
+    bus.publish(make_frame(1))
+    assert done.wait(1)
+    bus.close()
+    assert subscription.closed
+    assert bus.subscriptions == []
+    assert received == [1]
+    assert subscription.get(timeout=0.01) is None
@@ -0,0 +1,96 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import time
+
+from core.cap_methods.Javecap import Javacap
+from core.cap_methods.minicap import Minicap
+from core.utils.governor import CaptureGovernor, GovernorPolicy
+
+POLICY = GovernorPolicy(max_fps=0, min_fps=2, idle_frames=3, decay=0.5, hold=0)
+
+
+def feed(governor: CaptureGovernor, frames, interval: float = 0.01):
+    """模拟stream线程按interval收到frames"""
+    changes = []
+    for data in frames:
+        changes.append(governor.observe(data))
+        time.sleep(interval)
+    return changes
+
+
+def test_default_policy_never_throttles():
+    assert Minicap.GOVERNOR_POLICY is None and Javacap.GOVERNOR_POLICY is None
+    governor = CaptureGovernor(None)
+    feed(governor, [b'same'] * 20, interval=0)
+    assert not governor.throttled
+    assert governor.target_fps == float('inf')
+    assert governor.wait(0)
+
+
+def test_throttle_after_idle_frames():
+    governor = CaptureGovernor(POLICY)
+    assert feed(governor, [b'a', b'a', b'a']) == [True, False, False]
+    assert not governor.throttled
+    feed(governor, [b'a'])
+    assert governor.throttled
+    # 从实际帧率开始降低
+    assert POLICY.min_fps <= governor.target_fps < 100
+
+
+def test_decay_to_min_fps():
+    governor = CaptureGovernor(POLICY)
+    feed(governor, [b'a'] * 20)
+    assert governor.target_fps == POLICY.min_fps
+    assert governor.throttled
+
+
+def test_change_ramps_up():
+    governor = CaptureGovernor(POLICY)
+    feed(governor, [b'a'] * 10)
+    assert governor.throttled
+    assert governor.observe(b'b')
+    assert not governor.throttled
+    assert governor.target_fps == float('inf')
+
+
+def test_on_demand_stops_requesting():
+    governor = CaptureGovernor(POLICY._replace(on_demand=True))
+    feed(governor, [b'a'] * 20)
+    assert governor.target_fps == 0
+    assert not governor.wait(0.05)
+    with governor.demand() as throttled:
+        assert throttled
+        assert governor.wait(0)
+
+
+def test_no_decay_while_demanded():
+    governor = CaptureGovernor(POLICY)
+    with governor.demand() as throttled:
+        assert not throttled
+        feed(governor, [b'a'] * 10)
+        assert not governor.throttled
+
+
+def test_hold_after_demand():
+    governor = CaptureGovernor(POLICY._replace(hold=10))
+    with governor.demand():
+        pass
+    feed(governor, [b'a'] * 10)
+    assert not governor.throttled
+
+
+def test_max_fps_limits_requests():
+    governor = CaptureGovernor(GovernorPolicy(max_fps=10, idle_frames=0))
+    assert governor.wait(0)
+    assert not governor.wait(0.02)
+    assert governor.wait(0.2)
+    assert not governor.throttled
+
+
+def test_set_policy_ramps_up():
+    governor = CaptureGovernor(POLICY)
+    feed(governor, [b'a'] * 10)
+    governor.set_policy(None)
+    assert not governor.throttled
+    feed(governor, [b'a'] * 10)
+    assert not governor.throttled
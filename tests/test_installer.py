@@ -0,0 +1,60 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import pytest
+
+import core.installer
+from core.installer import ChecksumManifest, Installer
+
+# 相对路径, shell命令与sync都在fake adb server的root下
+REMOTES = ['data/local/tmp/minicap', 'data/local/tmp/minitouch']
+
+
+@pytest.fixture
+def installer(adb, tmp_path, monkeypatch):
+    monkeypatch.setattr(core.installer, 'MANIFEST', ChecksumManifest(str(tmp_path / 'checksums.json')))
+    installer = Installer(adb)
+    installer._artifacts = {}
+    for remote in REMOTES:
+        local = tmp_path / remote.rsplit('/', 1)[1]
+        local.write_bytes(remote.encode() * 100)
+        installer._artifacts[remote] = str(local)
+    return installer
+
+
+def test_fresh_device_uses_md5sum(installer, adb_server):
+    assert installer.has_md5sum()
+    assert installer.verify() == REMOTES
+    # 文件不存在时也不会退回到STAT
+    assert 'sync:' not in adb_server.requests
+
+
+def test_install_pushes_only_differ(installer, adb_server):
+    installer.install(*REMOTES)
+    assert installer.verify() == []
+    with open(installer._artifacts[REMOTES[0]], 'ab') as f:
+        f.write(b'changed')
+    assert installer.verify() == [REMOTES[0]]
+    installer.invalidate()
+    pushes = adb_server.requests.count('sync:')
+    installer.install(*REMOTES)
+    assert adb_server.requests.count('sync:') == pushes + 1
+    assert installer.verify() == []
+
+
+def test_without_md5sum_compares_size(installer, adb_server):
+    installer._has_md5sum = False
+    assert installer.verify() == REMOTES
+    installer.install(*REMOTES)
+    installer.invalidate()
+    assert installer.verify() == []
+
+
+def test_has_md5sum_is_cached(installer, adb_server):
+    installer.has_md5sum()
+    installer.has_md5sum()
+    assert adb_server.requests.count('shell,v2,raw:command -v md5sum') == 1
+
+
+def test_install_unknown_artifact(installer):
+    with pytest.raises(RuntimeError):
+        installer.install('data/local/tmp/unknown')
@@ -0,0 +1,113 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from core.cap_methods.Javecap import Javacap
+from core.utils.frame_buffer import LatestFrame
+from core.utils.governor import CaptureGovernor
+from core.utils.stream_parser import FrameStreamParser, BufferPool
+
+
+class FakeProc(object):
+    def __init__(self):
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+
+def make_javacap(recv_timeout: float = 0.2) -> Javacap:
+    """不连接设备的Javacap, 只用于测试_stream_frames"""
+    javacap = Javacap.__new__(Javacap)
+    javacap.recv_timeout = recv_timeout
+    javacap.pipeline = Javacap.PIPELINE
+    javacap.proc = FakeProc()
+    javacap.reconnects = 0
+    javacap.staleness = None
+    javacap.latest_frame = LatestFrame()
+    javacap.governor = CaptureGovernor(None)
+    javacap._stream_kill_event = threading.Event()
+    javacap._buffer_pool = BufferPool()
+    return javacap
+
+
+def serve_frames(sock: socket.socket, delays: dict):
+    """每收到一个请求返回一帧, delays[n]为第n帧之前等待的时间"""
+    n = 0
+    try:
+        sock.sendall(b'\0' * 24)
+        while True:
+            requests = sock.recv(64)
+            if not requests:
+                return
+            for _ in requests:
+                n += 1
+                time.sleep(delays.get(n, 0))
+                body = b'frame%d' % n
+                sock.sendall(struct.pack('<I', len(body)) + body)
+    except OSError:
+        pass
+
+
+@pytest.fixture
+def stream():
+    device, host = socket.socketpair()
+    yield device, host
+    device.close()
+    host.close()
+
+
+def run_stream(javacap: Javacap, host: socket.socket) -> threading.Thread:
+    parser = FrameStreamParser(host, javacap._buffer_pool)
+    assert parser.read_banner(1) is not None
+    t = threading.Thread(target=javacap._stream_frames, args=(parser,), daemon=True)
+    t.start()
+    return t
+
+
+def test_idle_screen_does_not_reconnect(stream):
+    device, host = stream
+    javacap = make_javacap()
+    threading.Thread(target=serve_frames, args=(device, {3: 1.0}), daemon=True).start()
+    t = run_stream(javacap, host)
+    frame = javacap.latest_frame.get(newer_than=2, timeout=3)
+    # 第3帧之后的帧紧接着到达, 取到的可能已经是更新的帧
+    assert frame is not None and bytes(frame.data).startswith(b'frame')
+    assert int(bytes(frame.data)[5:]) >= 3
+    assert t.is_alive() and javacap.reconnects == 0
+    javacap._stream_kill_event.set()
+    t.join(2)
+
+
+def test_server_quit_raises(stream):
+    device, host = stream
+    javacap = make_javacap()
+    javacap.proc.returncode = 1
+    with pytest.raises(RuntimeError):
+        host.settimeout(5)
+        javacap._stream_frames(FrameStreamParser(host, javacap._buffer_pool))
+
+
+def test_connection_closed_raises(stream):
+    device, host = stream
+    javacap = make_javacap()
+    device.close()
+    with pytest.raises(socket.error):
+        javacap._stream_frames(FrameStreamParser(host, javacap._buffer_pool))
+
+
+def test_pipeline_keeps_requests_in_flight(stream):
+    device, host = stream
+    javacap = make_javacap()
+    threading.Thread(target=serve_frames, args=(device, {}), daemon=True).start()
+    t = run_stream(javacap, host)
+    frame = javacap.latest_frame.get(newer_than=20, timeout=3)
+    assert frame is not None and frame.data.tobytes().startswith(b'frame')
+    javacap._stream_kill_event.set()
+    t.join(2)
+    assert not t.is_alive()
@@ -0,0 +1,83 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import time
+
+import pytest
+
+from core.frame import Frame
+from core.utils.latency import ClockSync, LatencyTracker
+
+
+class DateAdb(object):
+    """raw_shell按命令返回固定的date输出"""
+    device_id = 'emulator-5554'
+
+    def __init__(self, ns_output: str, seconds_output: str = '1600000000'):
+        self.outputs = {'+%s%N': ns_output, '+%s': seconds_output}
+        self.commands = []
+
+    def raw_shell(self, cmds, *args, **kwargs):
+        self.commands.append(cmds[1])
+        return self.outputs[cmds[1]] + '\n'
+
+
+def test_tracker_percentiles():
+    tracker = LatencyTracker()
+    assert tracker.report() == {'capture': None, 'decision': None, 'capture_to_touch': None}
+    for i in range(1, 101):
+        frame = Frame(b'jpg', timestamp=100.0)
+        tracker.capture(frame, requested=100.0 + i / 1000, returned=100.0 + i / 1000)
+        tracker.touch(sent=100.0 + i / 1000 + 0.005)
+    report = tracker.report()
+    # 画面最早可能的时间为帧到达时间
+    assert report['capture'] == {'count': 100, 'p50': 50.5, 'p95': 95.05, 'p99': 99.01}
+    assert report['decision']['p50'] == pytest.approx(5, abs=0.01)
+    assert report['capture_to_touch']['p50'] == pytest.approx(55.5, abs=0.01)
+    tracker.clear()
+    assert tracker.report()['capture'] is None
+
+
+def test_touch_without_capture_is_ignored():
+    tracker = LatencyTracker()
+    tracker.touch()
+    assert tracker.report()['decision'] is None
+
+
+def test_capture_uses_request_time_when_earlier():
+    tracker = LatencyTracker()
+    tracker.capture(Frame(b'jpg', timestamp=10.0), requested=9.0, returned=10.5)
+    assert tracker.report()['capture']['p50'] == 1500
+
+
+def test_clock_sync_nanoseconds():
+    adb = DateAdb('%d' % int(time.time() * 1e9))
+    clock = ClockSync(adb, samples=2)
+    assert abs(clock.sync()) < 1
+    assert clock.precision == 1e-9
+    assert adb.commands == ['+%s%N', '+%s%N']
+
+
+@pytest.mark.parametrize('output', ['1600000000%N', '1600000000N', '1600000000'])
+def test_clock_sync_seconds_without_percent_n(output):
+    adb = DateAdb(output)
+    clock = ClockSync(adb, samples=1)
+    clock.sync()
+    assert clock.precision == 1.0
+    assert clock.to_host(1600000000.0) == pytest.approx(time.time(), abs=1)
+    assert adb.commands == ['+%s%N']
+
+
+def test_clock_sync_falls_back_to_seconds():
+    # 截断的%N输出不能按纳秒解析
+    adb = DateAdb('16000000001234', seconds_output='%d' % time.time())
+    clock = ClockSync(adb, samples=1)
+    assert abs(clock.sync()) < 2
+    assert clock.precision == 1.0
+    assert adb.commands == ['+%s%N', '+%s']
+
+
+def test_clock_sync_disabled_on_garbage():
+    clock = ClockSync(DateAdb('date: bad format', seconds_output='date: bad format'))
+    assert clock.sync() == 0.0
+    assert clock.rtt is None and clock.precision is None
+    assert clock.to_device(123.0) == 123.0
@@ -0,0 +1,58 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import time
+
+from tests.fake_minicap import FakeMinicapServer
+
+
+def test_one_shot_get_frame(make_minicap, minicap_server):
+    minicap = make_minicap(minicap_server)
+    assert minicap.get_frame() == b'frame1'
+    assert minicap.get_frame() == b'frame2'
+    # 非stream模式每一帧重新连接
+    assert minicap_server.connections == 2
+
+
+def test_stream_keeps_latest_frame(make_minicap, minicap_server):
+    minicap = make_minicap(minicap_server)
+    minicap.start_stream()
+    first = minicap.get_stream_frame(timeout=2)
+    assert first.seq >= 1 and bytes(first.data).startswith(b'frame')
+    later = minicap.get_stream_frame(newer_than=first.seq + 5, timeout=2)
+    assert later.seq > first.seq + 5
+    assert minicap_server.connections == 1
+    assert minicap.fps > 0
+    assert minicap.staleness is not None
+
+
+def test_stream_get_frame_returns_latest(make_minicap, minicap_server):
+    minicap = make_minicap(minicap_server)
+    minicap.start_stream()
+    data = minicap.get_frame()
+    assert type(data) is bytes and data.startswith(b'frame')
+
+
+def test_stream_reconnects_after_disconnect(make_minicap, monkeypatch):
+    # 第3次请求时断开连接
+    server = FakeMinicapServer(frames=lambda n: None if n == 3 else b'frame%d' % n)
+    minicap = make_minicap(server)
+    monkeypatch.setattr(minicap, 'STREAM_TIMEOUT', 0.05)
+    try:
+        minicap.start_stream()
+        frame = minicap.get_stream_frame(newer_than=3, timeout=3)
+        assert frame is not None
+        assert server.connections >= 2
+    finally:
+        minicap.stop_stream()
+        server.close()
+
+
+def test_stop_stream_clears_frame(make_minicap, minicap_server):
+    minicap = make_minicap(minicap_server)
+    minicap.start_stream()
+    assert minicap.get_stream_frame(timeout=2) is not None
+    minicap.stop_stream()
+    assert minicap._stream_thread is None
+    stamp = time.time()
+    assert minicap.latest_frame.get(timeout=0.05) is None
+    assert time.time() - stamp < 1
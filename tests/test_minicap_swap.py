@@ -0,0 +1,116 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import subprocess
+
+import pytest
+
+from core.utils.snippet import split_cmd
+from tests.fake_minicap import FakeMinicapServer, make_banner
+
+DISPLAY_INFO = {'width': 1080, 'height': 2340, 'rotation': 0}
+OLD_PID, NEW_PID = 1234, 200  # OLD_PID为minicap_server的banner中的pid
+
+
+class FakeDevice(object):
+    """
+    设备上的minicap进程, 代替adb的pidof/kill/start_shell
+    start_shell启动一个输出Server start的本地进程, 同时在设备上出现一个新的minicap进程
+    """
+
+    def __init__(self, adb, monkeypatch, pids):
+        self.pids = set(pids)
+        self.killed = []
+        self.launched = []
+        self.procs = []
+        raw_shell = adb.raw_shell
+
+        def fake_raw_shell(cmds, *args, **kwargs):
+            words = split_cmd(cmds)
+            if words[0] == 'pidof':
+                return ' '.join(str(pid) for pid in sorted(self.pids)) + '\n'
+            if words[0] == 'kill':
+                self.killed.append(int(words[1]))
+                self.pids.discard(int(words[1]))
+                return ''
+            return raw_shell(cmds, *args, **kwargs)
+
+        def fake_start_shell(cmds):
+            self.launched.append(' '.join(split_cmd(cmds)))
+            self.pids.add(NEW_PID)
+            proc = subprocess.Popen(['sh', '-c', 'echo Server start; exec sleep 30'], stdout=subprocess.PIPE)
+            self.procs.append(proc)
+            return proc
+
+        monkeypatch.setattr(adb, 'raw_shell', fake_raw_shell)
+        monkeypatch.setattr(adb, 'start_shell', fake_start_shell)
+        monkeypatch.setattr(adb, 'get_display_info', lambda: dict(DISPLAY_INFO))
+
+    def close(self):
+        for proc in self.procs:
+            proc.kill()
+            proc.wait()
+
+
+@pytest.fixture
+def new_server():
+    server = FakeMinicapServer(frames=lambda n: b'new%d' % n, banner=make_banner(pid=NEW_PID))
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def swap(adb, adb_server, make_minicap, minicap_server, new_server, monkeypatch):
+    """旧服务为minicap_server, 热切换后的新服务为new_server"""
+    device = FakeDevice(adb, monkeypatch, [OLD_PID])
+    minicap = make_minicap(minicap_server)
+    adb_server.forwards['tcp:%d' % minicap_server.port] = 'localabstract:' + minicap.MNC_LOCAL_NAME
+    monkeypatch.setattr(adb, 'set_forward', lambda remote: (new_server.port, remote))
+    yield minicap, device
+    minicap.stop_stream()
+    device.close()
+
+
+def test_swap_kills_old_server_without_banner_pid(swap, adb_server, minicap_server):
+    minicap, device = swap
+    # 还没有读取过旧服务的banner
+    assert minicap.server_pid is None
+    minicap.update_rotation(90)
+    assert minicap.get_frame() == b'new1'
+    assert "-n 'minicap_emulator-5554_1'" in device.launched[0]
+    assert device.killed == [OLD_PID]
+    assert minicap.server_pid == NEW_PID
+    assert 'tcp:%d' % minicap_server.port not in adb_server.forwards
+    assert len(minicap.capture_gaps) == 1
+
+
+def test_swap_uses_banner_pid(swap):
+    minicap, device = swap
+    assert minicap.get_frame() == b'frame1'
+    assert minicap.server_pid == OLD_PID
+    device.pids.add(OLD_PID + 1)
+    minicap.update_rotation(90)
+    assert minicap.get_frame() == b'new1'
+    assert device.killed == [OLD_PID]
+
+
+def test_unknown_pid_is_not_guessed(swap):
+    minicap, device = swap
+    # 有多个其他minicap进程时无法确定旧服务
+    device.pids.add(OLD_PID + 1)
+    minicap.update_rotation(90)
+    assert minicap.get_frame() == b'new1'
+    assert device.killed == []
+
+
+def test_stream_hot_swap_records_capture_gap(swap, minicap_server):
+    minicap, device = swap
+    minicap.start_stream()
+    first = minicap.get_stream_frame(timeout=2)
+    assert bytes(first.data).startswith(b'frame')
+    minicap.update_rotation(90)
+    frame = minicap.get_stream_frame(newer_than=first.seq, timeout=5)
+    while not bytes(frame.data).startswith(b'new'):
+        frame = minicap.get_stream_frame(newer_than=frame.seq, timeout=5)
+    assert device.killed == [OLD_PID]
+    assert minicap.last_capture_gap is not None and minicap.last_capture_gap < 5
+    assert minicap._retiring_server is None and minicap._pending_server is None
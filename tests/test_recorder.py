@@ -0,0 +1,88 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import time
+
+import numpy as np
+import pytest
+
+from core.cap_methods.replaycap import ReplayCap
+from core.utils.frame_buffer import StreamFrame
+from core.utils.recorder import FrameRecorder, INDEX_STRUCT, INDEX_DTYPE, index_path
+
+FRAMES = [b'jpg-0', b'jpg-frame-1', b'j2']
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = str(tmp_path / 'session.rec')
+    with FrameRecorder(path, rotation=90) as recorder:
+        for i, data in enumerate(FRAMES):
+            recorder.write(data, timestamp=100.0 + i * 0.1, rotation=None if i < 2 else 180)
+    return path
+
+
+def test_index_struct_matches_dtype():
+    assert INDEX_STRUCT.size == INDEX_DTYPE.itemsize == 22
+
+
+def test_index_records(recording):
+    index = np.fromfile(index_path(recording), dtype=INDEX_DTYPE)
+    assert index['offset'].tolist() == [0, 5, 16]
+    assert index['size'].tolist() == [len(data) for data in FRAMES]
+    assert index['timestamp'].tolist() == pytest.approx([100.0, 100.1, 100.2])
+    assert index['rotation'].tolist() == [90, 90, 180]
+    with open(recording, 'rb') as f:
+        assert f.read() == b''.join(FRAMES)
+
+
+def test_recorder_appends(recording):
+    with FrameRecorder(recording) as recorder:
+        recorder.on_frame(StreamFrame(1, 101.0, b'more'))
+    index = np.fromfile(index_path(recording), dtype=INDEX_DTYPE)
+    assert len(index) == 4 and int(index['offset'][-1]) == sum(map(len, FRAMES))
+
+
+def test_write_after_close_is_ignored(tmp_path):
+    recorder = FrameRecorder(str(tmp_path / 'closed.rec'))
+    recorder.close()
+    recorder.write(b'late')
+    assert recorder.count == 0
+
+
+def test_replay_sequential(recording):
+    replay = ReplayCap(recording, speed=0)
+    try:
+        assert [replay.get_frame().tobytes() for _ in FRAMES] == FRAMES
+        assert replay.rotation == 180
+        # 没有loop时停在最后一帧
+        assert replay.get_frame() == FRAMES[-1]
+        replay.rewind()
+        assert replay.get_frame() == FRAMES[0] and replay.rotation == 90
+    finally:
+        replay.teardown()
+
+
+def test_replay_loop(recording):
+    replay = ReplayCap(recording, speed=0, loop=True)
+    try:
+        assert [replay.get_frame().tobytes() for _ in range(4)] == FRAMES + FRAMES[:1]
+    finally:
+        replay.teardown()
+
+
+def test_replay_follows_recorded_time(recording):
+    replay = ReplayCap(recording, speed=1.0)
+    try:
+        assert replay.duration == pytest.approx(0.2)
+        assert replay.get_frame() == FRAMES[0]
+        time.sleep(0.25)
+        assert replay.get_frame() == FRAMES[-1]
+    finally:
+        replay.teardown()
+
+
+def test_replay_empty_recording(tmp_path):
+    path = str(tmp_path / 'empty.rec')
+    FrameRecorder(path).close()
+    with pytest.raises(ValueError):
+        ReplayCap(path)
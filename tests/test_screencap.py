@@ -0,0 +1,82 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import os
+import struct
+
+import numpy as np
+import pytest
+
+from core.adb import ADB
+from core.error import AdbError
+
+WIDTH, HEIGHT = 8, 4
+
+
+def screencap_data(value: int, header_size: int = 16) -> bytes:
+    header = struct.pack('<3I', WIDTH, HEIGHT, 1) + b'\0' * (header_size - 12)
+    pixels = np.zeros((HEIGHT, WIDTH, 4), dtype=np.uint8)
+    pixels[:, :] = (value, value + 1, value + 2, 255)  # rgba
+    pixels[0, 0] = (1, 2, 3, 255)
+    return header + pixels.tobytes()
+
+
+@pytest.fixture
+def screencap(adb_server):
+    """screencap输出root/frame.raw"""
+    path = os.path.join(adb_server.bin, 'screencap')
+    with open(path, 'w') as f:
+        f.write('#!/bin/sh\ncat "%s"\n' % os.path.join(adb_server.root, 'frame.raw'))
+    os.chmod(path, 0o755)
+
+    def write(data: bytes):
+        with open(os.path.join(adb_server.root, 'frame.raw'), 'wb') as f:
+            f.write(data)
+    return write
+
+
+@pytest.mark.parametrize('header_size', [12, 16])
+def test_parse_screencap(header_size):
+    img = ADB._parse_screencap(screencap_data(10, header_size))
+    assert img.shape == (HEIGHT, WIDTH, 3)
+    assert tuple(img[0, 0]) == (3, 2, 1) and tuple(img[1, 1]) == (12, 11, 10)
+
+
+def test_parse_screencap_rect():
+    img = ADB._parse_screencap(screencap_data(10), (0, 0, 2, 3))
+    assert img.shape == (3, 2, 3) and tuple(img[0, 0]) == (3, 2, 1)
+    with pytest.raises(OverflowError):
+        ADB._parse_screencap(screencap_data(10), (4, 0, 8, 1))
+
+
+def test_parse_screencap_rejects_unknown_header():
+    with pytest.raises(AdbError):
+        ADB._parse_screencap(screencap_data(10) + b'\0' * 3)
+
+
+@pytest.mark.parametrize('extra', [1, 0, -50])
+def test_exec_out_into(client, serial, screencap, extra):
+    data = screencap_data(10)
+    screencap(data)
+    buf = bytearray(len(data) + extra)
+    view = client.exec_out_into(serial, ['screencap'], buf)
+    assert view == data and view.obj is buf
+    if extra >= 0:
+        # 缓冲区足够时不会为了读取EOF扩容
+        assert len(buf) == len(data) + extra
+
+
+def test_screenshot_reuses_released_buffer(adb, screencap):
+    screencap(screencap_data(10))
+    adb.screenshot()  # 记录帧大小
+    first = adb.screenshot()
+    assert tuple(first[1, 1]) == (12, 11, 10)
+    # 第一张图片还在使用, 第二次截图不能覆盖它
+    screencap(screencap_data(20))
+    second = adb.screenshot()
+    assert tuple(first[1, 1]) == (12, 11, 10) and tuple(second[1, 1]) == (22, 21, 20)
+    buffers = [id(buf) for buf in adb._cap_buffers._buffers]
+    assert len(buffers) == 2
+    del first, second
+    adb.screenshot()
+    assert [id(buf) for buf in adb._cap_buffers._buffers] == buffers
+    assert all(len(buf) == len(screencap_data(0)) + 1 for buf in adb._cap_buffers._buffers)
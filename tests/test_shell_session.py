@@ -0,0 +1,113 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import socket
+import time
+
+import pytest
+
+from core.adbclient import AdbClient
+from core.error import AdbError
+from core.shell_session import ShellSession
+from tests.fake_adb import FakeAdbServer
+
+SESSION_SERVICE = 'shell,v2,raw:sh'
+
+
+@pytest.fixture
+def session(client, serial):
+    session = ShellSession(client, serial)
+    yield session
+    session.close()
+
+
+def test_commands_share_one_connection(session, adb_server):
+    assert session.run('echo a') == (b'a\n', b'', 0)
+    assert session.run(['echo', 'b']) == (b'b\n', b'', 0)
+    assert adb_server.requests.count(SESSION_SERVICE) == 1
+
+
+def test_stderr_and_returncode(session):
+    assert session.run('echo out; echo err >&2; exit 3') == (b'out\n', b'err\n', 3)
+    # exit只结束子shell, 会话仍然可用
+    assert session.run('echo next') == (b'next\n', b'', 0)
+
+
+def test_commands_do_not_share_state(session, adb_server):
+    session.run('cd /; export SESSION_VAR=1')
+    assert session.run('pwd')[0].decode().strip() == adb_server.root
+    assert session.run('echo "[$SESSION_VAR]"')[0] == b'[]\n'
+
+
+def test_stdin_is_dev_null(session):
+    stamp = time.time()
+    assert session.run('cat', timeout=5) == (b'', b'', 0)
+    assert time.time() - stamp < 5
+
+
+def test_no_default_timeout(session):
+    assert session.timeout is None
+    assert session.run('sleep 1.5; echo done')[0] == b'done\n'
+
+
+def test_timeout_reopens_session(session, adb_server):
+    with pytest.raises(socket.timeout):
+        session.run('sleep 2', timeout=0.2)
+    assert session.run('echo again')[0] == b'again\n'
+    assert adb_server.requests.count(SESSION_SERVICE) == 2
+
+
+def test_run_after_close_raises(session):
+    session.run('echo a')
+    session.close()
+    with pytest.raises(socket.error):
+        session.run('echo b')
+    session.close()
+
+
+def test_adb_falls_back_after_session_close(adb, adb_server):
+    adb.raw_shell('echo a')
+    adb._shell_session.close()
+    assert adb.raw_shell('echo b') == 'b\n'
+    assert 'shell,v2,raw:echo b' in adb_server.requests
+
+
+def test_exec_sh_without_shell_v2(tmp_path, serial):
+    server = FakeAdbServer(str(tmp_path), features='cmd').start()
+    session = ShellSession(AdbClient(port=server.port), serial)
+    try:
+        assert session.run('echo hi; exit 2') == (b'hi\n', b'', 2)
+        assert 'exec:sh' in server.requests
+    finally:
+        session.close()
+        server.stop()
+
+
+def test_accepts_only_short_commands():
+    assert ShellSession.accepts(['getprop', 'ro.build.version.sdk'])
+    assert ShellSession.accepts(['ps -x', '123'])
+    assert ShellSession.accepts('wm size; wm density')
+    assert not ShellSession.accepts('sleep 12; echo done')
+    assert not ShellSession.accepts(['screencap', '/data/local/tmp/screen.raw'])
+    assert not ShellSession.accepts('dumpsys window displays')
+    assert not ShellSession.accepts('')
+
+
+def test_adb_routes_long_commands_to_one_shot_shell(adb, adb_server):
+    assert adb.raw_shell('sleep 0.1; echo done') == 'done\n'
+    assert 'shell,v2,raw:sleep 0.1; echo done' in adb_server.requests
+    assert adb.raw_shell(['echo', 'short']) == 'short\n'
+    assert 'shell,v2,raw:echo short' not in adb_server.requests
+
+
+def test_adb_session_timeout_raises_adb_error(adb):
+    adb._shell_session.timeout = 0.2
+    with pytest.raises(AdbError):
+        adb.raw_shell('echo start; sleep 2')
+    adb._shell_session.timeout = None
+    assert adb.raw_shell('echo after') == 'after\n'
+
+
+def test_adb_raises_on_returncode(adb):
+    with pytest.raises(AdbError) as err:
+        adb.raw_shell('ls /nonexistent-path')
+    assert err.value.stderr
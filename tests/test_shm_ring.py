@@ -0,0 +1,79 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import multiprocessing
+import pickle
+
+import numpy as np
+import pytest
+
+from core.utils.shm_ring import SharedFrameRing, RingSpec
+
+
+def image(value: int, shape=(4, 6, 3)) -> np.ndarray:
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def checksum(spec: RingSpec, seq: int) -> int:
+    ring = SharedFrameRing.attach(spec)
+    try:
+        view = ring.read(seq)
+        total = -1 if view is None else int(view.sum())
+        del view
+        return total
+    finally:
+        ring.close()
+
+
+@pytest.fixture
+def ring():
+    ring = SharedFrameRing(slots=3, slot_size=4 * 6 * 3)
+    yield ring
+    ring.close()
+    ring.unlink()
+
+
+def test_empty_ring(ring):
+    assert ring.read(0) is None
+    assert not ring.valid(0)
+
+
+def test_write_read(ring):
+    assert ring.write(image(7), seq=4, timestamp=1.5, rotation=90) == 1
+    view = ring.read(4)
+    assert view.shape == (4, 6, 3)
+    assert not view.flags.writeable
+    assert (view == 7).all()
+    header = ring.headers[1]
+    assert (header['timestamp'], header['rotation']) == (1.5, 90)
+    del view
+
+
+def test_gray_image_gets_channel_axis(ring):
+    ring.write(image(3, shape=(4, 6)), seq=0)
+    view = ring.read(0)
+    assert view.shape == (4, 6, 1)
+    del view
+
+
+def test_overwritten_slot(ring):
+    ring.write(image(1), seq=1)
+    view = ring.read(1)
+    ring.write(image(2), seq=4)
+    # 读取方拿到的是共享内存的视图, 被覆盖后通过valid发现
+    assert not ring.valid(1)
+    assert ring.read(1) is None
+    assert ring.valid(4)
+    del view
+
+
+def test_frame_too_large(ring):
+    with pytest.raises(ValueError):
+        ring.write(image(1, shape=(10, 10, 3)), seq=0)
+
+
+def test_attach_from_other_process(ring):
+    ring.write(image(5), seq=2)
+    spec = pickle.loads(pickle.dumps(ring.spec))
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        assert pool.apply(checksum, (spec, 2)) == 5 * 4 * 6 * 3
+        assert pool.apply(checksum, (spec, 5)) == -1
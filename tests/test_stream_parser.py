@@ -0,0 +1,136 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import socket
+import struct
+
+import pytest
+
+from core.cap_methods.minicap import Minicap
+from core.frame import Frame
+from core.utils.frame_buffer import LatestFrame
+from core.utils.governor import CaptureGovernor
+from core.utils.stream_parser import BANNER_SIZE, BufferPool, FrameStreamParser
+from tests.test_javacap import make_javacap
+
+# version=1, size=24, pid=1234, real=1080x2340, virtual=540x1170, orientation=1, quirk_flag=2
+BANNER = bytes.fromhex('0118d204000038040000240900001c02000092040000 0102'.replace(' ', ''))
+
+
+def frame_bytes(body: bytes) -> bytes:
+    return struct.pack('<I', len(body)) + body
+
+
+@pytest.fixture
+def pair():
+    local, remote = socket.socketpair()
+    yield local, remote
+    local.close()
+    remote.close()
+
+
+def test_banner_fixture():
+    assert len(BANNER) == BANNER_SIZE
+    assert FrameStreamParser.parse_banner(BANNER) == (1, 24, 1234, 1080, 2340, 540, 1170, 1, 2)
+
+
+def test_banner_and_frames(pair):
+    local, remote = pair
+    remote.sendall(BANNER + frame_bytes(b'jpg-1') + frame_bytes(b'jpg-frame-2'))
+    parser = FrameStreamParser(local)
+    assert parser.read_banner(1) == BANNER
+    first = parser.read_frame(1)
+    assert isinstance(first, memoryview) and first.readonly
+    assert bytes(first) == b'jpg-1'
+    assert bytes(parser.read_frame(1)) == b'jpg-frame-2'
+
+
+def test_frame_larger_than_read_buffer(pair):
+    local, remote = pair
+    body = bytes(range(256)) * 64
+    parser = FrameStreamParser(local, read_size=100)
+    remote.sendall(BANNER + frame_bytes(body))
+    assert bytes(parser.read_frame(1)) == body
+
+
+def test_timeout_keeps_partial_frame(pair):
+    local, remote = pair
+    data = BANNER + frame_bytes(b'split-frame')
+    parser = FrameStreamParser(local)
+    # 帧头和帧数据都只收到一部分
+    remote.sendall(data[:BANNER_SIZE + 2])
+    assert parser.read_frame(0.05) is None
+    remote.sendall(data[BANNER_SIZE + 2:BANNER_SIZE + 8])
+    assert parser.read_frame(0.05) is None
+    remote.sendall(data[BANNER_SIZE + 8:])
+    assert bytes(parser.read_frame(1)) == b'split-frame'
+
+
+def test_connection_broken(pair):
+    local, remote = pair
+    remote.sendall(BANNER + frame_bytes(b'abc')[:5])
+    remote.close()
+    parser = FrameStreamParser(local)
+    with pytest.raises(socket.error):
+        parser.read_frame(1)
+
+
+def test_buffer_reused_after_release(pair):
+    local, remote = pair
+    pool = BufferPool(max_buffers=2)
+    parser = FrameStreamParser(local, pool)
+    remote.sendall(BANNER + frame_bytes(b'a' * 10) + frame_bytes(b'b' * 10) + frame_bytes(b'c' * 10))
+    first = parser.read_frame(1)
+    second = parser.read_frame(1)
+    # 帧还被引用时不会被覆盖
+    assert first.obj is not second.obj
+    assert bytes(first) == b'a' * 10
+    buf = first.obj
+    first.release()
+    third = parser.read_frame(1)
+    assert third.obj is buf
+    assert bytes(third) == b'c' * 10 and bytes(second) == b'b' * 10
+    assert len(pool) == 2
+
+
+def test_pool_grows_small_buffer():
+    pool = BufferPool(max_buffers=1)
+    small = pool.acquire(4)
+    view = memoryview(small)
+    # 唯一的缓冲区在使用时分配临时缓冲区
+    assert len(pool.acquire(4)) == 4 and len(pool) == 1
+    view.release()
+    assert len(pool.acquire(16)) == 16
+
+
+def test_minicap_parse_banner():
+    minicap = Minicap.__new__(Minicap)
+    minicap.frame_scale = 1.0
+    assert minicap._parse_banner(BANNER) == 1
+    assert (minicap.server_pid, minicap.quirk_flag, minicap.frame_scale) == (1234, 2, 0.5)
+
+
+def test_minicap_get_frame_returns_bytes():
+    minicap = Minicap.__new__(Minicap)
+    minicap._stream_thread = object()
+    minicap.latest_frame = LatestFrame()
+    minicap.governor = CaptureGovernor(None)
+    minicap.latest_frame.put(memoryview(bytearray(b'jpg')).toreadonly())
+    data = minicap.get_frame()
+    assert type(data) is bytes and data == b'jpg'
+
+
+def test_javacap_get_frame_returns_bytes():
+    javacap = make_javacap()
+    javacap.latest_frame.put(memoryview(bytearray(b'jpg')).toreadonly())
+    data = javacap.get_frame()
+    assert type(data) is bytes and data == b'jpg'
+
+
+def test_frame_detach_releases_buffer():
+    buf = bytearray(b'jpg')
+    frame = Frame(memoryview(buf).toreadonly())
+    buf_view = frame.data
+    del buf_view
+    assert frame.detach() is frame
+    assert type(frame.data) is bytes and frame.data == b'jpg'
+    buf.append(0)  # 没有导出时才能改变大小
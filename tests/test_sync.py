@@ -0,0 +1,85 @@
+#! usr/bin/python
+# -*- coding:utf-8 -*-
+import os
+import stat
+
+import pytest
+
+from core.adbclient import SyncConnection
+from core.error import AdbError
+
+REMOTE = '/data/local/tmp/sync_test.bin'
+
+
+def local_file(adb_server, path: str) -> str:
+    return os.path.join(adb_server.root, path.lstrip('/'))
+
+
+def test_push_pull_roundtrip(client, adb_server, serial):
+    data = os.urandom(200 * 1024 + 17)
+    with client.sync(serial) as sync:
+        sync.push(data, REMOTE, mode=0o755, mtime=1600000000)
+        mode, size, mtime = sync.stat(REMOTE)
+        assert (stat.S_IMODE(mode), size, mtime) == (0o755, len(data), 1600000000)
+        assert sync.pull(REMOTE) == data
+    with open(local_file(adb_server, REMOTE), 'rb') as f:
+        assert f.read() == data
+
+
+def test_pull_reuses_buffer(client, adb_server, serial):
+    os.makedirs(os.path.dirname(local_file(adb_server, REMOTE)))
+    with open(local_file(adb_server, REMOTE), 'wb') as f:
+        f.write(b'abc')
+    buf = bytearray(16)
+    with client.sync(serial) as sync:
+        view = sync.pull(REMOTE, buf)
+    assert view.obj is buf and view == b'abc'
+
+
+def test_pull_grows_buffer_when_file_grew_after_stat(client, adb_server, serial, monkeypatch):
+    data = os.urandom(100 * 1024)
+    os.makedirs(os.path.dirname(local_file(adb_server, REMOTE)))
+    with open(local_file(adb_server, REMOTE), 'wb') as f:
+        f.write(data)
+    adb_server.sync_chunk = 4096
+    stat_ = SyncConnection.stat
+    monkeypatch.setattr(SyncConnection, 'stat', lambda self, path: stat_(self, path)[:1] + (10, 0))
+    with client.sync(serial) as sync:
+        assert sync.pull(REMOTE) == data
+
+
+def test_pull_does_not_resize_exported_buffer(client, adb_server, serial, monkeypatch):
+    data = os.urandom(64 * 1024)
+    os.makedirs(os.path.dirname(local_file(adb_server, REMOTE)))
+    with open(local_file(adb_server, REMOTE), 'wb') as f:
+        f.write(data)
+    adb_server.sync_chunk = 4096
+    stat_ = SyncConnection.stat
+    monkeypatch.setattr(SyncConnection, 'stat', lambda self, path: stat_(self, path)[:1] + (10, 0))
+    buf = bytearray(16)
+    exported = memoryview(buf)
+    with client.sync(serial) as sync:
+        view = sync.pull(REMOTE, buf)
+    assert view == data and view.obj is not buf
+    assert len(buf) == 16
+    exported.release()
+
+
+def test_stat_and_pull_missing_file(client, serial):
+    with client.sync(serial) as sync:
+        assert sync.stat('/missing') == (0, 0, 0)
+        assert not sync.exists('/missing')
+        with pytest.raises(AdbError):
+            sync.pull('/missing')
+
+
+def test_adb_push_and_pull(adb, tmp_path):
+    local = tmp_path / 'local.txt'
+    local.write_bytes(b'hello')
+    local.chmod(0o640)
+    adb.push(str(local), REMOTE)
+    assert adb.check_file('/data/local/tmp', 'sync_test.bin')
+    assert stat.S_IMODE(adb.stat(REMOTE)[0]) == 0o640
+    pulled = tmp_path / 'pulled.txt'
+    adb.pull(REMOTE, str(pulled))
+    assert pulled.read_bytes() == b'hello'